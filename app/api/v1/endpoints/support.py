@@ -10,6 +10,7 @@ import json
 import os
 from datetime import datetime
 from app.core.config import settings
+from app.core.metrics import metrics
 import logging
 from langsmith import traceable, Client
 
@@ -199,4 +200,9 @@ async def submit_feedback(feedback: Feedback):
         return {"status": "success", "message": "Feedback recorded successfully"}
     except Exception as e:
         logger.error(f"Error recording feedback: {e}")
-        raise HTTPException(status_code=500, detail=f"Error recording feedback: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error recording feedback: {str(e)}") 
+
+@router.get("/metrics")
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    """Return this worker's cache, fast-path and retrieval metrics."""
+    return metrics.snapshot()
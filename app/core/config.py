@@ -35,7 +35,54 @@ class Settings(BaseSettings):
 
     # Vector Store
     VECTOR_STORE_PATH: str = "/tmp/vector_store"
-    KNOWLEDGE_BASE_PATH: str = "advanced_knowledge_base.txt"
+    VECTOR_STORE_FORMAT: str = "mmap"  # "mmap" (pickle-free, shared via page cache) or "faiss" (legacy)
+    KNOWLEDGE_BASE_PATH: str = "advanced_knowledge_base.txt"  # a file, or a directory of .md/.txt/.json/.jsonl documents
+    KNOWLEDGE_CHUNKER: str = "bullet"  # bullet, heading, window or auto (by file type)
+    CHUNK_SIZE: int = 800  # characters, for the heading and window chunkers
+    CHUNK_OVERLAP: int = 120  # characters shared by consecutive windows
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_WORKERS: int = 4
+    # Compressed index for the mmap store: flat, float16, int8, pq, ivf_pq or hnsw_pq
+    VECTOR_INDEX_TYPE: str = "flat"
+    VECTOR_PQ_M: int = 64
+    VECTOR_PQ_NBITS: int = 8
+    VECTOR_IVF_NLIST: int = 256
+    VECTOR_IVF_NPROBE: int = 16
+    VECTOR_HNSW_M: int = 32
+    VECTOR_HNSW_EF_SEARCH: int = 64
+    # Topic shards: vector search only scores the shards a query is routed to
+    VECTOR_SHARDING: bool = False
+    SHARD_TOPICS: Dict[str, List[str]] = {}  # topic -> keywords; empty uses the built-in game topics
+    SHARD_MIN_CENTROID_MARGIN: float = 0.05  # below this the router searches every shard
+
+    # Retrieval: "hybrid" fuses BM25 and vector results, "lexical" never calls the embedding API
+    RETRIEVAL_MODE: str = "hybrid"
+    RETRIEVAL_TOP_K: int = 2
+    RETRIEVAL_CANDIDATES: int = 8
+    RRF_K: int = 60
+    # Adaptive context size: the QA prompt gets between ADAPTIVE_K_MIN and ADAPTIVE_K_MAX chunks,
+    # cut at a relevance drop, a score floor or the token budget (RETRIEVAL_TOP_K when disabled).
+    # Hybrid results are scored by normalised RRF, where a chunk only one retriever found scores at most 0.5
+    ADAPTIVE_K_ENABLED: bool = True
+    ADAPTIVE_K_MIN: int = 1
+    ADAPTIVE_K_MAX: int = 4
+    ADAPTIVE_K_MIN_SCORE: float = 0.3
+    ADAPTIVE_K_MAX_GAP: float = 0.1
+    CONTEXT_TOKEN_BUDGET: int = 1500
+    # A lexical hit at or above this normalised score, and this many times the runner-up, skips the embedding call
+    LEXICAL_DECISIVE_SCORE: float = 0.6
+    LEXICAL_DECISIVE_MARGIN: float = 1.5
+
+    # Semantic answer cache for static answers
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # cosine similarity between query embeddings
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    KNOWLEDGE_BASE_RELOAD_SECONDS: int = 30  # how often to check for a rebuilt index
+
+    # Extractive fast path: answer with the top chunk when its BM25 score clears both gates, skipping the QA LLM
+    EXTRACTIVE_MIN_SCORE: float = 0.6
+    EXTRACTIVE_MIN_MARGIN: float = 0.3  # top BM25 score minus the runner-up's
+    EXTRACTIVE_TRAFFIC_SHARE: float = 1.0  # fraction of queries eligible; 0 disables the fast path
 
     # Environment
     ENVIRONMENT: str = "development"
@@ -52,6 +99,62 @@ class Settings(BaseSettings):
             return self.SQLITE_URL
         return self.DATABASE_URL
 
+    # Async database access for the dynamic agent (pool settings apply to Postgres; SQLite is not pooled)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_STATEMENT_TIMEOUT_SECONDS: float = 10
+    # Apply pending app/models/migrations.py migrations (indexes the generated SQL relies on) at startup;
+    # off by default, so deploys run `python -m app.models.migrations` once instead of every worker
+    DB_AUTO_MIGRATE: bool = False
+    # Dynamic agent SQL result cache: entries are dropped when a table they read changes,
+    # or after SQL_CACHE_TTL_SECONDS for changes made outside this process
+    SQL_CACHE_ENABLED: bool = True
+    SQL_CACHE_TTL_SECONDS: float = 60
+    SQL_CACHE_MAX_ENTRIES: int = 2000
+    # Validated SQL templates per question shape (names and numbers masked), reused instead of the LLM
+    SQL_TEMPLATE_CACHE_ENABLED: bool = True
+    SQL_TEMPLATE_MAX_ENTRIES: int = 500
+    # Send SQL generation only the tables (and foreign-key parents) the question mentions
+    SCHEMA_PRUNING_ENABLED: bool = True
+    # Few-shot SQL examples: curated seeds plus SQL that ran successfully (minus negative feedback)
+    SQL_FEW_SHOT_ENABLED: bool = True
+    SQL_FEW_SHOT_K: int = 3
+    SQL_EXAMPLES_PATH: str = "sql_examples.jsonl"
+    SQL_EXAMPLES_LOG: str = os.environ.get("SQL_EXAMPLES_LOG", "/tmp/sql_examples_log.jsonl")
+    # Checks on generated SQL: read-only, no cartesian joins, at most SQL_GUARD_MAX_ROWS rows, and with
+    # SQL_GUARD_EXPLAIN a plan cost under SQL_GUARD_MAX_COST (planner units on Postgres, rows visited on SQLite)
+    SQL_GUARD_ENABLED: bool = True
+    SQL_GUARD_MAX_ROWS: int = 100
+    SQL_GUARD_EXPLAIN: bool = True
+    SQL_GUARD_MAX_COST: float = 1_000_000
+    SQL_GUARD_SIZE_REFRESH_SECONDS: int = 300  # how often the SQLite table sizes behind the cost are re-counted
+
+    # Dynamic agent: how often the in-memory player/clan name directory picks up new rows
+    ENTITY_REFRESH_SECONDS: int = 60
+    # Trigram similarity for misspelt names: substituted at FUZZY_ACCEPT_SCORE when FUZZY_MIN_MARGIN
+    # ahead of the runner-up, offered as a follow-up from FUZZY_SUGGEST_SCORE
+    FUZZY_ACCEPT_SCORE: float = 0.7
+    FUZZY_SUGGEST_SCORE: float = 0.5
+    FUZZY_MIN_MARGIN: float = 0.1
+    # Templated answers for single-fact questions (rank, VIP status, level, XP, clan type and size,
+    # legendary items, gold achievements), taken before classification without any LLM call
+    INTENT_HANDLERS_ENABLED: bool = True
+    # Per-player rollup (player_summary) folded in from new activity rows every PLAYER_SUMMARY_REFRESH_SECONDS;
+    # single-total questions about one player are answered from it without SQL generation
+    PLAYER_SUMMARY_ENABLED: bool = True
+    PLAYER_SUMMARY_REFRESH_SECONDS: int = 60
+    # Full recompute in one transaction on a background thread, picking up rank updates, refunds, deletions and attribute edits
+    PLAYER_SUMMARY_REBUILD_SECONDS: int = 900
+    # In-memory leaderboards per (season, region) serving rank, top-N and neighbourhood questions
+    LEADERBOARD_INDEX_ENABLED: bool = True
+    LEADERBOARD_REFRESH_SECONDS: int = 60
+    # Full rebuild picking up leaderboard rows updated in place (rank changes), swapped in when done
+    LEADERBOARD_RELOAD_SECONDS: int = 300
+    # Optional columnar NumPy mirror of purchases and matches answering aggregate questions in memory
+    ANALYTICS_MIRROR_ENABLED: bool = False
+    ANALYTICS_REFRESH_SECONDS: int = 60
+
     # Feedback storage
     FEEDBACK_DIR: str = os.environ.get("FEEDBACK_DIR", "/tmp/feedback")
 
@@ -0,0 +1,87 @@
+"""
+Lightweight in-process metrics for the agents' fast paths and caches.
+
+Counters and histograms are per worker process and reset on restart. Components
+with richer state (caches, indexes) register a collector callback instead, and
+the snapshot calls it on demand. The snapshot is served by the support API.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Optional, Sequence
+
+DEFAULT_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+
+
+class Histogram:
+    """Count, sum, min, max and non-cumulative bucket counts for observed values."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def counter(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def ratio(self, numerator: str, denominator: str) -> Optional[float]:
+        total = self.counter(denominator)
+        return round(self.counter(numerator) / total, 4) if total else None
+
+    def register_collector(self, name: str, collector: Callable[[], dict]):
+        """Attach a callback whose dict is included under `name` in every snapshot."""
+        self._collectors[name] = collector
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {
+                "counters": dict(self._counters),
+                "histograms": {name: h.snapshot() for name, h in self._histograms.items()},
+            }
+        for name, collector in list(self._collectors.items()):
+            try:
+                result[name] = collector()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+
+metrics = MetricsRegistry()
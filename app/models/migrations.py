@@ -0,0 +1,229 @@
+"""
+Schema migrations for the game database.
+
+Each migration has an id and builds its statements from the live schema
+(column names differ between deployments) and dialect. Applied ids are
+recorded in ``schema_migrations``, so running the migrations again only
+applies new ones. Run them as a deploy step:
+
+    python -m app.models.migrations
+
+The dynamic agent also applies pending migrations on startup when
+DB_AUTO_MIGRATE is set (off by default). On Postgres, concurrent runs are
+serialised by an advisory lock, and indexes are built with CREATE INDEX
+CONCURRENTLY outside a transaction, so writes to the table are not blocked
+while they build.
+"""
+import logging
+import re
+import warnings
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import create_engine, exc, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.reflection import Inspector
+
+logger = logging.getLogger("uvicorn.error")
+
+MIGRATIONS_TABLE = "schema_migrations"
+# Key of the Postgres advisory lock held by whichever process is applying migrations
+MIGRATIONS_LOCK_KEY = 7_164_021_358
+CREATE_INDEX = re.compile(r"CREATE INDEX (?:CONCURRENTLY )?IF NOT EXISTS (\w+)")
+# Per-player rollup maintained by app.services.data.summary, and the high-water marks of its sources
+SUMMARY_TABLE = "player_summary"
+SUMMARY_WATERMARKS_TABLE = "player_summary_watermarks"
+
+# Name columns looked up case-insensitively, by table, in order of preference
+NAME_COLUMNS = (
+    ("players", ("username",)),
+    ("clans", ("clan_name", "name")),
+)
+
+# Composite indexes for the access paths generated SQL uses most: per-player rows filtered by
+# date, rarity, tier or result, and leaderboard pages by season and region. Each column lists
+# its candidate names; trailing columns make the index covering for the common lookups.
+ACCESS_PATH_INDEXES = (
+    ("purchases", (("player_id",), ("purchase_date", "timestamp"))),
+    ("purchases", (("player_id",), ("rarity",))),
+    ("achievements", (("player_id",), ("tier",), ("name",))),
+    ("matches", (("player_id",), ("match_date", "timestamp"))),
+    ("matches", (("player_id",), ("result",))),
+    ("leaderboards", (("season",), ("region",), ("rank",))),
+    ("leaderboards", (("player_id",), ("season",), ("rank",))),
+    ("players", (("clan_id",),)),
+)
+
+
+class Migration(NamedTuple):
+    id: str
+    description: str
+    statements: Callable[[Inspector, str], List[str]]  # (inspector, dialect name) -> SQL
+
+
+def _column(inspector: Inspector, table: str, candidates: Sequence[str]) -> Optional[str]:
+    if table not in inspector.get_table_names():
+        return None
+    columns = {column["name"] for column in inspector.get_columns(table)}
+    return next((name for name in candidates if name in columns), None)
+
+
+def _lower_name_indexes(inspector: Inspector, dialect: str) -> List[str]:
+    # An expression index on lower(name) serves LOWER(name) = 'value' on both SQLite and Postgres
+    statements = []
+    for table, candidates in NAME_COLUMNS:
+        column = _column(inspector, table, candidates)
+        if column:
+            statements.append(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_lower ON {table} (lower({column}))")
+    return statements
+
+
+def _access_path_indexes(inspector: Inspector, dialect: str) -> List[str]:
+    statements, analyzed = [], []
+    for table, candidates in ACCESS_PATH_INDEXES:
+        columns = [_column(inspector, table, names) for names in candidates]
+        if not all(columns):
+            continue
+        statements.append(f"CREATE INDEX IF NOT EXISTS ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})")
+        if table not in analyzed:
+            analyzed.append(table)
+    # Fresh statistics so the planner weighs the new indexes (both backends accept ANALYZE <table>)
+    return statements + [f"ANALYZE {table}" for table in analyzed]
+
+
+def _player_summary_tables(inspector: Inspector, dialect: str) -> List[str]:
+    if "players" not in inspector.get_table_names():
+        return []
+    return [
+        f"""CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+            player_id INTEGER PRIMARY KEY,
+            username VARCHAR(100),
+            level INTEGER,
+            xp INTEGER,
+            vip_status VARCHAR(50),
+            purchases INTEGER NOT NULL DEFAULT 0,
+            legendary_purchases INTEGER NOT NULL DEFAULT 0,
+            total_spent DOUBLE PRECISION NOT NULL DEFAULT 0,
+            achievements INTEGER NOT NULL DEFAULT 0,
+            gold_achievements INTEGER NOT NULL DEFAULT 0,
+            matches_played INTEGER NOT NULL DEFAULT 0,
+            matches_won INTEGER NOT NULL DEFAULT 0,
+            xp_gained INTEGER NOT NULL DEFAULT 0,
+            current_season VARCHAR(50),
+            current_rank INTEGER,
+            updated_at VARCHAR(32)
+        )""",
+        f"CREATE TABLE IF NOT EXISTS {SUMMARY_WATERMARKS_TABLE} (source VARCHAR(100) PRIMARY KEY, last_id BIGINT NOT NULL)",
+    ]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration("0001_lower_name_indexes", "Expression indexes for case-insensitive player and clan lookups", _lower_name_indexes),
+    Migration("0002_access_path_indexes", "Composite indexes for per-player, time and leaderboard queries", _access_path_indexes),
+    Migration("0003_player_summary", "Per-player rollup of purchases, achievements, matches and rank", _player_summary_tables),
+]
+
+
+def reflect_indexes(inspector: Inspector, table: str) -> List[Dict]:
+    """Column indexes of a table; expression indexes are left to expression_indexes()."""
+    with warnings.catch_warnings():
+        # SQLAlchemy 1.4 warns on every expression index it cannot reflect
+        warnings.filterwarnings("ignore", category=exc.SAWarning, message=".*expression-based index")
+        return inspector.get_indexes(table)
+
+
+def expression_indexes(connection, dialect: str) -> Set[str]:
+    """Indexed single-column expressions as "table.function(column)", e.g. "players.lower(username)"."""
+    if dialect == "sqlite":
+        query = "SELECT tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    elif dialect == "postgresql":
+        query = "SELECT tablename, indexdef FROM pg_indexes WHERE schemaname = current_schema()"
+    else:
+        return set()
+    found = set()
+    for table, definition in connection.execute(text(query)):
+        # Postgres spells lower(username) as lower((username)::text)
+        for function, column in re.findall(r'(\w+)\(\(?"?(\w+)"?\)?(?:::\w+)?\)', definition or ""):
+            found.add(f"{table}.{function.lower()}({column.lower()})")
+    return found
+
+
+def bookkeeping_tables(engine: Engine) -> List[str]:
+    """Tables that belong to the migrations rather than the game data, for callers to ignore."""
+    tables = set(inspect(engine).get_table_names())
+    return [table for table in (MIGRATIONS_TABLE, SUMMARY_WATERMARKS_TABLE) if table in tables]
+
+
+def applied_migrations(engine: Engine) -> Set[str]:
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (id VARCHAR(100) PRIMARY KEY, description TEXT, applied_at VARCHAR(32))"
+        ))
+        return {row[0] for row in connection.execute(text(f"SELECT id FROM {MIGRATIONS_TABLE}"))}
+
+
+def split_concurrent(statements: Sequence[str], dialect: str) -> Tuple[List[str], List[str]]:
+    """
+    Split a migration into statements run outside a transaction and the rest.
+
+    On Postgres every index is built with CREATE INDEX CONCURRENTLY, which
+    cannot run inside a transaction; other backends run everything in one.
+    """
+    if dialect != "postgresql":
+        return [], list(statements)
+    concurrent = [
+        statement.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        for statement in statements if CREATE_INDEX.match(statement)
+    ]
+    return concurrent, [statement for statement in statements if not CREATE_INDEX.match(statement)]
+
+
+def apply_migrations(engine: Engine, migrations: Sequence[Migration] = MIGRATIONS) -> List[str]:
+    """Apply pending migrations in order; returns the ids applied."""
+    if engine.dialect.name != "postgresql":
+        return _apply_pending(engine, migrations)
+    # Workers starting together would otherwise both apply a migration and collide on schema_migrations
+    with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as lock:
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        try:
+            return _apply_pending(engine, migrations)
+        finally:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+
+
+def _apply_pending(engine: Engine, migrations: Sequence[Migration]) -> List[str]:
+    done = applied_migrations(engine)
+    applied = []
+    for migration in migrations:
+        if migration.id in done:
+            continue
+        concurrent, statements = split_concurrent(migration.statements(inspect(engine), engine.dialect.name), engine.dialect.name)
+        if concurrent:
+            with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as connection:
+                # A failed concurrent build leaves an invalid index behind that IF NOT EXISTS would keep
+                invalid = {row[0] for row in connection.execute(text(
+                    "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+                ))}
+                for statement in concurrent:
+                    name = CREATE_INDEX.search(statement).group(1)
+                    if name in invalid:
+                        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                    connection.execute(text(statement))
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+            connection.execute(
+                text(f"INSERT INTO {MIGRATIONS_TABLE} (id, description, applied_at) VALUES (:id, :description, :applied_at)"),
+                {"id": migration.id, "description": migration.description, "applied_at": datetime.utcnow().isoformat()}
+            )
+        logger.info(f"Applied migration {migration.id}: {migration.description}")
+        applied.append(migration.id)
+    return applied
+
+
+if __name__ == "__main__":
+    from app.core.config import settings
+
+    logging.basicConfig(level=logging.INFO)
+    applied = apply_migrations(create_engine(settings.active_db_url))
+    print(f"Applied {len(applied)} migration(s): {', '.join(applied) or 'none pending'}")
@@ -1,10 +1,56 @@
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains.llm import LLMChain
+from sqlalchemy import create_engine, inspect
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.migrations import SUMMARY_TABLE, apply_migrations, bookkeeping_tables
+from app.services.data.async_db import AsyncDatabase, format_rows
+from app.services.data.columnar import AnalyticsMirror
+from app.services.data.dialect import prompt_fragments, rewrite_for_dialect
+from app.services.data.directory import EntityDirectory
+from app.services.data.intents import IntentRegistry, build_handlers
+from app.services.data.leaderboard import LeaderboardIndex
+from app.services.data.result_cache import ResultCache
+from app.services.data.schema import SchemaIndex
+from app.services.data.sql_examples import SqlExampleStore, format_examples, read_examples, rejected_questions
+from app.services.data.sql_guard import SqlGuard
+from app.services.data.sql_templates import MaskedQuestion, SqlTemplateCache, mask_question, render
+from app.services.data.summary import LOOKUP_SQL, SUMMARY_COLUMNS, PlayerSummary, summary_answer, summary_question
+from app.services.retrieval.adaptive_k import count_tokens
+import asyncio
 import re
+import time
+
+# Seconds spent generating SQL with the LLM
+SQL_GEN_BUCKETS = (0.25, 0.5, 1, 2, 4, 8)
+# Seconds spent computing an aggregate in the columnar mirror
+ANALYTICS_BUCKETS = (0.001, 0.005, 0.02, 0.1, 0.5)
+# Seconds from question to templated answer for an intent handler
+INTENT_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.05)
+
+# Used in the SQL prompt when no stored example resembles the question
+SCHEMA_RULES = """SCHEMA ANALYSIS INSTRUCTIONS:
+1. Analyze the tables and their columns carefully
+2. Identify the primary keys and foreign key relationships
+3. For questions about players, use the 'players' table which has 'username' column
+4. For questions about rankings, join 'leaderboards' (which has player_id) with 'players' (which has username)
+5. For questions about clans, use the 'clans' table which has 'clan_name' and 'clan_type' columns
+6. For questions about purchases, JOIN the 'purchases' table (which has player_id) with 'players' table (which has username)
+7. IMPORTANT: purchases.player_id links to players.player_id, not by name
+8. For time-based queries on purchases, use the purchase_date column
+9. For achievement queries, JOIN the 'achievements' table (which has player_id) with 'players' (which has username)
+10. In achievements table, 'tier' column indicates the level (e.g., 'gold', 'silver', 'bronze')
+11. For queries about 'legendary items', filter purchases with "WHERE pur.rarity = 'Legendary'"
+"""
+
+# Added to the SQL prompt when the player_summary rollup is maintained
+SUMMARY_RULE = ("- For one player's totals (purchases, legendary purchases, achievements, gold achievements, matches "
+                "played and won, current season and rank), read the player_summary table (one row per player) "
+                "instead of aggregating the activity tables")
+
 
 class DynamicDataAgent:
     def __init__(self):
@@ -12,11 +58,80 @@ class DynamicDataAgent:
             api_key=settings.OPENAI_API_KEY,
             temperature=0
         )
-        self.db = SQLDatabase.from_uri(settings.active_db_url)
+        engine = create_engine(settings.active_db_url)
+        # Indexes the generated SQL relies on (e.g. lower(username)) come from managed migrations
+        if settings.DB_AUTO_MIGRATE:
+            apply_migrations(engine)
+        ignored = bookkeeping_tables(engine)
+        # A rollup nobody refreshes would give stale totals, so SQL generation does not see it
+        if not settings.PLAYER_SUMMARY_ENABLED and SUMMARY_TABLE in inspect(engine).get_table_names():
+            ignored.append(SUMMARY_TABLE)
+        self.db = SQLDatabase(engine, ignore_tables=ignored)
+        self.dialect = engine.dialect.name
+        # Queries run on a pooled async engine so slow SQL never blocks the event loop;
+        # the sync SQLDatabase above is only used for schema introspection
+        self.result_cache = ResultCache(
+            ttl_seconds=settings.SQL_CACHE_TTL_SECONDS,
+            max_entries=settings.SQL_CACHE_MAX_ENTRIES
+        ) if settings.SQL_CACHE_ENABLED else None
+        self.adb = AsyncDatabase(
+            settings.active_db_url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            statement_timeout=settings.DB_STATEMENT_TIMEOUT_SECONDS,
+            cache=self.result_cache
+        )
+        if self.result_cache:
+            metrics.register_collector("dynamic_sql_cache", self.result_cache.stats)
         
         # Get the actual database schema
         self.db_schema = self.db.get_table_info()
         print(f"Loaded database schema: {self.db_schema[:500]}...")  # Print first 500 chars for debugging
+        # Per-question excerpts of the schema; the full block above is the fallback and the baseline
+        self.schema_index = SchemaIndex(
+            self.db._engine, tables=self.db.get_usable_table_names()
+        ) if settings.SCHEMA_PRUNING_ENABLED else None
+        self.schema_tokens = count_tokens(self.db_schema)
+
+        # Known player and clan names, so most username checks never reach the LLM
+        self.entities = EntityDirectory(
+            self.db._engine,
+            refresh_seconds=settings.ENTITY_REFRESH_SECONDS,
+            on_new_rows=self.result_cache.invalidate if self.result_cache else None
+        )
+
+        # Common single-fact questions answered by a prepared statement and a template, without the LLM
+        self.intents = IntentRegistry(build_handlers(self.db._engine)) if settings.INTENT_HANDLERS_ENABLED else None
+        if self.intents is not None:
+            metrics.register_collector("intent_handlers", self.intents.stats)
+
+        # Per-player totals folded in from new activity rows, answered with one primary-key lookup
+        self.player_summary = PlayerSummary(
+            self.db._engine,
+            refresh_seconds=settings.PLAYER_SUMMARY_REFRESH_SECONDS,
+            on_change=self.result_cache.invalidate if self.result_cache else None,
+            rebuild_seconds=settings.PLAYER_SUMMARY_REBUILD_SECONDS
+        ) if settings.PLAYER_SUMMARY_ENABLED and SUMMARY_TABLE in self.db.get_usable_table_names() else None
+        if self.player_summary is not None:
+            metrics.register_collector("player_summary", self.player_summary.stats)
+
+        # Sorted boards per (season, region), so rank and top-N questions skip the ORDER BY
+        self.leaderboard = LeaderboardIndex(
+            self.db._engine,
+            refresh_seconds=settings.LEADERBOARD_REFRESH_SECONDS,
+            reload_seconds=settings.LEADERBOARD_RELOAD_SECONDS
+        ) if settings.LEADERBOARD_INDEX_ENABLED else None
+        if self.leaderboard is not None:
+            metrics.register_collector("leaderboard_index", self.leaderboard.stats)
+
+        # Aggregates over purchases and matches computed from an in-memory columnar copy instead of SQL scans
+        self.analytics = AnalyticsMirror(
+            self.db._engine,
+            refresh_seconds=settings.ANALYTICS_REFRESH_SECONDS
+        ) if settings.ANALYTICS_MIRROR_ENABLED else None
+        if self.analytics is not None:
+            metrics.register_collector("analytics_mirror", self.analytics.stats)
         
         # Create a chain for converting SQL results to natural language
         # Use 'question' as the key for the original user query
@@ -55,23 +170,12 @@ class DynamicDataAgent:
 
         # Create a schema-driven SQL generation prompt
         self.sql_gen_prompt = ChatPromptTemplate.from_template("""
-        You are an SQL expert. Create a valid SQL query for SQLite based solely on the database schema below.
+        You are an SQL expert. Create a valid SQL query for {dialect_name} based solely on the database schema below.
         
         DATABASE SCHEMA:
         {db_schema}
         
-        SCHEMA ANALYSIS INSTRUCTIONS:
-        1. Analyze the tables and their columns carefully
-        2. Identify the primary keys and foreign key relationships
-        3. For questions about players, use the 'players' table which has 'username' column 
-        4. For questions about rankings, join 'leaderboards' (which has player_id) with 'players' (which has username)
-        5. For questions about clans, use the 'clans' table which has 'clan_name' and 'clan_type' columns
-        6. For questions about purchases, JOIN the 'purchases' table (which has player_id) with 'players' table (which has username)
-        7. IMPORTANT: purchases.player_id links to players.player_id, not by name
-        8. For time-based queries on purchases, use the purchase_date column
-        9. For achievement queries, JOIN the 'achievements' table (which has player_id) with 'players' (which has username)
-        10. In achievements table, 'tier' column indicates the level (e.g., 'gold', 'silver', 'bronze')
-        11. For queries about 'legendary items', filter purchases with "WHERE pur.rarity = 'Legendary'"
+        {guidance}
         
         QUERY CONSTRUCTION RULES:
         - Return ONLY the raw SQL query with no explanations or comments
@@ -80,12 +184,16 @@ class DynamicDataAgent:
         - Use table aliases for readability in JOINs (e.g., 'p' for players, 'pur' for purchases)
         - Limit results to 10 rows unless specifically asked for more
         - Order by relevant fields (e.g., most recent season for leaderboards)
-        - For date/time queries, use date functions (e.g., datetime(purchase_date) > datetime('now', '-7 days'))
+        - {date_rule}
         - When looking up players by name, always use case-insensitive comparison (LOWER(p.username) = LOWER('PlayerName'))
         - Always check if tables need to be joined before querying (e.g., purchases need to join with players)
+        {summary_rule}
         
         User question: {question}
-        SQL query:""")
+        SQL query:""").partial(
+            summary_rule=SUMMARY_RULE if self.player_summary is not None else "",
+            **prompt_fragments(self.dialect)
+        )
         
         # Create direct SQL generation chain
         self.sql_gen_chain = LLMChain(
@@ -93,6 +201,31 @@ class DynamicDataAgent:
             prompt=self.sql_gen_prompt
         )
         
+        # SQL already generated for a question shape is reused with the new names bound as parameters
+        self.sql_templates = SqlTemplateCache(
+            max_entries=settings.SQL_TEMPLATE_MAX_ENTRIES
+        ) if settings.SQL_TEMPLATE_CACHE_ENABLED else None
+
+        # Generated SQL is checked for writes, cartesian joins, missing limits and expensive plans
+        self.sql_guard = SqlGuard.from_engine(
+            self.db._engine,
+            max_rows=settings.SQL_GUARD_MAX_ROWS,
+            max_cost=settings.SQL_GUARD_MAX_COST if settings.SQL_GUARD_EXPLAIN else None,
+            size_refresh_seconds=settings.SQL_GUARD_SIZE_REFRESH_SECONDS
+        ) if settings.SQL_GUARD_ENABLED else None
+
+        # Similar past questions with their SQL, shown to the model in place of the fixed schema rules
+        self.sql_examples = SqlExampleStore(log_path=settings.SQL_EXAMPLES_LOG) if settings.SQL_FEW_SHOT_ENABLED else None
+        if self.sql_examples is not None:
+            skeleton_of = lambda question: self._mask_question(question).skeleton
+            self.sql_examples.load(read_examples(settings.SQL_EXAMPLES_PATH), skeleton_of)
+            self.sql_examples.load(
+                read_examples(settings.SQL_EXAMPLES_LOG),
+                skeleton_of,
+                exclude=rejected_questions(settings.FEEDBACK_DIR)
+            )
+            print(f"Loaded {len(self.sql_examples)} SQL examples")
+        
         # Add a debug print to show input query for troubleshooting
         self.debug = settings.DEBUG
 
@@ -144,21 +277,11 @@ class DynamicDataAgent:
         for pattern in combined_patterns:
             if all(word in query.lower() for word in pattern["trigger"]):
                 try:
-                    # Execute all queries in this pattern
-                    results = []
-                    for sql_query in pattern["queries"]:
-                        print(f"Executing query: {sql_query}")
-                        result = self.db.run(sql_query)
-                        # Extract the count value - should be a single number
-                        if isinstance(result, str) and result.isdigit():
-                            results.append(result)
-                        else:
-                            # Try to get first row first column for COUNT queries
-                            try:
-                                count_value = result.strip().split('\n')[0]
-                                results.append(count_value)
-                            except:
-                                results.append("unknown")
+                    # The counts are independent, so run them concurrently
+                    print(f"Executing queries: {pattern['queries']}")
+                    rows_per_query = await self.adb.fetch_many(pattern["queries"])
+                    # Each COUNT(*) query returns a single row with a single value
+                    results = [rows[0][0] if rows else "unknown" for rows in rows_per_query]
                     
                     # Format the response using the template and results
                     return pattern["response_template"].format(*results)
@@ -176,15 +299,41 @@ class DynamicDataAgent:
         # First check if query contains personal references 
         has_personal_reference = any(ref in query.lower() for ref in ["my ", "me ", "i ", "mine"])
         
-        # Only use LLM for username detection if we have personal references
+        # Only look for a username if we have personal references
         # or the query is about player-specific data
         needs_username_check = has_personal_reference or any(topic in query.lower() 
                                for topic in ["achievement", "rank", "status", "purchase", "level", "xp"])
         
         has_username = False
         detected_username = None
-        
+
+        # Exact mentions of known players are found locally in microseconds
         if needs_username_check:
+            self.entities.maybe_refresh()
+            mentions = self.entities.find_players(query)
+            if mentions:
+                has_username = True
+                detected_username = mentions[0].name
+                metrics.incr("dynamic.username.local")
+                print(f"Detected username locally: {detected_username}")
+
+        # Misspelt names ("Dragonslayer 99", "Fire Mages") are corrected locally before SQL generation
+        if not has_username and not self.entities.find_clans(query):
+            query, fuzzy_username, follow_up = self._resolve_misspelt_entity(query)
+            if follow_up:
+                return follow_up
+            if fuzzy_username:
+                has_username, detected_username = True, fuzzy_username
+
+        # A name we have never seen ends the query here, before any LLM or SQL work
+        if not has_username:
+            unknown = self.unknown_entity(query)
+            if unknown:
+                return self.unknown_entity_answer(unknown)
+
+        # The LLM detector only runs for personal queries the local indexes could not resolve
+        if needs_username_check and not has_username and has_personal_reference:
+            metrics.incr("dynamic.username.llm")
             # Use the LLM to detect if there's a username in the query
             detection_result = await self.username_detector.ainvoke({"query": query})
             
@@ -219,29 +368,65 @@ class DynamicDataAgent:
             if combined_response:
                 return combined_response
 
-            # Generate SQL query with our simplified approach
-            print(f"Generating SQL for query: {enhanced_query}")
-            
-            # Get SQL from LLM based on schema - no more hardcoded patterns
-            sql_response = await self.sql_gen_chain.ainvoke({
-                "question": enhanced_query,
-                "db_schema": self.db_schema
-            })
-            
-            if isinstance(sql_response, dict) and "text" in sql_response:
-                sql_query = sql_response["text"].strip()
+            # Rank, top-N and neighbourhood questions are answered from the in-memory boards
+            leaderboard_response = self._answer_from_leaderboard(query)
+            if leaderboard_response:
+                return leaderboard_response
+
+            # A single total about one player comes straight from the rollup
+            summary_response = await self._answer_from_summary(query)
+            if summary_response:
+                return summary_response
+
+            # A question shape seen before runs its validated template without the LLM
+            masked = self._mask_question(enhanced_query)
+            analytics = self._run_analytics(enhanced_query)
+            template = self.sql_templates.lookup(masked.skeleton) if self.sql_templates is not None and analytics is None else None
+            if template:
+                # Bound values come from the question ("top 100000 players"), so the template is guarded on every use
+                template, template_params, rejection = await self._guard_template(template, masked.values)
+                if rejection:
+                    metrics.incr("dynamic.sql_template.rejected")
+                    print(f"SQL template rejected ({rejection}), generating SQL instead")
+                    template = None
+            if analytics is not None:
+                # Aggregates over all players come from the columnar mirror; only the response needs the LLM
+                sql_query, sql_result = analytics
+            elif template:
+                metrics.incr("dynamic.sql_template.hit")
+                sql_query = render(template, template_params)
+                print(f"Reusing SQL template for '{masked.skeleton}': {template}")
+                sql_result = await self.adb.run(template, template_params)
             else:
-                sql_query = str(sql_response).strip()
-            
-            # Clean up before execution
-            sql_query = self._clean_sql_query(sql_query)
-            print(f"Generated SQL query: {sql_query}")
-            
-            # Execute the SQL query
-            print(f"Executing SQL query: {sql_query}") 
-            
-            # Execute the SQL against our database
-            sql_result = self.db.run(sql_query)
+                if self.sql_templates is not None:
+                    metrics.incr("dynamic.sql_template.miss")
+                # Generate SQL query with our simplified approach
+                print(f"Generating SQL for query: {enhanced_query}")
+                sql_query = await self._generate_sql(enhanced_query, masked.skeleton)
+                
+                # Unsafe or expensive SQL gets one regeneration with the reason it was rejected
+                sql_query, rejection = await self._guard_sql(sql_query)
+                if rejection:
+                    metrics.incr("dynamic.sql_guard.regenerated")
+                    print(f"Generated SQL rejected ({rejection}), regenerating")
+                    sql_query = await self._generate_sql(enhanced_query, masked.skeleton, rejection)
+                    sql_query, rejection = await self._guard_sql(sql_query)
+                    if rejection:
+                        metrics.incr("dynamic.sql_guard.rejected")
+                        print(f"Regenerated SQL rejected ({rejection})")
+                        return "I couldn't put together a safe lookup for that question. Please try asking it more specifically."
+                
+                # Execute the SQL query
+                print(f"Executing SQL query: {sql_query}") 
+                
+                # Execute the SQL against our database
+                sql_result = await self.adb.run(sql_query)
+
+                # SQL that ran and found rows is kept as the template for this question shape
+                if self.sql_templates is not None and sql_result.strip() and self.sql_templates.learn(masked, sql_query):
+                    metrics.incr("dynamic.sql_template.learned")
+                if self.sql_examples is not None and sql_result.strip():
+                    self.sql_examples.learn(enhanced_query, sql_query, masked.skeleton)
             
             print(f"SQL result: {sql_result}")
             
@@ -289,6 +474,9 @@ class DynamicDataAgent:
             else:
                 return f"Based on the database, I found: {sql_result}"
                 
+        except asyncio.TimeoutError:
+            print(f"SQL query timed out after {settings.DB_STATEMENT_TIMEOUT_SECONDS}s: {enhanced_query}")
+            return "That lookup is taking longer than expected. Please try again in a moment or narrow down your question."
         except KeyError as ke:
             print(f"KeyError in dynamic agent: {ke}")
             print(f"Query that caused error: {enhanced_query}")
@@ -298,6 +486,202 @@ class DynamicDataAgent:
             print(f"Error in dynamic agent: {str(e)}")
             return "I encountered an error while retrieving that information. Please try rephrasing your question or contact support if the issue persists."
     
+    async def answer_intent(self, query: str) -> Optional[str]:
+        """The templated answer when an intent handler matches the query, or None to take the usual path."""
+        if self.intents is None:
+            return None
+        started = time.perf_counter()
+        self.entities.maybe_refresh()
+        match = self.intents.match(query, self.entities.find_players(query), self.entities.find_clans(query))
+        if match is None:
+            metrics.incr("dynamic.intent.miss")
+            return None
+        try:
+            rows = await self.adb.fetch(match.handler.sql, match.params)
+        except Exception as e:
+            # The usual path still has its own error handling, so a failed lookup only loses the shortcut
+            metrics.incr("dynamic.intent.error")
+            print(f"Intent {match.handler.name} failed, falling back: {e}")
+            return None
+        answer = self.intents.answer(match, rows)
+        if answer is None:
+            metrics.incr("dynamic.intent.no_data")
+            return None
+        metrics.incr(f"dynamic.intent.{match.handler.name}")
+        metrics.observe("dynamic.intent.seconds", time.perf_counter() - started, buckets=INTENT_BUCKETS)
+        print(f"Answered by intent {match.handler.name}: {answer}")
+        return answer
+
+    def _answer_from_leaderboard(self, query: str) -> Optional[str]:
+        """The answer from the leaderboard index for rank, top-N and neighbourhood questions."""
+        if self.leaderboard is None or self.entities.find_clans(query):
+            return None
+        self.leaderboard.maybe_refresh()
+        players = list(dict.fromkeys(mention.name for mention in self.entities.find_players(query)))
+        answer = self.leaderboard.answer(query, players)
+        if answer:
+            metrics.incr("dynamic.leaderboard.answered")
+            print(f"Answered from the leaderboard index: {answer}")
+        return answer
+
+    def _run_analytics(self, query: str) -> Optional[Tuple[str, str]]:
+        """(equivalent SQL, formatted rows) for an aggregate question the columnar mirror can answer."""
+        if self.analytics is None or self.entities.find_players(query) or self.entities.find_clans(query):
+            return None
+        self.analytics.maybe_refresh()
+        analytics_query = self.analytics.parse_question(query)
+        if analytics_query is None:
+            return None
+        started = time.perf_counter()
+        rows = self.analytics.run(analytics_query)
+        metrics.incr("dynamic.analytics.answered")
+        metrics.observe("dynamic.analytics.seconds", time.perf_counter() - started, buckets=ANALYTICS_BUCKETS)
+        sql = self.analytics.sql_for(analytics_query)
+        print(f"Answered from the analytics mirror ({sql}): {rows}")
+        return sql, format_rows(rows)
+
+    async def _answer_from_summary(self, query: str) -> Optional[str]:
+        """The answer from player_summary when the query asks one total about one known player."""
+        if self.player_summary is None or self.entities.find_clans(query):
+            return None
+        mentions = self.entities.find_players(query)
+        names = {mention.name for mention in mentions}
+        if len(names) != 1 or summary_question(query, mentions) is None:
+            return None
+        self.player_summary.maybe_refresh()
+        player_id = self.player_summary.player_id(names.pop())
+        if player_id is None:
+            return None
+        rows = await self.adb.fetch(LOOKUP_SQL, {"player_id": player_id})
+        answer = summary_answer(query, mentions, dict(zip(SUMMARY_COLUMNS, rows[0]))) if rows else None
+        metrics.incr("dynamic.summary.answered" if answer else "dynamic.summary.missing")
+        if answer:
+            print(f"Answered from player_summary: {answer}")
+        return answer
+
+    def unknown_entity(self, query: str, require_slot: bool = False) -> Optional[str]:
+        """A player or clan name in the query that does not exist, if any (see EntityDirectory.unknown_entity)."""
+        self.entities.maybe_refresh()
+        if self.entities.find_players(query) or self.entities.find_clans(query):
+            return None
+        unknown = self.entities.unknown_entity(
+            query, fuzzy_min_score=settings.FUZZY_SUGGEST_SCORE, require_slot=require_slot
+        )
+        if unknown:
+            metrics.incr("dynamic.unknown_entity")
+            print(f"No player or clan named {unknown}")
+        return unknown
+
+    @staticmethod
+    def unknown_entity_answer(name: str) -> str:
+        return f"I couldn't find a player or clan named {name} in our records. Please check the spelling of the name."
+
+    def _resolve_misspelt_entity(self, query: str) -> Tuple[str, Optional[str], Optional[str]]:
+        """
+        Return (query, player name, follow-up question).
+
+        A clear near-match is substituted into the query, so SQL generation sees the exact
+        name; an ambiguous one produces a follow-up listing the candidates instead.
+        """
+        self.entities.maybe_refresh()
+        found = self.entities.resolve_fuzzy(query, min_score=settings.FUZZY_SUGGEST_SCORE)
+        if not found:
+            return query, None, None
+        kind, span = found
+        best = span.matches[0]
+        runner_up = span.matches[1].score if len(span.matches) > 1 else 0.0
+        if best.score >= settings.FUZZY_ACCEPT_SCORE and best.score - runner_up >= settings.FUZZY_MIN_MARGIN:
+            metrics.incr("dynamic.fuzzy.resolved")
+            print(f"Resolved '{span.text}' to {kind} {best.name} (similarity {best.score})")
+            corrected = query[:span.start] + best.name + query[span.end:]
+            return corrected, best.name if kind == "player" else None, None
+        metrics.incr("dynamic.fuzzy.ambiguous")
+        options = " or ".join(match.name for match in span.matches)
+        return query, None, f"I couldn't find a {kind} named '{span.text}'. Did you mean {options}?"
+
+    async def _generate_sql(self, question: str, skeleton: str, rejection: Optional[str] = None) -> str:
+        """SQL for the question from the LLM, cleaned; rejection explains why a previous attempt failed."""
+        guidance = self._sql_guidance(skeleton)
+        if rejection:
+            guidance += f"\n\nA previous query for this question was rejected because {rejection}. Write a query that avoids this."
+        # Get SQL from LLM based on schema - no more hardcoded patterns
+        started = time.perf_counter()
+        sql_response = await self.sql_gen_chain.ainvoke({
+            "question": question,
+            "db_schema": self._schema_for(question),
+            "guidance": guidance
+        })
+        metrics.observe("dynamic.sql_gen.seconds", time.perf_counter() - started, buckets=SQL_GEN_BUCKETS)
+        
+        if isinstance(sql_response, dict) and "text" in sql_response:
+            sql_query = sql_response["text"].strip()
+        else:
+            sql_query = str(sql_response).strip()
+        
+        # Clean up before execution
+        sql_query = rewrite_for_dialect(self._clean_sql_query(sql_query), self.dialect)
+        print(f"Generated SQL query: {sql_query}")
+        return sql_query
+
+    async def _guard_sql(self, sql_query: str) -> Tuple[str, Optional[str]]:
+        """Return (sql, rejection reason); the SQL may come back with a LIMIT added."""
+        if self.sql_guard is None:
+            return sql_query, None
+        result = self.sql_guard.check(sql_query)
+        for warning in result.warnings:
+            metrics.incr("dynamic.sql_guard.warnings")
+            print(f"SQL guard warning: {warning}")
+        if not result.ok:
+            return sql_query, "; ".join(result.errors)
+        if result.sql != sql_query:
+            metrics.incr("dynamic.sql_guard.rewritten")
+        return result.sql, await self.sql_guard.check_plan(self.adb, result.sql)
+
+    async def _guard_template(self, template: str, values: Dict) -> Tuple[str, Dict, Optional[str]]:
+        """Return (template, values, rejection reason) with LIMIT-bound values lowered to the row bound."""
+        if self.sql_guard is None:
+            return template, values, None
+        result = self.sql_guard.check(template)
+        if not result.ok:
+            return template, values, "; ".join(result.errors)
+        values = self.sql_guard.bound_params(result.sql, values)
+        return result.sql, values, await self.sql_guard.check_plan(self.adb, result.sql, values)
+
+    def _sql_guidance(self, skeleton: str) -> str:
+        """Few-shot examples for the question shape, or the generic schema rules if none are similar."""
+        examples = self.sql_examples.search(skeleton, k=settings.SQL_FEW_SHOT_K) if self.sql_examples is not None else []
+        if not examples:
+            metrics.incr("dynamic.sql_examples.none")
+            return SCHEMA_RULES
+        metrics.incr("dynamic.sql_examples.used", len(examples))
+        examples = [example._replace(sql=rewrite_for_dialect(example.sql, self.dialect)) for example in examples]
+        return "EXAMPLES OF CORRECT QUERIES FOR SIMILAR QUESTIONS:\n" + format_examples(examples)
+
+    def _schema_for(self, query: str) -> str:
+        """The part of the schema SQL generation needs for this question."""
+        if self.schema_index is None:
+            return self.db_schema
+        tables = []
+        if self.entities.find_players(query):
+            tables.append("players")
+        if self.entities.find_clans(query):
+            tables.append("clans")
+        schema = self.schema_index.prune(query, tables)
+        if schema is None:
+            metrics.incr("dynamic.schema.full")
+            return self.db_schema
+        tokens = count_tokens(schema)
+        metrics.incr("dynamic.schema.prompt_tokens", tokens)
+        metrics.incr("dynamic.schema.prompt_tokens_saved", self.schema_tokens - tokens)
+        print(f"Pruned schema to {tokens} of {self.schema_tokens} tokens")
+        return schema
+
+    def _mask_question(self, query: str) -> MaskedQuestion:
+        """The question with known player and clan names and numbers replaced by slots."""
+        entities = [("player", mention) for mention in self.entities.find_players(query)]
+        entities += [("clan", mention) for mention in self.entities.find_clans(query)]
+        return mask_question(query, entities)
+
     def _clean_sql_query(self, query: str) -> str:
         """Clean the SQL query to avoid multiple statement execution issues."""
         # Remove any trailing semicolons
@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, Optional
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
@@ -12,13 +12,18 @@ import re
 logger = logging.getLogger("uvicorn.error")
 
 class HybridAgent:
-    def __init__(self):
+    def __init__(
+        self,
+        static_agent: Optional[StaticKnowledgeAgent] = None,
+        dynamic_agent: Optional[DynamicDataAgent] = None
+    ):
         self.llm = ChatOpenAI(
             api_key=settings.OPENAI_API_KEY,
             temperature=0
         )
-        self.static_agent = StaticKnowledgeAgent()
-        self.dynamic_agent = DynamicDataAgent()
+        # Reuse the router's agents when given, so indexes and caches exist once per worker
+        self.static_agent = static_agent or StaticKnowledgeAgent()
+        self.dynamic_agent = dynamic_agent or DynamicDataAgent()
         
         self.combiner_prompt = ChatPromptTemplate.from_messages([
             ("system", f"""{rules_block()}
@@ -6,10 +6,12 @@ from app.schemas.support import SourceType
 from app.services.agents.static_agent import StaticKnowledgeAgent
 from app.services.agents.dynamic_agent import DynamicDataAgent
 from app.services.agents.hybrid_agent import HybridAgent
+from app.services.data.fuzzy import DOMAIN_WORDS
 from app.core.config import settings
 from app.policies.rules import rules_block
 from langsmith import traceable, RunTree
 from datetime import datetime
+import re
 
 class QueryResponse:
     def __init__(
@@ -79,7 +81,7 @@ Respond with exactly one uppercase category name (STATIC, DYNAMIC, HYBRID, FOLLO
         # Initialize agents
         self.static_agent = StaticKnowledgeAgent()
         self.dynamic_agent = DynamicDataAgent()
-        self.hybrid_agent = HybridAgent()
+        self.hybrid_agent = HybridAgent(self.static_agent, self.dynamic_agent)
         # self.jira_client = JiraClient()  # REMOVE eager JIRA init
 
     @traceable(name="route_query")
@@ -149,6 +151,28 @@ Respond with exactly one uppercase category name (STATIC, DYNAMIC, HYBRID, FOLLO
                 ticket_id=ticket_id
             )
         
+        # Resolve follow-ups ("Are they difficult to obtain?") against recent turns, so the
+        # classifier and every agent see a self-contained question
+        query = self.static_agent.rewrite_query(query, conversation_history)
+
+        # Questions about the data of a player or clan that does not exist need no classification at all.
+        # Before classification a name-like token only counts in a player or clan position, since
+        # support questions name products and platforms ("PayPal", "PlayStation") too
+        unknown = None
+        if DOMAIN_WORDS.intersection(re.findall(r"[a-z]+", query.lower())):
+            unknown = self.dynamic_agent.unknown_entity(query, require_slot=True)
+        if unknown:
+            return QueryResponse(
+                answer=self.dynamic_agent.unknown_entity_answer(unknown),
+                source_type=SourceType.DYNAMIC
+            )
+
+        # Single-fact questions about one player or clan are answered from a template, skipping
+        # the classifier, username detection, SQL generation and response phrasing
+        answer = await self.dynamic_agent.answer_intent(query)
+        if answer:
+            return QueryResponse(answer=answer, source_type=SourceType.DYNAMIC)
+
         # Otherwise proceed with regular classification
         classification_result = await self.classifier_chain.ainvoke({"query": query})
         query_type = classification_result.get("text", "").strip().upper()
@@ -2,13 +2,27 @@ from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter, CharacterTextSplitter
 from langchain_openai import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.question_answering import load_qa_chain
+from langchain.docstore.document import Document
 from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.policies.rules import rules_block
+from app.services.retrieval.adaptive_k import count_tokens, select_context
+from app.services.retrieval.answer_cache import SemanticAnswerCache
+from app.services.retrieval.bm25 import BM25Index, is_decisive, reciprocal_rank_fusion
+from app.services.retrieval.extractive import extractive_answer, in_traffic_share
+from app.services.retrieval.ingestion import ingest, iter_chunks
+from app.services.retrieval.mmap_store import MmapVectorStore
+from app.services.retrieval.quantization import IndexParams
+from app.services.retrieval.query_rewrite import QueryRewriter
+from app.services.retrieval.sharding import DEFAULT_SHARD_TOPICS, ShardRouter, build_shards, shards_current
 from langchain.prompts import ChatPromptTemplate
 from langsmith import traceable
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -21,7 +35,15 @@ class StaticKnowledgeAgent:
             api_key=settings.OPENAI_API_KEY,
             temperature=0
         )
-        self.vector_store = self._initialize_vector_store()
+        self._load_knowledge_base()
+
+        # Answers keyed by query embedding, dropped whenever the index version changes
+        self.answer_cache = SemanticAnswerCache(
+            threshold=settings.ANSWER_CACHE_THRESHOLD,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            version=self.index_version
+        )
+        metrics.register_collector("static_answer_cache", self._cache_stats)
         
         # Build a custom QA prompt that includes shared agent rules
         qa_prompt = ChatPromptTemplate.from_messages([
@@ -46,85 +68,321 @@ NEVER generate information not contained in the context."""),
             ("human", "Question: {question}\nContext:\n{context}")
         ])
         
-        # Configure retriever for better performance
-        retriever = self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 2}  # Limit to top 2 most relevant chunks only
-        )
-        
-        # Use the standard chain but with our improved prompt and retriever
-        self.qa_chain = ConversationalRetrievalChain.from_llm(
+        # Retrieval happens in _retrieve, so the chain only stuffs the chosen chunks into the prompt
+        self.qa_chain = load_qa_chain(
             llm=self.llm,
-            retriever=retriever,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            return_source_documents=True,
+            chain_type="stuff",
+            prompt=qa_prompt,
             verbose=True  # Enable verbose mode for debugging
         )
 
+    def _load_knowledge_base(self):
+        self.vector_store = self._initialize_vector_store()
+
+        # Lexical index over the same chunks, in vector store order
+        self.documents = self._load_documents()
+        self.lexical_index = BM25Index(doc.page_content for doc in self.documents)
+        logger.info(f"Built BM25 index over {len(self.lexical_index)} chunks")
+        self.query_rewriter = QueryRewriter(doc.page_content for doc in self.documents)
+
+        # BM25 stays global; only the vector search is narrowed to the routed shards
+        self.shard_router = None
+        if isinstance(self.vector_store, MmapVectorStore) and self.vector_store.shards:
+            self.shard_router = ShardRouter(
+                self.vector_store.shards,
+                self.vector_store.shard_centroids,
+                self._shard_topics(),
+                min_centroid_margin=settings.SHARD_MIN_CENTROID_MARGIN
+            )
+
+        if isinstance(self.vector_store, MmapVectorStore):
+            self.index_version = self.vector_store.version
+        else:
+            digest = hashlib.sha256("\n".join(doc.page_content for doc in self.documents).encode("utf-8"))
+            self.index_version = digest.hexdigest()[:16]
+        self._manifest_mtime = self._current_manifest_mtime()
+        self._version_checked_at = time.monotonic()
+
+    def _current_manifest_mtime(self) -> Optional[float]:
+        manifest = Path(settings.VECTOR_STORE_PATH) / "manifest.json"
+        return manifest.stat().st_mtime if manifest.exists() else None
+
+    def _check_index_version(self):
+        """Pick up a rebuilt knowledge base index and invalidate cached answers with it."""
+        now = time.monotonic()
+        if now - self._version_checked_at < settings.KNOWLEDGE_BASE_RELOAD_SECONDS:
+            return
+        self._version_checked_at = now
+        if not isinstance(self.vector_store, MmapVectorStore) or self._current_manifest_mtime() == self._manifest_mtime:
+            return
+        logger.info("Knowledge base index changed on disk, reloading")
+        previous = self.vector_store
+        self._load_knowledge_base()
+        self.answer_cache.set_version(self.index_version)
+        # The new store replaced every reference to the old one, so its files can be released
+        previous.close()
+
+    def _cache_stats(self) -> dict:
+        stats = self.answer_cache.stats()
+        stats["static_queries"] = metrics.counter("static.queries")
+        stats["served_without_llm"] = metrics.counter("static.answered_without_llm")
+        stats["share_without_llm"] = metrics.ratio("static.answered_without_llm", "static.queries")
+        stats["extractive_eligible"] = metrics.counter("static.extractive.eligible")
+        stats["extractive_served"] = metrics.counter("static.extractive.served")
+        stats["extractive_share"] = metrics.ratio("static.extractive.served", "static.queries")
+        return stats
+
     @traceable(name="initialize_vector_store")
     def _initialize_vector_store(self):
-        # Check if we have a saved vector store
         vector_store_path = Path(settings.VECTOR_STORE_PATH)
-        if vector_store_path.exists():
-            logger.info(f"Loading existing vector store from {vector_store_path}")
-            return FAISS.load_local(
+        legacy_index = vector_store_path / "index.faiss"
+
+        if settings.VECTOR_STORE_FORMAT.lower() == "faiss":
+            if legacy_index.exists():
+                logger.info(f"Loading existing FAISS vector store from {vector_store_path}")
+                return FAISS.load_local(
+                    str(vector_store_path),
+                    self.embeddings,
+                    allow_dangerous_deserialization=True
+                )
+            chunks = list(self._knowledge_chunks())
+            vector_store = FAISS.from_texts(
+                [chunk.text for chunk in chunks],
+                self.embeddings,
+                metadatas=[chunk.metadata for chunk in chunks]
+            )
+            vector_store.save_local(str(vector_store_path))
+            return vector_store
+
+        # Native format: a manifest read plus read-only memory maps, no unpickling
+        if MmapVectorStore.exists(str(vector_store_path)):
+            logger.info(f"Memory-mapping vector store from {vector_store_path} ({settings.VECTOR_INDEX_TYPE} index)")
+            return self._load_mmap_store(vector_store_path)
+
+        if legacy_index.exists():
+            # One-time migration that reuses the stored vectors instead of re-embedding
+            logger.info(f"Migrating legacy FAISS store at {vector_store_path} to the mmap format")
+            legacy = FAISS.load_local(
                 str(vector_store_path),
                 self.embeddings,
                 allow_dangerous_deserialization=True
             )
+            documents = self._faiss_documents(legacy)
+            MmapVectorStore.write(
+                str(vector_store_path),
+                [doc.page_content for doc in documents],
+                legacy.index.reconstruct_n(0, legacy.index.ntotal),
+                [doc.metadata for doc in documents]
+            )
+        else:
+            # Stream the knowledge base through the chunker and embed in parallel batches
+            logger.info(f"Creating new vector store from {settings.KNOWLEDGE_BASE_PATH}")
+            manifest = ingest(
+                settings.KNOWLEDGE_BASE_PATH,
+                str(vector_store_path),
+                self.embeddings,
+                chunker=settings.KNOWLEDGE_CHUNKER,
+                chunk_size=settings.CHUNK_SIZE,
+                chunk_overlap=settings.CHUNK_OVERLAP,
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                workers=settings.EMBEDDING_WORKERS
+            )
+            logger.info(f"Indexed {manifest['count']} chunks with the {settings.KNOWLEDGE_CHUNKER} chunker")
 
-        # Create new vector store from knowledge base
-        knowledge_base_path = Path(settings.KNOWLEDGE_BASE_PATH)
-        logger.info(f"Creating new vector store from {knowledge_base_path}")
-        with open(knowledge_base_path) as f:
-            raw_text = f.read()
+        return self._load_mmap_store(vector_store_path)
 
-        # Process one bullet point at a time for precise retrieval
-        lines = raw_text.split('\n')
-        texts = []
-        
-        for line in lines:
-            if line.strip().startswith('- '):
-                texts.append(line.strip())
-        
-        logger.info(f"Split knowledge base into {len(texts)} individual bullet points")
-        for i, text in enumerate(texts):
-            logger.info(f"Bullet point {i+1}: {text}")
-        
-        vector_store = FAISS.from_texts(
-            texts,
-            self.embeddings
+    def _load_mmap_store(self, vector_store_path: Path) -> MmapVectorStore:
+        if settings.VECTOR_SHARDING and not shards_current(str(vector_store_path), self._shard_topics()):
+            logger.info(f"Grouping vector store at {vector_store_path} into topic shards")
+            build_shards(str(vector_store_path), self._shard_topics())
+        return MmapVectorStore.load(
+            str(vector_store_path),
+            self.embeddings,
+            sharded=settings.VECTOR_SHARDING,
+            index_type=settings.VECTOR_INDEX_TYPE,
+            index_params=IndexParams(
+                pq_m=settings.VECTOR_PQ_M,
+                pq_nbits=settings.VECTOR_PQ_NBITS,
+                ivf_nlist=settings.VECTOR_IVF_NLIST,
+                ivf_nprobe=settings.VECTOR_IVF_NPROBE,
+                hnsw_m=settings.VECTOR_HNSW_M,
+                hnsw_ef_search=settings.VECTOR_HNSW_EF_SEARCH
+            )
         )
-        
-        # Save for future use
-        vector_store.save_local(str(vector_store_path))
-        return vector_store
+
+    @staticmethod
+    def _shard_topics() -> dict:
+        return settings.SHARD_TOPICS or DEFAULT_SHARD_TOPICS
+
+    def _knowledge_chunks(self):
+        return iter_chunks(
+            settings.KNOWLEDGE_BASE_PATH,
+            chunker=settings.KNOWLEDGE_CHUNKER,
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP
+        )
+
+    @staticmethod
+    def _faiss_documents(vector_store: FAISS) -> List[Document]:
+        """Return a FAISS store's chunks in the order FAISS assigned them."""
+        return [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            for i in range(len(vector_store.index_to_docstore_id))
+        ]
+
+    def _load_documents(self) -> Sequence[Document]:
+        """Positional access to the indexed chunks, matching vector store order."""
+        if isinstance(self.vector_store, MmapVectorStore):
+            return self.vector_store.documents
+        return self._faiss_documents(self.vector_store)
+
+    def _vector_search(self, query: str, query_vector: List[float], k: int) -> List[Tuple[Document, float]]:
+        relevance = self.vector_store._select_relevance_score_fn()
+        options = {}
+        if self.shard_router:
+            shards, reason = self.shard_router.select(query, query_vector)
+            metrics.incr(f"static.shards.{reason}")
+            metrics.observe("static.shards.rows_fraction", self.shard_router.rows(shards) / max(1, len(self.documents)))
+            logger.info(f"Vector search over shards {shards or 'all'} ({reason})")
+            options["shards"] = shards
+        return [
+            (doc, relevance(score))
+            for doc, score in self.vector_store.similarity_search_with_score_by_vector(query_vector, k=k, **options)
+        ]
+
+    @traceable(name="retrieve_static_context")
+    def _retrieve(
+        self, query: str, k: int
+    ) -> Tuple[List[Tuple[Document, float]], Optional[List[float]], List[Tuple[Document, float]]]:
+        """
+        Retrieve the top k chunks with a relevance score in [0, 1].
+
+        BM25 runs first because it is free. When its top hit is decisive, or
+        RETRIEVAL_MODE is "lexical", the embedding call is skipped entirely.
+        Otherwise vector results are fused with the lexical ranking using
+        reciprocal-rank fusion.
+
+        Also returns the query embedding, or None when none was computed, and
+        the BM25 hits with their normalised scores (empty in "vector" mode).
+        """
+        mode = settings.RETRIEVAL_MODE.lower()
+        candidates = max(k, settings.RETRIEVAL_CANDIDATES)
+
+        lexical_hits = []
+        if mode != "vector":
+            lexical_hits = [
+                (self.documents[doc_id], score)
+                for doc_id, score in self.lexical_index.search(query, k=candidates)
+            ]
+            if mode == "lexical" or is_decisive(
+                lexical_hits, settings.LEXICAL_DECISIVE_SCORE, settings.LEXICAL_DECISIVE_MARGIN
+            ):
+                logger.info(f"Lexical retrieval served query without embedding ({mode} mode)")
+                return lexical_hits[:k], None, lexical_hits
+
+        query_vector = self.embeddings.embed_query(query)
+        vector_hits = self._vector_search(query, query_vector, k=candidates)
+        if mode == "vector" or not lexical_hits:
+            return vector_hits[:k], query_vector, lexical_hits
+
+        # Fuse by chunk text and report the normalised fused score: BM25 and cosine scores are not
+        # comparable, and only a score that falls with the fused rank lets adaptive k cut at a gap
+        by_text = {doc.page_content: doc for doc, _ in lexical_hits}
+        by_text.update({doc.page_content: doc for doc, _ in vector_hits})
+        fused = reciprocal_rank_fusion(
+            [
+                [doc.page_content for doc, _ in lexical_hits],
+                [doc.page_content for doc, _ in vector_hits]
+            ],
+            k=settings.RRF_K,
+            normalize=True
+        )
+        return [(by_text[text], score) for text, score in fused[:k]], query_vector, lexical_hits
+
+    def _select_context(self, scored_docs: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Cut the candidate window down to the chunks worth their prompt tokens."""
+        if not settings.ADAPTIVE_K_ENABLED:
+            return scored_docs
+        context, tokens = select_context(
+            scored_docs,
+            min_k=settings.ADAPTIVE_K_MIN,
+            max_k=settings.ADAPTIVE_K_MAX,
+            min_score=settings.ADAPTIVE_K_MIN_SCORE,
+            max_gap=settings.ADAPTIVE_K_MAX_GAP,
+            token_budget=settings.CONTEXT_TOKEN_BUDGET
+        )
+        # Savings are measured against the fixed RETRIEVAL_TOP_K the prompt used to get
+        baseline = sum(count_tokens(doc.page_content) for doc, _ in scored_docs[:settings.RETRIEVAL_TOP_K])
+        metrics.observe("static.context.k", len(context), buckets=tuple(range(1, settings.ADAPTIVE_K_MAX + 1)))
+        metrics.incr("static.context.prompt_tokens", tokens)
+        # Adaptive k may send more than RETRIEVAL_TOP_K chunks; that costs tokens rather than saving negative ones
+        metrics.incr("static.context.prompt_tokens_saved", max(0, baseline - tokens))
+        logger.info(f"Adaptive k chose {len(context)} of {len(scored_docs)} chunks ({tokens} tokens, baseline {baseline})")
+        return context
+
+    def rewrite_query(self, query: str, conversation_history: Optional[List[dict]] = None) -> str:
+        """Resolve pronouns and elided topics from recent turns, without an LLM call."""
+        rewritten = self.query_rewriter.rewrite(query, conversation_history)
+        if rewritten != query:
+            logger.info(f"Rewrote follow-up query: '{query}' -> '{rewritten}'")
+            metrics.incr("static.query_rewrites")
+        return rewritten
 
     @traceable(name="answer_static_query")
-    async def answer_query(self, query: str) -> str:
+    async def answer_query(self, query: str, conversation_history: Optional[List[dict]] = None) -> str:
         logger.info(f"Static agent processing query: {query}")
+        metrics.incr("static.queries")
+        self._check_index_version()
+        query = self.rewrite_query(query, conversation_history)
+        
+        use_cache = settings.ANSWER_CACHE_ENABLED
+        # Exact repeats are served before any retrieval work
+        cached = self.answer_cache.lookup(query) if use_cache else None
+        if cached is not None:
+            logger.info("Static answer served from cache (exact match)")
+            metrics.incr("static.answered_without_llm")
+            return cached
         
-        # First, directly retrieve documents to log what's being retrieved
-        docs = self.vector_store.similarity_search(query, k=2)
-        logger.info(f"Retrieved {len(docs)} documents from vector store")
+        window = settings.ADAPTIVE_K_MAX if settings.ADAPTIVE_K_ENABLED else settings.RETRIEVAL_TOP_K
+        scored_docs, query_vector, lexical_hits = self._retrieve(query, k=window)
+        logger.info(f"Retrieved {len(scored_docs)} documents")
         
-        if not docs:
+        if not scored_docs:
+            metrics.incr("static.answered_without_llm")
             return "I don't have information about that in my knowledge base."
         
+        # A semantic hit needs the query embedding, which retrieval computed unless BM25 was decisive
+        if use_cache and query_vector is not None:
+            cached = self.answer_cache.lookup_similar(query_vector)
+            if cached is not None:
+                logger.info("Static answer served from cache (semantic match)")
+                metrics.incr("static.answered_without_llm")
+                return cached
+        
         # Log the retrieved documents for debugging
-        for i, doc in enumerate(docs):
-            logger.info(f"Relevant document {i+1}: {doc.page_content}")
+        for i, (doc, score) in enumerate(scored_docs):
+            logger.info(f"Relevant document {i+1} (score {score:.3f}): {doc.page_content}")
         
-        # Now use the chain to get the answer
+        # When the top chunk is strong and well ahead of the rest, it already is the answer
+        if in_traffic_share(query, settings.EXTRACTIVE_TRAFFIC_SHARE):
+            metrics.incr("static.extractive.eligible")
+            extracted = extractive_answer(
+                query, scored_docs, lexical_hits, settings.EXTRACTIVE_MIN_SCORE, settings.EXTRACTIVE_MIN_MARGIN
+            )
+            if extracted is not None:
+                logger.info("Static answer served extractively from the top chunk")
+                metrics.incr("static.extractive.served")
+                metrics.incr("static.answered_without_llm")
+                return extracted
+        
+        context = self._select_context(scored_docs)
         response = await self.qa_chain.ainvoke({
-            "question": query,
-            "chat_history": []  # We could maintain chat history if needed
+            "input_documents": [doc for doc, _ in context],
+            "question": query
         })
+        metrics.incr("static.llm_calls")
         
-        # Log which documents were actually used
-        if "source_documents" in response:
-            logger.info(f"Chain used {len(response['source_documents'])} source documents")
-            for i, doc in enumerate(response["source_documents"]):
-                logger.info(f"Source document {i+1}: {doc.page_content}")
-        
-        return response["answer"] 
\ No newline at end of file
+        answer = response["output_text"]
+        if use_cache:
+            self.answer_cache.store(query, answer, query_vector)
+        return answer
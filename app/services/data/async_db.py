@@ -0,0 +1,121 @@
+"""
+Non-blocking SQL execution for the dynamic agent.
+
+LangChain's SQLDatabase.run is synchronous, so every generated query used to
+block the event loop, and with it every other request on the worker, for
+its whole round-trip. AsyncDatabase runs statements on a pooled SQLAlchemy
+async engine instead (aiosqlite for SQLite, asyncpg for Postgres), bounds
+each statement with a timeout, and can run independent statements
+concurrently. Given a ResultCache, repeated reads are answered from it
+without touching the database.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.data.result_cache import ResultCache
+
+logger = logging.getLogger("uvicorn.error")
+
+# Same truncation as SQLDatabase.run, so prompts built from results keep their size
+MAX_STRING_LENGTH = 100
+
+Rows = List[Tuple[Any, ...]]
+
+
+def async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+
+def format_rows(rows: Rows) -> str:
+    """Render rows the way SQLDatabase.run does: '' for no rows, else a list of tuples."""
+    if not rows:
+        return ""
+    return str([
+        tuple(value[:MAX_STRING_LENGTH] + "..." if isinstance(value, str) and len(value) > MAX_STRING_LENGTH else value
+              for value in row)
+        for row in rows
+    ])
+
+
+class AsyncDatabase:
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        statement_timeout: float = 10,
+        cache: Optional[ResultCache] = None
+    ):
+        self.url = async_url(url)
+        self.statement_timeout = statement_timeout
+        self.cache = cache
+        options: Dict[str, Any] = {"pool_pre_ping": True}
+        if self.url.startswith("postgresql+asyncpg"):
+            options.update(
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+                # Enforced by the server too, so a cancelled request does not leave the query running
+                connect_args={"server_settings": {"statement_timeout": str(int(statement_timeout * 1000))}},
+            )
+        self.engine = create_async_engine(self.url, **options)
+        # SQLite connections are not pooled, so bound the number of statements in flight explicitly
+        self._slots = asyncio.Semaphore(pool_size + max_overflow)
+
+    async def fetch(
+        self,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        use_cache: bool = True
+    ) -> Rows:
+        """The statement's rows; with use_cache=False read from the database and leave the result cache alone."""
+        if not use_cache:
+            async with self._slots:
+                return await asyncio.wait_for(self._fetch(sql, params or {}), timeout or self.statement_timeout)
+        if self.cache is not None:
+            cached = self.cache.get(sql, params)
+            if cached is not None:
+                return cached
+        async with self._slots:
+            rows = await asyncio.wait_for(self._fetch(sql, params or {}), timeout or self.statement_timeout)
+        if self.cache is not None:
+            self.cache.put(sql, rows, params)
+        return rows
+
+    async def _fetch(self, sql: str, params: Dict[str, Any]) -> Rows:
+        async with self.engine.connect() as connection:
+            result = await connection.execute(text(sql), params)
+            return [tuple(row) for row in result.fetchall()] if result.returns_rows else []
+
+    @property
+    def dialect(self) -> str:
+        return self.engine.dialect.name
+
+    async def explain(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Rows:
+        """The statement's plan (JSON on Postgres, EXPLAIN QUERY PLAN rows on SQLite), never cached."""
+        prefix = "EXPLAIN (FORMAT JSON) " if self.dialect == "postgresql" else "EXPLAIN QUERY PLAN "
+        async with self._slots:
+            return await asyncio.wait_for(self._fetch(prefix + sql, params or {}), self.statement_timeout)
+
+    async def run(self, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Drop-in for SQLDatabase.run."""
+        return format_rows(await self.fetch(sql, params))
+
+    async def fetch_many(self, statements: Sequence[str], use_cache: bool = True) -> List[Rows]:
+        """Run independent statements concurrently, returning their rows in order."""
+        return list(await asyncio.gather(*(self.fetch(sql, use_cache=use_cache) for sql in statements)))
+
+    async def dispose(self):
+        await self.engine.dispose()
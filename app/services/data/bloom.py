@@ -0,0 +1,68 @@
+"""
+Membership filter for known player and clan names.
+
+A Bloom filter answers "definitely not known" from a few bit probes, and an
+exact set confirms the rare positives, so a lookup never reports a false
+positive. Both are keyed by the normalised name, so spacing and case do
+not matter. The bit array is rebuilt at twice the capacity when the number
+of names outgrows it, keeping the false-positive rate near its target.
+"""
+import hashlib
+import math
+from typing import Iterable, Set
+
+from app.services.data.fuzzy import normalize_name
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: h1 + i * h2 gives k independent-enough probes from one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ExistenceFilter:
+    def __init__(self, names: Iterable[str] = (), capacity: int = 10000, error_rate: float = 0.01):
+        self.error_rate = error_rate
+        self._keys: Set[str] = set()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self.bloom_rejections = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, name: str):
+        key = normalize_name(name)
+        if not key or key in self._keys:
+            return
+        self._keys.add(key)
+        if len(self._keys) > self._bloom.capacity:
+            self._bloom = BloomFilter(self._bloom.capacity * 2, self.error_rate)
+            for existing in self._keys:
+                self._bloom.add(existing)
+        else:
+            self._bloom.add(key)
+
+    def __contains__(self, name: str) -> bool:
+        key = normalize_name(name)
+        if key not in self._bloom:
+            self.bloom_rejections += 1
+            return False
+        return key in self._keys
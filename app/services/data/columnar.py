@@ -0,0 +1,499 @@
+"""
+Columnar in-memory mirror of ``purchases`` and ``matches`` for aggregate questions.
+
+Questions such as "How many legendary items were bought last week?" or
+"Average XP gained in ranked matches by region" used to become full-table
+scans in SQL on every request. AnalyticsMirror keeps the columns those
+questions touch as NumPy arrays instead: numbers as float64, dates as
+datetime64 seconds, and strings dictionary-encoded as int32 codes (the
+player's region is copied onto each row from ``players``). Filters are
+boolean masks, grouping is a bincount over codes, so a scan of millions of
+rows takes milliseconds.
+
+The mirror is loaded once and refreshed incrementally from rows above the
+highest primary key already read, like the entity directory. Rows updated
+in place are picked up by reload().
+
+parse_question() turns an aggregate question into an AnalyticsQuery when
+every part of it (table, aggregate, filters, time window, grouping) maps
+onto the mirror, and returns None otherwise so the question goes to SQL.
+"""
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.services.data.directory import PLAYER_ID_COLUMNS, _first_column
+
+logger = logging.getLogger("uvicorn.error")
+
+# Table -> (primary key candidates, {column: (kind, candidates)}); "region" is copied from players
+SOURCES = {
+    "purchases": (("purchase_id", "id"), {
+        "player_id": ("int", ("player_id",)),
+        "rarity": ("category", ("rarity",)),
+        "item_type": ("category", ("item_type",)),
+        "item_name": ("category", ("item_name",)),
+        "price": ("float", ("price",)),
+        "date": ("time", ("purchase_date", "timestamp")),
+    }),
+    "matches": (("match_id", "id"), {
+        "player_id": ("int", ("player_id",)),
+        "match_type": ("category", ("match_type", "type")),
+        "result": ("category", ("result",)),
+        "xp_gained": ("float", ("xp_gained",)),
+        "date": ("time", ("match_date", "timestamp")),
+    }),
+}
+DTYPES = {"int": np.int64, "float": np.float64, "time": "datetime64[s]", "category": np.int32}
+MISSING_CODE = -1
+# Grouped min/max scan once per group up to this many groups, and sort beyond it
+MASK_GROUPS = 32
+
+TABLE_WORDS = {
+    "purchases": re.compile(r"\b(?:bought|buy|purchas\w*|items?|spent|spend|revenue|sales|sold)\b"),
+    "matches": re.compile(r"\b(?:match(?:es)?|games?|played|xp|experience)\b"),
+}
+MEASURE_WORDS = {
+    "purchases": ("price", re.compile(r"\b(?:spent|spend|revenue|prices?|costs?|sales|money|amount|expensive|cheapest)\b")),
+    "matches": ("xp_gained", re.compile(r"\b(?:xp|experience)\b")),
+}
+FUNCTION_WORDS = (
+    ("avg", re.compile(r"\b(?:average|avg|mean)\b")),
+    ("max", re.compile(r"\b(?:highest|max(?:imum)?|most expensive|largest|biggest)\b")),
+    ("min", re.compile(r"\b(?:lowest|min(?:imum)?|cheapest|smallest)\b")),
+    ("sum", re.compile(r"\b(?:total|sum|overall)\b")),
+    ("count", re.compile(r"\b(?:how many|number of|count)\b")),
+)
+# Words for the values stored in result columns
+VALUE_SYNONYMS = {"won": "win", "wins": "win", "victories": "win", "lost": "loss", "losses": "loss", "defeats": "loss"}
+GROUP_WORDS = {
+    "region": "region", "regions": "region", "rarity": "rarity", "rarities": "rarity", "result": "result",
+    "results": "result", "type": "type", "types": "type", "mode": "match_type", "modes": "match_type",
+}
+# "bought by players" names no grouping
+NOT_GROUPS = frozenset({"player", "players", "user", "users", "everyone", "people", "the"})
+# Parts of a question the mirror cannot express: who/which subjects and distinct counts (the mirror
+# counts rows, not players), comparisons, numbers and negation. Any of them left over declines the question.
+UNSUPPORTED_PARTS = re.compile(
+    r"\b(?:who|whom|which|distinct|unique|different|players?|users?|people|customers|accounts"
+    r"|more|less|fewer|greater|over|under|above|below|least|exceed\w*|than|cheaper|pricier"
+    r"|not|no|never|without|except|excluding|none)\b|n't\b|\d"
+)
+# min/max answer a value ("highest price"); without a measure noun ("most expensive item") the question asks for a row
+MEASURE_NOUNS = re.compile(r"\b(?:prices?|costs?|amount|spent|spend|paid|xp|experience)\b")
+UNSUPPORTED_PERIODS = re.compile(r"\b(?:since|between|before|after|yesterday|ago|january|february|march|april|may|june"
+                                 r"|july|august|september|october|november|december|20\d\d)\b")
+
+
+class Filter(NamedTuple):
+    column: str
+    op: str  # "=" (case-insensitive for strings) or ">="
+    value: Any
+
+
+class AnalyticsQuery(NamedTuple):
+    table: str
+    function: str  # count, sum, avg, min or max
+    measure: Optional[str]
+    filters: Tuple[Filter, ...]
+    group_by: Optional[str]
+
+    def to_sql(self, columns: Optional[Dict[str, str]] = None) -> str:
+        """The equivalent SQL, for logs and the response prompt; columns maps mirror names to database ones."""
+        columns = columns or {}
+        alias = "t"
+        joins = ""
+        if self.group_by == "region" or any(f.column == "region" for f in self.filters):
+            joins = f" JOIN players p ON p.player_id = {alias}.player_id"
+
+        def name(column: str) -> str:
+            return "p.region" if column == "region" else f"{alias}.{columns.get(column, column)}"
+
+        aggregate = "COUNT(*)" if self.function == "count" else f"{self.function.upper()}({name(self.measure)})"
+        conditions = [
+            f"LOWER({name(f.column)}) = '{str(f.value).lower()}'" if f.op == "=" else f"{name(f.column)} >= '{f.value}'"
+            for f in self.filters
+        ]
+        sql = f"SELECT {name(self.group_by) + ', ' if self.group_by else ''}{aggregate} FROM {self.table} {alias}{joins}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if self.group_by:
+            sql += f" GROUP BY {name(self.group_by)}"
+        return sql
+
+
+class _Dictionary:
+    """String values <-> int32 codes; lookups are case-insensitive."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._lowered: Dict[str, List[int]] = {}
+
+    def encode(self, values: Sequence) -> np.ndarray:
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None:
+                codes[i] = MISSING_CODE
+                continue
+            value = str(value)
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self.values)
+                self.values.append(value)
+                self._lowered.setdefault(value.lower(), []).append(code)
+            codes[i] = code
+        return codes
+
+    def codes_for(self, value: str) -> List[int]:
+        return self._lowered.get(str(value).lower(), [])
+
+
+class ColumnarTable:
+    def __init__(self, name: str, kinds: Dict[str, str]):
+        self.name = name
+        self.kinds = kinds
+        self.size = 0
+        self._arrays = {column: np.empty(1024, dtype=DTYPES[kind]) for column, kind in kinds.items()}
+        self.dictionaries = {column: _Dictionary() for column, kind in kinds.items() if kind == "category"}
+
+    def append(self, columns: Dict[str, Sequence]):
+        """Append rows given column-wise; every column of the table must be present."""
+        count = len(next(iter(columns.values())))
+        if not count:
+            return
+        needed = self.size + count
+        for column, array in self._arrays.items():
+            if needed > len(array):
+                grown = np.empty(max(needed, 2 * len(array)), dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self._arrays[column] = array = grown
+            array[self.size:needed] = self._convert(column, columns[column])
+        self.size = needed
+
+    def _convert(self, column: str, values: Sequence) -> np.ndarray:
+        kind = self.kinds[column]
+        if kind == "category":
+            return self.dictionaries[column].encode(values)
+        if kind == "time":
+            try:
+                # NumPy parses ISO strings in C; anything else goes through _timestamp
+                return np.array([
+                    "NaT" if value is None else value.replace(tzinfo=None) if isinstance(value, datetime) else value
+                    for value in values
+                ], dtype="datetime64[s]")
+            except (ValueError, TypeError):
+                return np.array([_timestamp(value) for value in values], dtype="datetime64[s]")
+        if kind == "int":
+            return np.array([MISSING_CODE if value is None else value for value in values], dtype=np.int64)
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+    def column(self, name: str) -> np.ndarray:
+        return self._arrays[name][:self.size]
+
+    def mask(self, filters: Sequence[Filter]) -> np.ndarray:
+        selected = np.ones(self.size, dtype=bool)
+        for column, op, value in filters:
+            values = self.column(column)
+            if self.kinds[column] == "category":
+                selected &= self._in_codes(values, self.dictionaries[column].codes_for(value))
+            elif op == ">=":
+                selected &= values >= np.datetime64(value, "s") if self.kinds[column] == "time" else values >= value
+            else:
+                selected &= values == value
+        return selected
+
+    def _in_codes(self, values: np.ndarray, codes: List[int]) -> np.ndarray:
+        if len(codes) <= 4:
+            found = np.zeros(len(values), dtype=bool)
+            for code in codes:
+                found |= values == code
+            return found
+        # Lookup table over the codes; the extra last slot makes MISSING_CODE (-1) select nothing
+        wanted = np.zeros(max(codes) + 2, dtype=bool)
+        wanted[codes] = True
+        return wanted[values]
+
+    def aggregate(
+        self,
+        function: str,
+        measure: Optional[str] = None,
+        filters: Sequence[Filter] = (),
+        group_by: Optional[str] = None
+    ) -> List[Tuple]:
+        """[(value,)], or [(group, value), ...] by group, over the rows matching every filter."""
+        # Columns stay full-length under a mask: compressing by a scattered mask costs more than the kernels
+        selected = self.mask(filters)
+        values = self.column(measure) if measure else None
+        if values is not None:
+            missing = np.isnan(values)
+            if missing.any():
+                # Rows without the measure do not count, as in SQL
+                selected &= ~missing
+                values = np.where(missing, 0.0, values)
+        fill = -np.inf if function == "max" else np.inf
+        reduce = np.max if function == "max" else np.min
+        if group_by is None:
+            rows = int(np.count_nonzero(selected))
+            if function == "count":
+                return [(rows,)]
+            if not rows:
+                return [(None,)]
+            if function in ("sum", "avg"):
+                total = float(np.dot(values, selected.astype(np.float64)))
+                return [(_round(total if function == "sum" else total / rows),)]
+            return [(_round(reduce(np.where(selected, values, fill))),)]
+
+        keys = self.column(group_by)
+        if group_by in self.dictionaries:
+            # Codes are dense, so they are their own group numbers; MISSING_CODE never equals one
+            labels = self.dictionaries[group_by].values
+        else:
+            groups, keys = np.unique(keys, return_inverse=True)
+            labels = groups.tolist()
+        counts = np.zeros(len(labels))
+        results = np.full(len(labels), np.nan)
+        if len(labels) <= MASK_GROUPS:
+            for group in range(len(labels)):
+                member = selected & (keys == group)
+                counts[group] = np.count_nonzero(member)
+                if not counts[group] or function == "count":
+                    continue
+                if function in ("sum", "avg"):
+                    results[group] = np.dot(values, member.astype(np.float64))
+                else:
+                    results[group] = reduce(np.where(member, values, fill))
+        else:
+            selected &= keys >= 0
+            keys = keys[selected]
+            counts = np.bincount(keys, minlength=len(labels)).astype(np.float64)
+            if function in ("sum", "avg"):
+                results = np.bincount(keys, weights=values[selected], minlength=len(labels))
+            elif function != "count":
+                # Sort the selected rows by group, then reduce each contiguous run
+                present = np.flatnonzero(counts)
+                order = np.argsort(keys, kind="stable")
+                starts = np.concatenate(([0], np.cumsum(counts[present])[:-1])).astype(np.intp)
+                ufunc = np.maximum if function == "max" else np.minimum
+                results[present] = ufunc.reduceat(values[selected][order], starts)
+        if function == "avg":
+            results = results / np.maximum(counts, 1)
+        return [
+            (labels[group], int(counts[group]) if function == "count" else _round(results[group]))
+            for group in np.flatnonzero(counts)
+        ]
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+def _timestamp(value) -> Any:
+    if value is None:
+        return np.datetime64("NaT")
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "")).replace(tzinfo=None)
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _round(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+
+def _since(question: str, now: datetime) -> Tuple[bool, Optional[datetime]]:
+    """(understood, start of the time window) for the question's period, if it has one."""
+    if UNSUPPORTED_PERIODS.search(question):
+        return False, None
+    days = re.search(r"\b(?:last|past) (\d+) days?\b", question)
+    if days:
+        return True, now - timedelta(days=int(days.group(1)))
+    for pattern, span in (
+        (r"\b(?:last|past|this) week\b", timedelta(days=7)),
+        (r"\b(?:last|past|this) month\b", timedelta(days=30)),
+        (r"\b(?:last|past|this) year\b", timedelta(days=365)),
+    ):
+        if re.search(pattern, question):
+            return True, now - span
+    if re.search(r"\btoday\b", question):
+        return True, now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if re.search(r"\b(?:week|month|year|days?|season)\b", question):
+        return False, None
+    return True, None
+
+
+class AnalyticsMirror:
+    def __init__(self, engine: Engine, refresh_seconds: float = 60):
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._sources = self._resolve()
+        self._reset()
+        self.refresh()
+
+    def _resolve(self) -> Dict[str, Tuple[str, Dict[str, Tuple[str, str]]]]:
+        """Table -> (primary key, {mirror column: (kind, database column)})."""
+        inspector = inspect(self.engine)
+        tables = set(inspector.get_table_names())
+        resolved = {}
+        for table, (ids, columns) in SOURCES.items():
+            if table not in tables:
+                continue
+            names = [column["name"] for column in inspector.get_columns(table)]
+            id_column = _first_column(names, ids)
+            found = {
+                column: (kind, _first_column(names, candidates))
+                for column, (kind, candidates) in columns.items()
+                if _first_column(names, candidates)
+            }
+            if id_column and "player_id" in found:
+                resolved[table] = (id_column, found)
+        self._regions = None
+        if "players" in tables:
+            names = [column["name"] for column in inspector.get_columns("players")]
+            id_column = _first_column(names, PLAYER_ID_COLUMNS)
+            if id_column and "region" in names:
+                self._regions = id_column
+        return resolved
+
+    def _reset(self):
+        self.tables: Dict[str, ColumnarTable] = {}
+        for table, (_, columns) in self._sources.items():
+            kinds = {column: kind for column, (kind, _) in columns.items()}
+            if self._regions:
+                kinds["region"] = "category"
+            self.tables[table] = ColumnarTable(table, kinds)
+        self._player_regions: Dict[Any, Optional[str]] = {}
+        self._last_ids: Dict[str, Any] = {}
+
+    def refresh(self):
+        """Append rows added since the last refresh."""
+        started = time.perf_counter()
+        added = 0
+        with self._lock:
+            with self.engine.connect() as connection:
+                if self._regions:
+                    for player_id, region in self._fetch_new(connection, "players", self._regions, [self._regions, "region"]):
+                        self._player_regions[player_id] = region
+                for table, (id_column, columns) in self._sources.items():
+                    names = list(columns)
+                    rows = self._fetch_new(connection, table, id_column, [id_column] + [columns[name][1] for name in names])
+                    if not rows:
+                        continue
+                    values = dict(zip(names, zip(*(row[1:] for row in rows))))
+                    if self._regions:
+                        values["region"] = [self._player_regions.get(player_id) for player_id in values["player_id"]]
+                    self.tables[table].append(values)
+                    added += len(rows)
+            self._refreshed_at = time.monotonic()
+        if added:
+            logger.info(f"Analytics mirror: appended {added} rows in {time.perf_counter() - started:.2f}s")
+
+    def _fetch_new(self, connection, table: str, id_column: str, selected: List[str]) -> List[Tuple]:
+        query = f"SELECT {', '.join(selected)} FROM {table}"
+        params = {}
+        if table in self._last_ids:
+            query += f" WHERE {id_column} > :last_id"
+            params["last_id"] = self._last_ids[table]
+        rows = connection.execute(text(query + f" ORDER BY {id_column}"), params).fetchall()
+        if rows:
+            self._last_ids[table] = rows[-1][0]
+        return rows
+
+    def maybe_refresh(self):
+        if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                # A stale mirror only costs answers that lag by one more refresh interval
+                logger.warning(f"Analytics mirror refresh failed: {e}")
+                self._refreshed_at = time.monotonic()
+
+    def reload(self):
+        """Rebuild the mirror from the database, picking up rows updated in place."""
+        with self._lock:
+            self._reset()
+        self.refresh()
+
+    def run(self, query: AnalyticsQuery) -> List[Tuple]:
+        return self.tables[query.table].aggregate(query.function, query.measure, query.filters, query.group_by)
+
+    def parse_question(self, question: str, now: Optional[datetime] = None) -> Optional[AnalyticsQuery]:
+        """The aggregate the question asks for, or None if any part of it is outside the mirror."""
+        lowered = question.lower()
+        for word, value in VALUE_SYNONYMS.items():
+            lowered = re.sub(rf"\b{word}\b", value, lowered)
+        tables = [table for table in self.tables if TABLE_WORDS[table].search(lowered)]
+        if len(tables) != 1:
+            return None
+        table = self.tables[tables[0]]
+        function = next((name for name, pattern in FUNCTION_WORDS if pattern.search(lowered)), None)
+        if function is None:
+            return None
+        measure_column, measure_pattern = MEASURE_WORDS[table.name]
+        measure = measure_column if measure_pattern.search(lowered) and measure_column in table.kinds else None
+        if function == "sum" and measure is None:
+            function = "count"  # "total number of purchases"
+        if function == "count":
+            measure = None
+        elif measure is None or (function in ("min", "max") and not MEASURE_NOUNS.search(lowered)):
+            return None
+
+        group_by = None
+        for match in re.finditer(r"\b(?:by|per|for each|each|across) (\w+)", lowered):
+            word = match.group(1)
+            if word in NOT_GROUPS:
+                continue
+            column = GROUP_WORDS.get(word)
+            if column == "type":
+                column = "item_type" if table.name == "purchases" else "match_type"
+            if column not in table.kinds or group_by is not None:
+                return None
+            group_by = column
+
+        understood, since = _since(lowered, now or datetime.utcnow())
+        if not understood:
+            return None
+        filters = []
+        for column, dictionary in table.dictionaries.items():
+            if column == group_by:
+                continue
+            # Longest values first, so "Dragon Sword" wins over "Sword"
+            for value in sorted({value.lower() for value in dictionary.values}, key=len, reverse=True):
+                if len(value) > 1 and re.search(rf"\b{re.escape(value)}\b", lowered):
+                    filters.append(Filter(column, "=", value))
+                    break
+        if since is not None and "date" in table.kinds:
+            filters.append(Filter("date", ">=", since.replace(microsecond=0)))
+        elif since is not None:
+            return None
+
+        # Whatever was not understood above must not change the answer, so it is checked for
+        # subjects, comparisons, numbers and negation once the values and the window are cut out
+        leftover = re.sub(r"\b(?:last|past) \d+ days?\b|\b(?:bought|played|spent) by (?:players|users|everyone|people)\b",
+                          " ", lowered)
+        for value_filter in filters:
+            if isinstance(value_filter.value, str):
+                leftover = re.sub(rf"\b{re.escape(value_filter.value)}\b", " ", leftover)
+        if UNSUPPORTED_PARTS.search(leftover):
+            return None
+        return AnalyticsQuery(table.name, function, measure, tuple(filters), group_by)
+
+    def sql_for(self, query: AnalyticsQuery) -> str:
+        _, columns = self._sources[query.table]
+        return query.to_sql({column: database for column, (_, database) in columns.items()})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": {name: table.size for name, table in self.tables.items()},
+            "memory_bytes": sum(table.nbytes() for table in self.tables.values()),
+        }
@@ -0,0 +1,137 @@
+"""
+SQL dialect differences between the SQLite development database and Postgres.
+
+The SQL prompt used to ask for SQLite everywhere, so production Postgres got
+``datetime(purchase_date)`` (which does not exist there) and
+``LOWER(p.username) = LOWER('X')``. Each dialect now has its own prompt
+fragments, and generated SQL is rewritten into the active dialect for the
+constructs models most often carry over from the other one.
+
+Case-insensitive name lookups are written as ``LOWER(column) = 'value'`` on
+both backends. The lower(name) expression indexes from app.models.migrations
+serve that predicate, so player lookups are index searches either way.
+
+Date filters likewise compare the bare column with a computed constant
+(``purchase_date > datetime('now', '-7 days')``). A column wrapped in
+``datetime()``, ``date()`` or a CAST cannot use the (player_id, date)
+indexes, so such comparisons are rewritten: a timestamp wrapper is dropped,
+and a day-granularity comparison becomes a range on the column. On SQLite
+this relies on dates being stored as ``YYYY-MM-DD HH:MM:SS`` text, the
+format ``datetime()`` itself returns.
+"""
+import re
+from typing import Dict
+
+PROMPT_FRAGMENTS: Dict[str, Dict[str, str]] = {
+    "sqlite": {
+        "dialect_name": "SQLite",
+        "date_rule": "For date/time queries, compare the date column itself with a value computed by SQLite date functions (e.g., purchase_date > datetime('now', '-7 days')); never wrap the column in date() or datetime(), which stops its index being used",
+    },
+    "postgresql": {
+        "dialect_name": "PostgreSQL",
+        "date_rule": "For date/time queries, compare the date column itself with a value computed by PostgreSQL date arithmetic (e.g., purchase_date > NOW() - INTERVAL '7 days'); never CAST or wrap the column, which stops its index being used, and SQLite functions such as datetime() do not exist",
+    },
+}
+
+LOWER_EQUALS_LOWER = re.compile(r"LOWER\(\s*([\w.]+)\s*\)\s*=\s*LOWER\(\s*'((?:[^']|'')*)'\s*\)", re.IGNORECASE)
+ILIKE_EXACT = re.compile(r"([\w.]+)\s+ILIKE\s+'((?:[^'%_]|'')*)'", re.IGNORECASE)
+SQLITE_RELATIVE_TIME = re.compile(r"(date|datetime)\(\s*'now'\s*,\s*'([+-])\s*(\d+)\s+([a-z]+)'\s*\)", re.IGNORECASE)
+SQLITE_NOW = re.compile(r"datetime\(\s*'now'\s*\)", re.IGNORECASE)
+SQLITE_TODAY = re.compile(r"date\(\s*'now'\s*\)", re.IGNORECASE)
+SQLITE_CAST = re.compile(r"\b(date|datetime)\(\s*([A-Za-z_][\w.]*)\s*\)", re.IGNORECASE)
+POSTGRES_RELATIVE_TIME = re.compile(r"(NOW\(\)|CURRENT_TIMESTAMP|CURRENT_DATE)\s*([+-])\s*INTERVAL\s*'(\d+)\s+([a-z]+)'", re.IGNORECASE)
+POSTGRES_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+POSTGRES_CAST = re.compile(r"([\w.]+)::(date|timestamp)\b", re.IGNORECASE)
+POSTGRES_CAST_CALL = re.compile(r"CAST\(\s*([A-Za-z_][\w.]*)\s+AS\s+(DATE|TIMESTAMP)\s*\)", re.IGNORECASE)
+
+# Constant sides of a date comparison: literals, bound parameters and the current time, optionally shifted
+COMPARISON = r"\s*(>=|<=|=|>|<)\s*"
+SQLITE_CONSTANT = r"'(?:[^']|'')*'|:\w+|CURRENT_DATE|CURRENT_TIMESTAMP|(?:date|datetime)\(\s*'[^']*'(?:\s*,\s*'[^']*')*\s*\)"
+POSTGRES_TIME = r"(?:NOW\(\)|CURRENT_DATE|CURRENT_TIMESTAMP)(?:\s*[+-]\s*INTERVAL\s*'[^']*')?"
+POSTGRES_CONSTANT = rf"'(?:[^']|'')*'(?:::\w+)?|:\w+|\(\s*{POSTGRES_TIME}\s*\)|{POSTGRES_TIME}"
+SQLITE_WRAPPED_DATE = re.compile(
+    rf"\b(date|datetime)\(\s*([A-Za-z_][\w.]*)\s*\){COMPARISON}({SQLITE_CONSTANT})", re.IGNORECASE
+)
+POSTGRES_WRAPPED_DATE = re.compile(
+    rf"(?:CAST\(\s*([A-Za-z_][\w.]*)\s+AS\s+(DATE|TIMESTAMP)\s*\)|\b([A-Za-z_][\w.]*)::(date|timestamp)\b)"
+    rf"{COMPARISON}({POSTGRES_CONSTANT})",
+    re.IGNORECASE,
+)
+
+
+def prompt_fragments(dialect: str) -> Dict[str, str]:
+    return PROMPT_FRAGMENTS.get(dialect, PROMPT_FRAGMENTS["sqlite"])
+
+
+def _lowered_literal(match: re.Match) -> str:
+    return f"LOWER({match.group(1)}) = '{match.group(2).lower()}'"
+
+
+def _day_range(column: str, operator: str, value: str, next_day: str) -> str:
+    """A comparison of the column's day with value, as a range on the column itself."""
+    if operator in (">=", "<"):
+        return f"{column} {operator} {value}"
+    if operator == ">":
+        return f"{column} >= {next_day}"
+    if operator == "<=":
+        return f"{column} < {next_day}"
+    return f"({column} >= {value} AND {column} < {next_day})"
+
+
+def _unwrap_sqlite_dates(sql: str, day_ranges: bool = True) -> str:
+    def unwrap(match: re.Match) -> str:
+        function, column, operator, value = match.groups()
+        if function.lower() == "datetime":
+            return f"{column} {operator} {value}"
+        if not day_ranges and operator not in (">=", "<"):
+            return match.group(0)
+        return _day_range(column, operator, value, f"date({value}, '+1 day')")
+    return SQLITE_WRAPPED_DATE.sub(unwrap, sql)
+
+
+def _unwrap_postgres_dates(sql: str) -> str:
+    def unwrap(match: re.Match) -> str:
+        column, kind = match.group(1) or match.group(3), match.group(2) or match.group(4)
+        operator, value = match.group(5), match.group(6)
+        if kind.lower() == "timestamp":
+            return f"{column} {operator} {value}"
+        return _day_range(column, operator, value, f"CAST({value} AS DATE) + 1")
+    return POSTGRES_WRAPPED_DATE.sub(unwrap, sql)
+
+
+def _to_postgres(sql: str) -> str:
+    # Day ranges are left for the Postgres pass, whose next-day arithmetic translates cleanly
+    sql = _unwrap_sqlite_dates(sql, day_ranges=False)
+    sql = SQLITE_RELATIVE_TIME.sub(
+        lambda m: f"({'CURRENT_DATE' if m.group(1).lower() == 'date' else 'NOW()'} {m.group(2)} INTERVAL '{m.group(3)} {m.group(4)}')",
+        sql,
+    )
+    sql = SQLITE_NOW.sub("NOW()", sql)
+    sql = SQLITE_TODAY.sub("CURRENT_DATE", sql)
+    sql = SQLITE_CAST.sub(lambda m: f"CAST({m.group(2)} AS {'DATE' if m.group(1).lower() == 'date' else 'TIMESTAMP'})", sql)
+    sql = _unwrap_postgres_dates(sql)
+    # ILIKE cannot use the lower(name) index; an exact case-insensitive match can be written so it does
+    return ILIKE_EXACT.sub(_lowered_literal, sql)
+
+
+def _to_sqlite(sql: str) -> str:
+    sql = POSTGRES_RELATIVE_TIME.sub(
+        lambda m: f"{'date' if m.group(1).upper() == 'CURRENT_DATE' else 'datetime'}('now', '{m.group(2)}{m.group(3)} {m.group(4)}')",
+        sql,
+    )
+    sql = POSTGRES_NOW.sub("datetime('now')", sql)
+    sql = POSTGRES_CAST.sub(lambda m: f"{'date' if m.group(2).lower() == 'date' else 'datetime'}({m.group(1)})", sql)
+    sql = POSTGRES_CAST_CALL.sub(lambda m: f"{'date' if m.group(2).lower() == 'date' else 'datetime'}({m.group(1)})", sql)
+    sql = _unwrap_sqlite_dates(sql)
+    # SQLite's LIKE is already case-insensitive for ASCII
+    return re.sub(r"\bILIKE\b", "LIKE", sql, flags=re.IGNORECASE)
+
+
+def rewrite_for_dialect(sql: str, dialect: str) -> str:
+    """Translate constructs from the other backend and normalise case-insensitive name lookups."""
+    if dialect == "postgresql":
+        sql = _to_postgres(sql)
+    elif dialect == "sqlite":
+        sql = _to_sqlite(sql)
+    # LOWER(col) = LOWER('X') compares against a constant, so lower it once and keep the indexed expression
+    return LOWER_EQUALS_LOWER.sub(_lowered_literal, sql)
@@ -0,0 +1,187 @@
+"""
+In-memory directory of the player and clan names in the game database.
+
+Built once from the ``players`` and ``clans`` tables and then refreshed
+incrementally: each refresh only reads rows whose primary key is above the
+highest one already loaded, so new players show up within
+ENTITY_REFRESH_SECONDS without rescanning the tables.
+
+Exact mentions are found with an Aho-Corasick gazetteer; misspelt ones
+("Dragonslayer 99", "Fire Mages") with a trigram similarity index. Name-like
+tokens that are neither ("GhostRider77") are reported by unknown_entity(),
+so a question about a player who does not exist is answered without any LLM
+or SQL work. A name created since the last refresh can briefly look unknown;
+processes that create players call add_player() to avoid that. on_new_rows
+is called with a table name whenever a refresh finds rows added to it, so
+caches of query results over that table can be invalidated.
+
+Column names differ between deployments (``players.player_id`` vs
+``players.id``, ``clans.clan_name`` vs ``clans.name``), so they are
+resolved from the live schema.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.services.data.bloom import ExistenceFilter
+from app.services.data.fuzzy import FuzzyNameIndex, SpanResolution
+from app.services.data.gazetteer import Mention, NameGazetteer
+
+logger = logging.getLogger("uvicorn.error")
+
+PLAYER_ID_COLUMNS = ("player_id", "id")
+PLAYER_NAME_COLUMNS = ("username",)
+CLAN_ID_COLUMNS = ("clan_id", "id")
+CLAN_NAME_COLUMNS = ("clan_name", "name")
+
+# Tokens shaped like a username: CamelCase with two or more humps, or letters followed by digits
+NAME_LIKE_PATTERN = re.compile(r"\b(?:[A-Z][a-z]+(?:[A-Z][a-z0-9]+)+|[A-Za-z]{3,}\d+)\b")
+# Positions that make a name-like token a player or clan ("player X", "clan X", "X's rank"), rather
+# than a product, platform or season ("PayPal", "PlayStation", "Season2")
+ENTITY_SLOT_BEFORE = re.compile(r"\b(?:player|user|username|gamer|clan|guild|named|called)\s+$", re.IGNORECASE)
+ENTITY_SLOT_AFTER = re.compile(
+    r"^(?:['\u2019]s\s+(?:rank|ranking|level|xp|vip|clan|stats|profile|purchases|achievements|matches|inventory)\b|\s+clan\b)",
+    re.IGNORECASE
+)
+
+
+def _first_column(columns: Sequence[str], candidates: Sequence[str]) -> Optional[str]:
+    return next((name for name in candidates if name in columns), None)
+
+
+class _NameSource:
+    """One table's (id, name) columns and the highest id read so far."""
+
+    def __init__(self, table: str, id_column: str, name_column: str):
+        self.table = table
+        self.id_column = id_column
+        self.name_column = name_column
+        self.last_id = None
+
+    def fetch_new(self, connection) -> List[str]:
+        query = f"SELECT {self.id_column}, {self.name_column} FROM {self.table}"
+        params = {}
+        if self.last_id is not None:
+            query += f" WHERE {self.id_column} > :last_id"
+            params["last_id"] = self.last_id
+        rows = connection.execute(text(query + f" ORDER BY {self.id_column}"), params).fetchall()
+        if rows:
+            self.last_id = rows[-1][0]
+        return [row[1] for row in rows if row[1]]
+
+
+class EntityDirectory:
+    def __init__(
+        self,
+        engine: Engine,
+        refresh_seconds: float = 60,
+        on_new_rows: Optional[Callable[[str], None]] = None
+    ):
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self.on_new_rows = on_new_rows
+        self.players = NameGazetteer()
+        self.clans = NameGazetteer()
+        self.fuzzy_players = FuzzyNameIndex()
+        self.fuzzy_clans = FuzzyNameIndex()
+        self.known = ExistenceFilter()
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._sources = self._resolve_sources()
+        self.refresh()
+
+    def _resolve_sources(self) -> dict:
+        sources = {}
+        inspector = inspect(self.engine)
+        tables = set(inspector.get_table_names())
+        for table, ids, names in (
+            ("players", PLAYER_ID_COLUMNS, PLAYER_NAME_COLUMNS),
+            ("clans", CLAN_ID_COLUMNS, CLAN_NAME_COLUMNS),
+        ):
+            if table not in tables:
+                logger.warning(f"Entity directory: table '{table}' not found, its names will not be indexed")
+                continue
+            columns = [column["name"] for column in inspector.get_columns(table)]
+            id_column, name_column = _first_column(columns, ids), _first_column(columns, names)
+            if id_column and name_column:
+                sources[table] = _NameSource(table, id_column, name_column)
+            else:
+                logger.warning(f"Entity directory: no id/name columns found in '{table}' ({columns})")
+        return sources
+
+    def refresh(self):
+        """Load rows added since the last refresh."""
+        with self._lock:
+            with self.engine.connect() as connection:
+                for table, source in self._sources.items():
+                    names = source.fetch_new(connection)
+                    self._index(table, names)
+                    if names and self.on_new_rows:
+                        self.on_new_rows(table)
+            self._refreshed_at = time.monotonic()
+        logger.info(f"Entity directory holds {len(self.players)} players and {len(self.clans)} clans")
+
+    def _index(self, table: str, names: List[str]):
+        exact, fuzzy = (self.players, self.fuzzy_players) if table == "players" else (self.clans, self.fuzzy_clans)
+        exact.add_all(names)
+        for name in names:
+            fuzzy.add(name)
+            self.known.add(name)
+
+    def maybe_refresh(self):
+        if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                # A stale directory only costs a fallback to the slower path
+                logger.warning(f"Entity directory refresh failed: {e}")
+                self._refreshed_at = time.monotonic()
+
+    def add_player(self, username: str):
+        """Index a player created by this process without waiting for the next refresh."""
+        self._index("players", [username])
+
+    def add_clan(self, name: str):
+        self._index("clans", [name])
+
+    def find_players(self, query: str) -> List[Mention]:
+        return self.players.find(query)
+
+    def find_clans(self, query: str) -> List[Mention]:
+        return self.clans.find(query)
+
+    def resolve_fuzzy(self, query: str, min_score: float = 0.5) -> Optional[Tuple[str, SpanResolution]]:
+        """The best near-match in query as ("player" | "clan", resolution), or None."""
+        best = None
+        for kind, index in (("player", self.fuzzy_players), ("clan", self.fuzzy_clans)):
+            resolution = index.resolve(query, min_score)
+            if resolution and (best is None or resolution.matches[0].score > best[1].matches[0].score):
+                best = (kind, resolution)
+        return best
+
+    def unknown_entity(self, query: str, fuzzy_min_score: float = 0.5, require_slot: bool = False) -> Optional[str]:
+        """
+        A name-like token in query that is no known player or clan, nor close to one.
+
+        Tokens close to a known name are left to fuzzy resolution as likely typos. With
+        require_slot, only tokens in a player or clan position count, for callers that
+        do not yet know the question is about game data.
+        """
+        for match in NAME_LIKE_PATTERN.finditer(query):
+            candidate = match.group(0)
+            if require_slot and not (ENTITY_SLOT_BEFORE.search(query[:match.start()])
+                                     or ENTITY_SLOT_AFTER.match(query[match.end():])):
+                continue
+            if candidate in self.known:
+                continue
+            if self.fuzzy_players.similar(candidate, min_score=fuzzy_min_score):
+                continue
+            if self.fuzzy_clans.similar(candidate, min_score=fuzzy_min_score):
+                continue
+            return candidate
+        return None
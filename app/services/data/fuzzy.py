@@ -0,0 +1,115 @@
+"""
+Trigram similarity index for resolving misspelt player and clan names.
+
+Names are compared in a normalised form (lowercase, letters and digits
+only), so spacing and punctuation never matter: "Dragonslayer 99" and
+"Fire Mages" normalise to exactly "dragonslayer99" and "firemages".
+Remaining typos are scored with the Dice coefficient over padded character
+trigrams; an inverted index from trigram to names keeps a lookup
+proportional to the names sharing a trigram rather than all names.
+"""
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from app.services.retrieval.bm25 import STOPWORDS
+
+SPAN_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+MAX_SPAN_WORDS = 3
+MIN_KEY_LENGTH = 4
+
+# Words that describe the data rather than name anything
+DOMAIN_WORDS = frozenset({
+    "achievement", "achievements", "bronze", "clan", "clans", "gold", "item", "items", "legendary",
+    "level", "levels", "list", "magic", "many", "match", "matches", "member", "members", "much",
+    "player", "players", "purchase", "purchased", "purchases", "rank", "ranked", "ranking", "region",
+    "season", "silver", "status", "type", "vip", "week", "xp",
+})
+
+SKIP_WORDS = STOPWORDS | DOMAIN_WORDS
+
+
+class NameMatch(NamedTuple):
+    name: str
+    score: float
+
+
+class SpanResolution(NamedTuple):
+    text: str  # the span of the query that was matched
+    start: int
+    end: int
+    matches: List[NameMatch]
+
+
+def normalize_name(text: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyNameIndex:
+    def __init__(self, names: Iterable[str] = ()):
+        self._names: List[str] = []
+        self._sizes: List[int] = []
+        self._by_key: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str):
+        key = normalize_name(name)
+        if not key or key in self._by_key:
+            return
+        name_id = len(self._names)
+        self._names.append(name)
+        self._by_key[key] = name_id
+        grams = trigrams(key)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(name_id)
+
+    def similar(self, text: str, limit: int = 3, min_score: float = 0.5) -> List[NameMatch]:
+        """Names whose trigram Dice similarity with text is at least min_score, best first."""
+        key = normalize_name(text)
+        if not key:
+            return []
+        exact = self._by_key.get(key)
+        if exact is not None:
+            return [NameMatch(self._names[exact], 1.0)]
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = [
+            NameMatch(self._names[name_id], round(2 * count / (len(grams) + self._sizes[name_id]), 4))
+            for name_id, count in shared.items()
+        ]
+        scored = [match for match in scored if match.score >= min_score]
+        return sorted(scored, key=lambda match: -match.score)[:limit]
+
+    def resolve(self, query: str, min_score: float = 0.5) -> Optional[SpanResolution]:
+        """
+        The query span (of up to three words) that best matches a name.
+
+        Spans starting or ending with a stopword or data vocabulary ("rank", "clan") are skipped.
+        """
+        words = [(m.group(0), m.start(), m.end()) for m in SPAN_PATTERN.finditer(query)]
+        best: Optional[SpanResolution] = None
+        for i in range(len(words)):
+            for j in range(i, min(i + MAX_SPAN_WORDS, len(words))):
+                span = words[i:j + 1]
+                if span[0][0].lower() in SKIP_WORDS or span[-1][0].lower() in SKIP_WORDS:
+                    continue
+                text = query[span[0][1]:span[-1][2]]
+                if len(normalize_name(text)) < MIN_KEY_LENGTH:
+                    continue
+                matches = self.similar(text, min_score=min_score)
+                if matches and (best is None or matches[0].score > best.matches[0].score):
+                    best = SpanResolution(text, span[0][1], span[-1][2], matches)
+        return best
@@ -0,0 +1,106 @@
+"""
+Aho-Corasick matcher for known player and clan names.
+
+All names are matched in a single pass over the query, case-insensitively,
+and only on token boundaries, so "IceWarden" is found in "what is
+icewarden's rank?" but not inside "IceWarden2". Names can be added at any
+time; the failure links are rebuilt lazily on the next search.
+"""
+from typing import Dict, Iterable, List, NamedTuple
+
+
+class Mention(NamedTuple):
+    name: str  # canonical spelling
+    start: int
+    end: int
+
+
+def _is_name_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class NameGazetteer:
+    def __init__(self, names: Iterable[str] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[str]] = [[]]
+        # Outputs of each node plus those reachable through its failure links, filled by _build()
+        self._matches: List[List[str]] = [[]]
+        self._canonical: Dict[str, str] = {}
+        self._dirty = False
+        self.add_all(names)
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._canonical
+
+    def canonical(self, name: str) -> str:
+        return self._canonical.get(name.lower(), name)
+
+    def add(self, name: str):
+        key = name.strip().lower()
+        if not key or key in self._canonical:
+            return
+        self._canonical[key] = name.strip()
+        node = 0
+        for char in key:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append(key)
+        self._dirty = True
+
+    def add_all(self, names: Iterable[str]):
+        for name in names:
+            self.add(name)
+
+    def _build(self):
+        # Breadth-first so every failure link points at an already finished, shallower node
+        queue = list(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        terminal = [list(outputs) for outputs in self._outputs]
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                terminal[child] = terminal[child] + terminal[self._fail[child]]
+        self._matches = terminal
+        self._dirty = False
+
+    def find(self, text: str) -> List[Mention]:
+        """Boundary-respecting mentions in text, left to right, longest first where they overlap."""
+        if not self._canonical:
+            return []
+        if self._dirty:
+            self._build()
+        lowered = text.lower()
+        found = []
+        node = 0
+        for position, char in enumerate(lowered):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for key in self._matches[node]:
+                start, end = position - len(key) + 1, position + 1
+                before_ok = start == 0 or not _is_name_char(lowered[start - 1])
+                after_ok = end == len(lowered) or not _is_name_char(lowered[end])
+                if before_ok and after_ok:
+                    found.append(Mention(self._canonical[key], start, end))
+
+        mentions, covered_until = [], -1
+        for mention in sorted(found, key=lambda m: (m.start, -(m.end - m.start))):
+            if mention.start >= covered_until:
+                mentions.append(mention)
+                covered_until = mention.end
+        return mentions
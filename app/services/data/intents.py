@@ -0,0 +1,264 @@
+"""
+Deterministic handlers for the most common single-fact data questions.
+
+A player's rank, VIP status, level or XP, a clan's type or member count, and
+a player's legendary purchases or gold achievements make up most DYNAMIC
+traffic. Each used to cost a classifier call, a username check, SQL
+generation and response phrasing. An IntentHandler answers one of them with a
+local matcher, a prepared statement bound to the entity's name, and a
+response template in the style the response prompt asks for ("ShadowNinja is
+ranked 8th."). Statements are built from the live schema, since column names
+differ between deployments, and find names through the lower(name) indexes
+of migration 0001.
+
+A question is handled only when it names exactly one known player or clan
+and asks for the fact itself: the name is replaced by "@" and a handler's
+pattern must match the whole question ("what is @'s rank", "how many
+members does @ have", "is @ a magic clan"), so a player called "LevelUp" is
+not a level question and "Can @ trade legendary items?" is not a count.
+Anything else (two facts, time windows, lists, comparisons, how-to, modal
+and policy questions) is declined and takes the classifier and SQL path;
+the reasons are counted for coverage.
+"""
+import logging
+import re
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.services.data.directory import (
+    CLAN_ID_COLUMNS, CLAN_NAME_COLUMNS, PLAYER_ID_COLUMNS, PLAYER_NAME_COLUMNS, _first_column
+)
+from app.services.data.gazetteer import Mention
+from app.services.data.leaderboard import season_key
+
+logger = logging.getLogger("uvicorn.error")
+
+PLAYER, CLAN = "player", "clan"
+
+# Lists, time windows, comparisons, several facts, how-to, modal and policy questions are not single lookups
+NOT_A_LOOKUP = re.compile(
+    r"\b(?:which|who|list|show|top|around|near|last|past|recent|recently|since|before|after|between|today"
+    r"|yesterday|week|month|year|days?|seasons?|each|every|per|average|compare|than|highest|lowest|best"
+    r"|worst|most|least|ever|and|or|why|how (?:do|does|did|can|to|should)|if|can|could|would|should|will"
+    r"|may|might|must|gives?|giving|trade|trades|trading|sell|sells|selling|lose|loses|losing|lost"
+    r"|drop|dropped|transfer|gift|refund|cost|costs|benefits?|perks?|mean|means|work|works)\b|,"
+)
+# Politeness around the question itself, and the "player"/"clan" before a name
+PREAMBLE = re.compile(r"^(?:(?:hey|hi|hello)\b[,!]?\s*)?(?:please\s+)?(?:(?:can|could) you (?:please )?tell me|tell me|do you know)\s+")
+ENTITY_NOUN = re.compile(r"\b(?:the\s+)?(?:player|user|clan|guild)\s+@")
+WHAT_IS = r"(?:what(?:'s| is)|tell me)"
+
+
+class IntentHandler(NamedTuple):
+    name: str
+    entity: str  # PLAYER or CLAN
+    pattern: Pattern[str]  # matched against the whole normalised question, with the name as "@"
+    sql: str  # prepared statement; :name is the lowercased entity name
+    columns: Tuple[str, ...]  # names of the selected values, for the template
+    template: str  # formatted with the columns, plus <column>_ordinal and <column>_s (plural suffix) for integers
+    latest: Optional[str] = None  # season column picking the row when the SQL returns several, e.g. one per season
+
+
+class IntentMatch(NamedTuple):
+    handler: IntentHandler
+    name: str  # canonical spelling of the entity
+    params: Dict[str, Any]
+
+
+def ordinal(number: int) -> str:
+    """1st, 2nd, 3rd, 4th, 11th, 12th, 13th, 21st, ..."""
+    suffix = "th" if 10 <= number % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+
+def normalise_question(question: str, mentions: Sequence[Mention]) -> str:
+    """The lowercased question with each name as "@", without politeness or closing punctuation."""
+    # Replacing the names means neither "LevelUp" nor "GoldDiggers" reads as an intent
+    parts, position = [], 0
+    for mention in sorted(mentions, key=lambda mention: mention.start):
+        if mention.start >= position:
+            parts += [question[position:mention.start], "@"]
+            position = mention.end
+    rest = (("".join(parts) + question[position:]).lower().replace("\u2019", "'"))
+    rest = " ".join(rest.split()).rstrip("?.! ")
+    rest = ENTITY_NOUN.sub("@", PREAMBLE.sub("", rest))
+    return re.sub(r"\s+(?:right now|now|currently|at the moment)$", "", rest)
+
+
+def _columns(inspector, table: str) -> List[str]:
+    return [column["name"] for column in inspector.get_columns(table)]
+
+
+def build_handlers(engine: Engine) -> List[IntentHandler]:
+    """The default handlers whose tables and columns exist in this database, in matching order."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    if "players" not in tables:
+        logger.warning("Intent handlers: 'players' not found, only clan intents are available")
+    handlers = []
+
+    def add(name: str, entity: str, pattern: str, sql: str, columns: Tuple[str, ...], template: str, latest: Optional[str] = None):
+        handlers.append(IntentHandler(
+            name, entity, re.compile(f"(?:{pattern})"), " ".join(sql.split()), columns, template, latest
+        ))
+
+    player = dict.fromkeys(("id", "name", "level", "xp", "vip"))
+    if "players" in tables:
+        columns = _columns(inspector, "players")
+        player = {
+            "id": _first_column(columns, PLAYER_ID_COLUMNS), "name": _first_column(columns, PLAYER_NAME_COLUMNS),
+            "level": _first_column(columns, ("level",)), "xp": _first_column(columns, ("xp",)),
+            "vip": _first_column(columns, ("vip_status",)), "clan": _first_column(columns, ("clan_id",)),
+        }
+    player_id, username = player["id"], player["name"]
+    by_name = f"LOWER(p.{username}) = :name"
+
+    if player_id and username and "leaderboards" in tables:
+        columns = _columns(inspector, "leaderboards")
+        owner, season, rank = (_first_column(columns, candidates) for candidates in (("player_id",), ("season",), ("rank",)))
+        if owner and season and rank:
+            # The current standing is the one from the latest season; SQL would order "2026-S9" after "2026-S10"
+            standing = r"(?:rank|ranking|position|standing)"
+            add("player_rank", PLAYER,
+                rf"{WHAT_IS} (?:@'s (?:current )?{standing}|the (?:current )?{standing} of @)|@'s {standing}"
+                rf"|what (?:rank|position) is @|(?:what|where) is @ (?:currently )?ranked",
+                f"""SELECT p.{username}, l.{rank}, l.{season} FROM leaderboards l JOIN players p ON p.{player_id} = l.{owner}
+                    WHERE {by_name} AND l.{rank} IS NOT NULL AND l.{season} IS NOT NULL""",
+                ("username", "rank", "season"), "{username} is ranked {rank_ordinal}.", latest="season")
+    if username and player["vip"]:
+        add("player_vip_status", PLAYER,
+            rf"{WHAT_IS} @'s vip(?: status| level| tier)?|@'s vip status|is @ (?:a )?vip(?: player| member)?"
+            rf"|does @ have vip(?: status)?|what vip (?:status|level|tier) (?:is @|does @ have)",
+            f"SELECT p.{username}, p.{player['vip']} FROM players p WHERE {by_name}",
+            ("username", "vip_status"), "{username}'s VIP status is {vip_status}.")
+    if username and player["level"]:
+        add("player_level", PLAYER, rf"{WHAT_IS} (?:@'s level|the level of @)|@'s level|what level is @(?: at| on)?",
+            f"SELECT p.{username}, p.{player['level']} FROM players p WHERE {by_name}",
+            ("username", "level"), "{username} is level {level}.")
+    if username and player["xp"]:
+        add("player_xp", PLAYER,
+            rf"{WHAT_IS} @'s (?:total )?(?:xp|exp|experience(?: points)?)|@'s (?:xp|exp|experience)"
+            rf"|how (?:much|many) (?:xp|exp|experience(?: points)?) (?:does|has) @(?: have| got| earned)?",
+            f"SELECT p.{username}, p.{player['xp']} FROM players p WHERE {by_name}",
+            ("username", "xp"), "{username} has {xp} XP.")
+
+    for name, table, role, value, pattern, template in (
+        ("legendary_items", "purchases", "rarity", "legendary",
+         r"how many legendary (?:items?|purchases|weapons) (?:has|have|did|does) @ (?:purchased|purchase|bought|buy|have|own|made|make)",
+         "{username} has purchased {count} legendary item{count_s}."),
+        ("gold_achievements", "achievements", "tier", "gold",
+         r"how many gold(?: tier|-tier)? achievements (?:has|have|did|does) @ (?:have|earned|earn|got|get|unlocked|unlock)",
+         "{username} has earned {count} gold achievement{count_s}."),
+    ):
+        if not (player_id and username and table in tables):
+            continue
+        columns = _columns(inspector, table)
+        owner, column = _first_column(columns, ("player_id",)), _first_column(columns, (role,))
+        if owner and column:
+            # LEFT JOIN so a known player with none gets 0 rather than no row
+            add(name, PLAYER, pattern,
+                f"""SELECT p.{username}, COUNT(t.{owner}) FROM players p
+                    LEFT JOIN {table} t ON t.{owner} = p.{player_id} AND LOWER(t.{column}) = '{value}'
+                    WHERE {by_name} GROUP BY p.{username}""",
+                ("username", "count"), template)
+
+    if "clans" in tables:
+        columns = _columns(inspector, "clans")
+        clan_id, clan_name = _first_column(columns, CLAN_ID_COLUMNS), _first_column(columns, CLAN_NAME_COLUMNS)
+        clan_type, member_count = _first_column(columns, ("clan_type", "type")), _first_column(columns, ("member_count",))
+        by_clan = f"LOWER(c.{clan_name}) = :name"
+        if clan_name and clan_type:
+            add("clan_type", CLAN,
+                rf"what (?:type|kind|sort) of clan is @|{WHAT_IS} (?:@'s (?:clan )?type|the (?:clan )?type of @)"
+                rf"|what (?:type|kind) is @|is @ an? [\w-]+ clan",
+                f"SELECT c.{clan_name}, c.{clan_type} FROM clans c WHERE {by_clan}",
+                ("clan_name", "clan_type"), "{clan_name} is a {clan_type} clan.")
+        members = (rf"how many (?:members|players) (?:does @ have|has @ got|are (?:there )?in @|(?:are )?in @)"
+                   rf"|{WHAT_IS} (?:@'s (?:member count|size|membership)|the (?:member count|size) of @)|how big is @")
+        if clan_name and member_count:
+            add("clan_members", CLAN, members,
+                f"SELECT c.{clan_name}, c.{member_count} FROM clans c WHERE {by_clan}",
+                ("clan_name", "members"), "{clan_name} has {members} member{members_s}.")
+        elif clan_name and clan_id and player_id and player.get("clan"):
+            add("clan_members", CLAN, members,
+                f"""SELECT c.{clan_name}, COUNT(p.{player_id}) FROM clans c LEFT JOIN players p ON p.{player['clan']} = c.{clan_id}
+                    WHERE {by_clan} GROUP BY c.{clan_name}""",
+                ("clan_name", "members"), "{clan_name} has {members} member{members_s}.")
+    return handlers
+
+
+class IntentRegistry:
+    """Intent handlers in matching order, with per-intent hits and the reasons questions were declined."""
+
+    def __init__(self, handlers: Sequence[IntentHandler] = ()):
+        self._lock = threading.Lock()
+        self._handlers: List[IntentHandler] = []
+        self._questions = 0
+        self._answered: Dict[str, int] = {}
+        self._declined: Dict[str, int] = {}
+        for handler in handlers:
+            self.register(handler)
+
+    def register(self, handler: IntentHandler):
+        if any(existing.name == handler.name for existing in self._handlers):
+            raise ValueError(f"An intent handler named {handler.name} is already registered")
+        self._handlers.append(handler)
+
+    @property
+    def handlers(self) -> List[IntentHandler]:
+        return list(self._handlers)
+
+    def match(self, question: str, players: Sequence[Mention], clans: Sequence[Mention]) -> Optional[IntentMatch]:
+        """The one handler and entity the question asks about, or None (with the reason counted)."""
+        with self._lock:
+            self._questions += 1
+        player_names = list(dict.fromkeys(mention.name for mention in players))
+        clan_names = list(dict.fromkeys(mention.name for mention in clans))
+        if len(player_names) + len(clan_names) != 1:
+            return self._decline("no_entity" if not (player_names or clan_names) else "several_entities")
+
+        rest = normalise_question(question, list(players) + list(clans))
+        if NOT_A_LOOKUP.search(rest):
+            return self._decline("not_a_lookup")
+
+        entity, name = (PLAYER, player_names[0]) if player_names else (CLAN, clan_names[0])
+        matched = [handler for handler in self._handlers if handler.entity == entity and handler.pattern.fullmatch(rest)]
+        if len(matched) != 1:
+            return self._decline("no_intent" if not matched else "several_intents")
+        return IntentMatch(matched[0], name, {"name": name.lower()})
+
+    def answer(self, match: IntentMatch, rows: Sequence[Sequence[Any]]) -> Optional[str]:
+        """The handler's template filled from the first (or latest season's) row, or None when the data has no answer."""
+        if rows and match.handler.latest:
+            position = match.handler.columns.index(match.handler.latest)
+            rows = [max(rows, key=lambda row: season_key(row[position]))]
+        values = dict(zip(match.handler.columns, rows[0])) if rows else {}
+        if not values or any(value is None for value in values.values()):
+            self._decline("no_data")
+            return None
+        for column, value in list(values.items()):
+            if isinstance(value, int):
+                values[f"{column}_ordinal"], values[f"{column}_s"] = ordinal(value), "" if value == 1 else "s"
+        with self._lock:
+            self._answered[match.handler.name] = self._answered.get(match.handler.name, 0) + 1
+        return match.handler.template.format(**values)
+
+    def _decline(self, reason: str) -> None:
+        with self._lock:
+            self._declined[reason] = self._declined.get(reason, 0) + 1
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            answered = sum(self._answered.values())
+            return {
+                "handlers": [handler.name for handler in self._handlers],
+                "questions": self._questions,
+                "answered": answered,
+                "coverage": round(answered / self._questions, 4) if self._questions else None,
+                "by_intent": dict(self._answered),
+                "declined": dict(self._declined),
+            }
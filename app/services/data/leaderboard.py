@@ -0,0 +1,482 @@
+"""
+In-memory leaderboards for rank, top-N and neighbourhood questions.
+
+Rank questions are among the most frequent dynamic queries, and each one
+ran an ORDER BY over ``leaderboards``. LeaderboardIndex keeps one sorted
+board per (season, region) in an indexable skip list: every level of the
+list records how many entries its links skip, so a player's position, the
+entry at a position and the entries around it are found in O(log n)
+expected time. Boards are ordered the way the generated SQL orders them,
+by the stored rank, then score (highest first).
+
+Like the entity directory, the index is loaded once and then refreshed
+incrementally from leaderboard rows above the highest id already read; a
+newer row for a player's (season, region) replaces the older one. Rows
+updated in place (the usual way a rank changes) are picked up by a reload:
+every reload_seconds maybe_refresh() builds a fresh index on a background
+thread, and the next call swaps it in, so answers never wait for the load
+or see a half-loaded board. A player moved to another region keeps only the
+newer standing for the season. Player names are read the same way from
+``players``. Seasons sort naturally
+("2026-S10" after "2026-S9").
+"""
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.services.data.directory import PLAYER_ID_COLUMNS, PLAYER_NAME_COLUMNS, _first_column
+
+logger = logging.getLogger("uvicorn.error")
+
+LEADERBOARD_ID_COLUMNS = ("leaderboard_id", "id")
+MAX_LEVELS = 24  # enough for 2**24 entries per board
+MAX_TOP = 100
+
+TOP_PATTERN = re.compile(r"\btop\s+(\d+)\b|\btop (?:players?|ranked)\b|\bwho (?:leads|is leading|is first)\b")
+NEIGHBOURHOOD_PATTERN = re.compile(r"\b(?:around|near|neighbou?rs?|next to|above|below|close to)\b")
+RANK_PATTERN = re.compile(r"\b(?:rank|ranked|ranking|position|standing|place)\b")
+# How or why a standing changed is not answered by the standing itself
+RANK_CHANGE = re.compile(
+    r"\b(?:why|how come|drop(?:ped)?|fall|fell|fallen|climb(?:ed)?|rise|rose|risen|change[ds]?"
+    r"|improved?|worse|better|go(?:ne)? (?:up|down)|went (?:up|down)|history|trend)\b"
+)
+# Time windows other than a season need the SQL path
+OTHER_PERIODS = re.compile(r"\b(?:week|month|year|today|yesterday|days?|since|between|all[- ]time|ever)\b")
+
+
+class LeaderboardEntry(NamedTuple):
+    player_id: Any
+    season: str
+    region: Optional[str]
+    rank: Optional[int]
+    score: Optional[float]
+
+
+class Standing(NamedTuple):
+    entry: LeaderboardEntry
+    position: int  # 1-based position on its board
+    size: int
+
+
+class LeaderboardQuestion(NamedTuple):
+    kind: str  # "top", "rank" or "around"
+    season: Optional[str]  # None: the player's latest season, or the current one
+    region: Optional[str]  # None: every region
+    n: int
+
+
+class _Last:
+    """Key of the tail sentinel, greater than every real key."""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return False
+
+
+class _Node:
+    __slots__ = ("key", "value", "next", "width")
+
+    def __init__(self, key, value, levels: int):
+        self.key = key
+        self.value = value
+        self.next: List[Optional["_Node"]] = [None] * levels
+        # Number of positions each link advances
+        self.width = [1] * levels
+
+
+class IndexableSkipList:
+    """Sorted (key, value) pairs with O(log n) expected insert, remove, position and positional access."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self._random = random.Random(seed)
+        self._tail = _Node(_Last(), None, 0)
+        self._head = _Node(None, None, MAX_LEVELS)
+        self._head.next = [self._tail] * MAX_LEVELS
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _levels(self) -> int:
+        levels = 1
+        while levels < MAX_LEVELS and self._random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def insert(self, key, value):
+        chain: List[_Node] = [self._head] * MAX_LEVELS
+        steps = [0] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key <= key:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        levels = self._levels()
+        new = _Node(key, value, levels)
+        skipped = 0
+        for level in range(levels):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - skipped
+            previous.width[level] = skipped + 1
+            skipped += steps[level]
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain: List[_Node] = [self._head] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is self._tail or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def index(self, key) -> int:
+        """0-based position of key."""
+        node, position = self._head, 0
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        found = node.next[0]
+        if found is self._tail or found.key != key:
+            raise KeyError(key)
+        return position
+
+    def _node_at(self, position: int) -> _Node:
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        node, remaining = self._head, position + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while node.width[level] <= remaining and node.next[level] is not self._tail:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def __getitem__(self, position: int):
+        return self._node_at(position).value
+
+    def items(self, start: int = 0, count: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+        """(key, value) pairs from position start on, in order."""
+        start = max(0, start)
+        if start >= self._size:
+            return
+        node = self._node_at(start)
+        remaining = self._size - start if count is None else count
+        while node is not self._tail and remaining > 0:
+            yield node.key, node.value
+            node = node.next[0]
+            remaining -= 1
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the nodes, their link arrays, keys and values."""
+        total = sys.getsizeof(self._head) + sys.getsizeof(self._head.next) + sys.getsizeof(self._head.width)
+        node = self._head.next[0]
+        while node is not self._tail:
+            total += (sys.getsizeof(node) + sys.getsizeof(node.next) + sys.getsizeof(node.width)
+                      + sys.getsizeof(node.key) + sys.getsizeof(node.value))
+            node = node.next[0]
+        return total
+
+
+def _sort_key(entry: LeaderboardEntry) -> Tuple:
+    # Unranked rows last, then highest score first; a board holds one entry per player, so the id keeps keys unique
+    rank = entry.rank if entry.rank is not None else float("inf")
+    return (rank, -(entry.score or 0), entry.player_id)
+
+
+def season_key(season: str) -> Tuple:
+    """Natural sort key for season names, so "2026-S10" sorts after "2026-S9"."""
+    return tuple(int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", str(season)))
+
+
+def leaderboard_question(question: str, seasons: Sequence[str], regions: Set[str]) -> Optional[LeaderboardQuestion]:
+    """What a leaderboard question asks for, given the known seasons (oldest first) and regions."""
+    lowered = question.lower()
+    if OTHER_PERIODS.search(lowered) or RANK_CHANGE.search(lowered):
+        return None
+    season = next((known for known in seasons if known.lower() in lowered), None)
+    if season is None and re.search(r"\b(?:last|previous) season\b", lowered):
+        if len(seasons) < 2:
+            return None
+        season = seasons[-2]
+    elif season is None and re.search(r"\bseason \w*\d", lowered):
+        return None  # a season we have no data for
+    region = next((known for known in regions if re.search(rf"\b{re.escape(known.lower())}\b", lowered)), None)
+    top = TOP_PATTERN.search(lowered)
+    if top:
+        n = min(int(top.group(1)), MAX_TOP) if top.group(1) else 10
+        return LeaderboardQuestion("top", season, region, n)
+    if RANK_PATTERN.search(lowered):
+        kind = "around" if NEIGHBOURHOOD_PATTERN.search(lowered) else "rank"
+        return LeaderboardQuestion(kind, season, region, 2)
+    return None
+
+
+class LeaderboardIndex:
+    def __init__(
+        self,
+        engine: Engine,
+        refresh_seconds: float = 60,
+        seed: Optional[int] = None,
+        reload_seconds: Optional[float] = 300
+    ):
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self.reload_seconds = reload_seconds
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._fresh: Optional["LeaderboardIndex"] = None  # built by the worker, swapped in by the next caller
+        self._refreshed_at = 0.0
+        self._memory: Optional[int] = None
+        self._columns = self._resolve()
+        self._reset()
+        self.refresh()
+        self._reloaded_at = time.monotonic()
+
+    def _resolve(self) -> Optional[Dict[str, Optional[str]]]:
+        inspector = inspect(self.engine)
+        tables = set(inspector.get_table_names())
+        if "leaderboards" not in tables or "players" not in tables:
+            logger.warning("Leaderboard index: 'leaderboards' or 'players' not found, the index is disabled")
+            return None
+        board = [column["name"] for column in inspector.get_columns("leaderboards")]
+        players = [column["name"] for column in inspector.get_columns("players")]
+        columns = {
+            "id": _first_column(board, LEADERBOARD_ID_COLUMNS),
+            "season": _first_column(board, ("season",)),
+            "rank": _first_column(board, ("rank",)),
+            "player_id": _first_column(board, ("player_id",)),
+            "player_key": _first_column(players, PLAYER_ID_COLUMNS),
+            "username": _first_column(players, PLAYER_NAME_COLUMNS),
+        }
+        if not all(columns.values()):
+            logger.warning(f"Leaderboard index: required columns missing ({columns})")
+            return None
+        columns["region"] = _first_column(board, ("region",))
+        columns["score"] = _first_column(board, ("score",))
+        return columns
+
+    def _reset(self):
+        self._boards: Dict[Tuple[str, Optional[str]], IndexableSkipList] = {}
+        self._keys: Dict[Tuple[Any, str, Optional[str]], Tuple] = {}  # (player, season, region) -> sort key
+        self._player_boards: Dict[Any, Set[Tuple[str, Optional[str]]]] = {}
+        self._names: Dict[Any, str] = {}
+        self._ids: Dict[str, Any] = {}
+        self._last_row_id = None
+        self._last_player_id = None
+        self._memory = None
+
+    def refresh(self):
+        """Load leaderboard rows and players added since the last refresh."""
+        if self._columns is None:
+            return
+        columns = self._columns
+        with self._lock:
+            with self.engine.connect() as connection:
+                for player_id, username in self._fetch_new(
+                    connection, "players", columns["player_key"], [columns["player_key"], columns["username"]], "_last_player_id"
+                ):
+                    if username:
+                        self._names[player_id] = username
+                        self._ids[username.lower()] = player_id
+                selected = [columns["id"], columns["player_id"], columns["season"], columns["region"] or "NULL",
+                            columns["rank"], columns["score"] or "NULL"]
+                for _, player_id, season, region, rank, score in self._fetch_new(
+                    connection, "leaderboards", columns["id"], selected, "_last_row_id"
+                ):
+                    if season is not None:
+                        self.update(LeaderboardEntry(player_id, str(season), region, rank, score))
+            self._refreshed_at = time.monotonic()
+
+    def _fetch_new(self, connection, table: str, id_column: str, selected: List[str], mark: str) -> List[Tuple]:
+        query = f"SELECT {', '.join(selected)} FROM {table}"
+        params = {}
+        if getattr(self, mark) is not None:
+            query += f" WHERE {id_column} > :last_id"
+            params["last_id"] = getattr(self, mark)
+        rows = connection.execute(text(query + f" ORDER BY {id_column}"), params).fetchall()
+        if rows:
+            setattr(self, mark, rows[-1][0])
+        return rows
+
+    def maybe_refresh(self) -> Optional[threading.Thread]:
+        """Swap in a finished reload, then refresh, or start a due reload in the background and return its thread."""
+        fresh, self._fresh = self._fresh, None
+        if fresh is not None:
+            self._swap(fresh)
+        now = time.monotonic()
+        if self.reload_seconds is not None and now - self._reloaded_at >= self.reload_seconds:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._build, name="leaderboard-reload", daemon=True)
+                self._worker.start()
+                return self._worker
+        if now - self._refreshed_at >= self.refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                # Stale standings only cost answers that lag by one more refresh interval
+                logger.warning(f"Leaderboard index refresh failed: {e}")
+                self._refreshed_at = time.monotonic()
+        return None
+
+    def _build(self):
+        try:
+            self._fresh = LeaderboardIndex(self.engine, self.refresh_seconds, self.seed, reload_seconds=None)
+        except Exception as e:
+            logger.warning(f"Leaderboard index reload failed: {e}")
+        self._reloaded_at = time.monotonic()
+
+    def reload(self):
+        """Rebuild every board from the database, picking up rows updated in place."""
+        self._swap(LeaderboardIndex(self.engine, self.refresh_seconds, self.seed, reload_seconds=None))
+
+    def _swap(self, fresh: "LeaderboardIndex"):
+        with self._lock:
+            for name in ("_columns", "_boards", "_keys", "_player_boards", "_names", "_ids",
+                         "_last_row_id", "_last_player_id", "_memory", "_refreshed_at"):
+                setattr(self, name, getattr(fresh, name))
+            self._reloaded_at = time.monotonic()
+
+    def update(self, entry: LeaderboardEntry):
+        """Insert or replace a player's standing on the entry's (season, region) board."""
+        board_key = (entry.season, entry.region)
+        board = self._boards.get(board_key)
+        if board is None:
+            board = self._boards[board_key] = IndexableSkipList(self.seed)
+        seasons = self._player_boards.get(entry.player_id, ())
+        for old in [other for other in seasons if other[0] == entry.season and other != board_key]:
+            # A newer row in another region means the player moved; the old board must not keep them
+            self._boards[old].remove(self._keys.pop((entry.player_id, old[0], old[1])))
+            self._player_boards[entry.player_id].discard(old)
+            if not self._boards[old]:
+                del self._boards[old]
+        player_key = (entry.player_id, entry.season, entry.region)
+        previous = self._keys.get(player_key)
+        if previous is not None:
+            board.remove(previous)
+        key = _sort_key(entry)
+        board.insert(key, entry)
+        self._keys[player_key] = key
+        self._player_boards.setdefault(entry.player_id, set()).add(board_key)
+        self._memory = None
+
+    def seasons(self) -> List[str]:
+        return sorted({season for season, _ in self._boards}, key=season_key)
+
+    def regions(self) -> Set[str]:
+        return {region for _, region in self._boards if region}
+
+    def username(self, player_id) -> str:
+        return self._names.get(player_id, str(player_id))
+
+    def standings(self, username: str, season: Optional[str] = None, region: Optional[str] = None) -> List[Standing]:
+        """The player's standing in season (default: their latest), on the region board they are on."""
+        player_id = self._ids.get(username.lower())
+        boards = sorted(self._player_boards.get(player_id, ()), key=lambda board: (season_key(board[0]), board[1] or ""))
+        if season is None and boards:
+            season = boards[-1][0]
+        found = []
+        for board_key in boards:
+            if board_key[0] != season or (region is not None and board_key[1] != region):
+                continue
+            board = self._boards[board_key]
+            position = board.index(self._keys[(player_id, board_key[0], board_key[1])])
+            found.append(Standing(board[position], position + 1, len(board)))
+        return found
+
+    def top(self, n: int = 10, season: Optional[str] = None, region: Optional[str] = None) -> List[LeaderboardEntry]:
+        """The first n entries of a board; without a region, every region of the season merged in rank order."""
+        season = season or (self.seasons() or [None])[-1]
+        boards = [
+            board for (board_season, board_region), board in self._boards.items()
+            if board_season == season and (region is None or board_region == region)
+        ]
+        merged = sorted((item for board in boards for item in board.items(0, n)), key=lambda item: item[0])
+        return [entry for _, entry in merged[:n]]
+
+    def around(self, standing: Standing, k: int = 2) -> List[Standing]:
+        """The standing with up to k entries either side of it on its board."""
+        board = self._boards[(standing.entry.season, standing.entry.region)]
+        start = max(0, standing.position - 1 - k)
+        return [
+            Standing(entry, start + offset + 1, len(board))
+            for offset, (_, entry) in enumerate(board.items(start, 2 * k + 1))
+        ]
+
+    def answer(self, question: str, players: Sequence[str]) -> Optional[str]:
+        """A rank, top-N or neighbourhood answer, or None if the question needs the SQL path."""
+        if not self._boards:
+            return None
+        parsed = leaderboard_question(question, self.seasons(), self.regions())
+        if parsed is None:
+            return None
+        if parsed.kind == "top":
+            if players:
+                return None  # "Is IceWarden in the top 10?" is left to SQL
+            entries = self.top(parsed.n, parsed.season, parsed.region)
+            if not entries:
+                return None
+            where = f" in {parsed.region}" if parsed.region else ""
+            lines = [
+                f"{self.username(entry.player_id)} (rank {entry.rank}"
+                + (f", {entry.region}" if entry.region and not parsed.region else "")
+                + (f", {entry.score:g} points)" if entry.score is not None else ")")
+                for entry in entries
+            ]
+            return f"Top {len(entries)}{where} for season {entries[0].season}: " + "; ".join(lines) + "."
+        if len(players) != 1:
+            return None
+        standings = self.standings(players[0], parsed.season, parsed.region)
+        if not standings:
+            return None
+        if parsed.kind == "around":
+            standing = standings[0]
+            nearby = ", ".join(
+                f"{self.username(other.entry.player_id)} (rank {other.entry.rank})" for other in self.around(standing, parsed.n)
+            )
+            where = f" in {standing.entry.region}" if standing.entry.region else ""
+            return f"Around {players[0]}{where} for season {standing.entry.season}: {nearby}."
+        return " ".join(
+            f"{players[0]} is ranked {standing.entry.rank}"
+            + (f" in {standing.entry.region}" if standing.entry.region else "")
+            + f" for season {standing.entry.season}."
+            for standing in standings
+        )
+
+    def memory_bytes(self) -> int:
+        if self._memory is None:
+            self._memory = (sum(board.memory_bytes() for board in self._boards.values())
+                            + sys.getsizeof(self._keys) + sys.getsizeof(self._player_boards)
+                            + sys.getsizeof(self._names) + sys.getsizeof(self._ids))
+        return self._memory
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "boards": len(self._boards),
+            "entries": sum(len(board) for board in self._boards.values()),
+            "memory_bytes": self.memory_bytes(),
+        }
@@ -0,0 +1,137 @@
+"""
+Cache of SQL results keyed by canonicalised SQL.
+
+The same popular questions (top leaderboard ranks, clan member counts, one
+player's VIP status) produce the same SQL over and over. Results are cached
+under the SQL with whitespace and keyword case normalised (string literals
+are left untouched) plus its bound parameters.
+
+Statements whose result depends on the clock (``datetime('now', ...)``,
+``NOW()``, ``CURRENT_DATE``) or on chance are never cached.
+
+Every entry records the version of each table it read. Bumping a table's
+version (a write through this process, or new rows noticed by the entity
+directory) invalidates every entry that depends on it; a TTL bounds the
+staleness from writes made elsewhere.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from app.services.data.sql_guard import table_aliases, tokenize
+
+# Quoted literals and identifiers are kept verbatim; everything else is normalised
+LITERAL_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+# Tables a write targets; tables read are found with the SQL guard's FROM-list parsing
+WRITE_TABLE_PATTERN = re.compile(r"\b(?:update|into)\s+([a-z_][\w.]*)")
+WRITE_PATTERN = re.compile(r"^\s*(?:insert|update|delete|replace|create|drop|alter)\b")
+# Results that change without any write: random rows, and windows relative to the current time
+VOLATILE_PATTERN = re.compile(
+    r"\b(?:random|randomblob)\s*\(|'now'|\bnow\(\)|\bcurrent_(?:date|time|timestamp)\b|\blocaltime(?:stamp)?\b"
+)
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Lowercase and collapse whitespace outside quoted literals; drop the trailing semicolon."""
+    parts = LITERAL_PATTERN.split(sql.strip().rstrip(";"))
+    for i in range(0, len(parts), 2):
+        # Spacing around punctuation is dropped only outside literals, where 'a = b' and 'a=b' differ
+        parts[i] = re.sub(r"\s*([(),=<>])\s*", r"\1", re.sub(r"\s+", " ", parts[i].lower()))
+    return "".join(parts).strip()
+
+
+def tables_in(canonical_sql: str) -> FrozenSet[str]:
+    """Tables a canonical statement reads or writes (literals excluded), including comma joins."""
+    code = "".join(LITERAL_PATTERN.split(canonical_sql)[::2])
+    read = table_aliases(tokenize(canonical_sql)).values()
+    return frozenset(read) | frozenset(name.split(".")[-1] for name in WRITE_TABLE_PATTERN.findall(code))
+
+
+class _TableStats:
+    __slots__ = ("lookups", "hits")
+
+    def __init__(self):
+        self.lookups = 0
+        self.hits = 0
+
+
+class ResultCache:
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 2000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (value, {table: version}, expires_at)
+        self._entries: "OrderedDict[str, Tuple[Any, Dict[str, int], float]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._tables: Dict[str, _TableStats] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(canonical: str, params: Optional[Dict[str, Any]]) -> str:
+        return f"{canonical}|{json.dumps(params, sort_keys=True, default=str)}" if params else canonical
+
+    def get(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        canonical = canonicalize_sql(sql)
+        key, tables = self._key(canonical, params), tables_in(canonical)
+        with self._lock:
+            self.lookups += 1
+            for table in tables:
+                self._tables.setdefault(table, _TableStats()).lookups += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, dependencies, expires_at = entry
+            stale = any(self._versions.get(table, 0) != version for table, version in dependencies.items())
+            if stale or time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            for table in tables:
+                self._tables[table].hits += 1
+            return value
+
+    def put(self, sql: str, value: Any, params: Optional[Dict[str, Any]] = None):
+        canonical = canonicalize_sql(sql)
+        tables = tables_in(canonical)
+        if WRITE_PATTERN.match(canonical):
+            # A write through this process invalidates its tables right away
+            for table in tables:
+                self.invalidate(table)
+            return
+        if VOLATILE_PATTERN.search(canonical) or not tables:
+            return
+        with self._lock:
+            key = self._key(canonical, params)
+            dependencies = {table: self._versions.get(table, 0) for table in tables}
+            self._entries[key] = (value, dependencies, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str):
+        """Bump a table's version; entries that read it are dropped on their next lookup."""
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+                "tables": {
+                    table: {
+                        "lookups": stats.lookups,
+                        "hits": stats.hits,
+                        "hit_rate": round(stats.hits / stats.lookups, 4) if stats.lookups else None,
+                        "version": self._versions.get(table, 0),
+                    }
+                    for table, stats in sorted(self._tables.items())
+                },
+            }
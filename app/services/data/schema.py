@@ -0,0 +1,212 @@
+"""
+Question-specific schema excerpts for SQL generation.
+
+SQLDatabase.get_table_info() renders every table with three sample rows,
+and that whole block used to go into every SQL generation prompt. The
+SchemaIndex keeps the introspected schema in memory and, per question,
+renders only the tables whose name, columns or categorical values the
+question mentions, plus the tables they reference through foreign keys so
+every join the SQL might need is still described. Referenced-only tables
+are cut down to their keys and name columns. Sample values are shown only
+for columns whose values the question mentions ("legendary", "gold"), where
+they give the model the exact spelling to filter on.
+"""
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.models.migrations import reflect_indexes
+from app.services.retrieval.bm25 import STOPWORDS
+
+logger = logging.getLogger("uvicorn.error")
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Column name parts too generic to say which table a question is about
+GENERIC_PARTS = frozenset({"id", "name", "type", "date", "count"})
+# Text columns with at most this many distinct values have them indexed as keywords
+MAX_CATEGORY_VALUES = 12
+# Rows read per column when looking for those values, so startup never scans a whole table
+CATEGORY_SAMPLE_ROWS = 10_000
+
+# Question words that name a table without matching any of its identifiers
+SYNONYMS = {
+    "bought": "purchases", "buy": "purchases", "spent": "purchases", "spend": "purchases",
+    "won": "matches", "win": "matches", "wins": "matches", "lost": "matches", "played": "matches",
+    "ranked": "leaderboards", "ranking": "leaderboards", "top": "leaderboards",
+    "earned": "achievements", "unlocked": "achievements",
+}
+
+
+def stem(word: str) -> str:
+    for suffix in ("ies", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+class Column(NamedTuple):
+    name: str
+    type: str
+    values: List[str]  # distinct values of small categorical columns
+
+
+class Table(NamedTuple):
+    name: str
+    columns: List[Column]
+    primary_key: List[str]
+    foreign_keys: Dict[str, str]  # column -> "table(column)"
+
+    @property
+    def references(self) -> Set[str]:
+        return {target.split("(")[0] for target in self.foreign_keys.values()}
+
+
+class SchemaIndex:
+    def __init__(self, engine: Engine, tables: Optional[Iterable[str]] = None):
+        self.tables: Dict[str, Table] = {}
+        # keyword -> {table: {column, ...}}; an empty column set means the table itself matched
+        self._keywords: Dict[str, Dict[str, Set[str]]] = {}
+        self._load(engine, tables)
+
+    def _load(self, engine: Engine, only: Optional[Iterable[str]]):
+        inspector = inspect(engine)
+        names = list(only) if only else inspector.get_table_names()
+        with engine.connect() as connection:
+            for name in names:
+                # Copied first: SQLite pk reflection reorders the inspector's cached column list
+                reflected = list(inspector.get_columns(name))
+                foreign_keys = {
+                    column: f"{fk['referred_table']}({referred})"
+                    for fk in inspector.get_foreign_keys(name)
+                    for column, referred in zip(fk["constrained_columns"], fk["referred_columns"])
+                }
+                primary_key = inspector.get_pk_constraint(name).get("constrained_columns") or []
+                # Unique and name columns identify rows rather than categorise them
+                unique = set(primary_key)
+                for constraint in inspector.get_unique_constraints(name):
+                    unique.update(constraint["column_names"])
+                for index in reflect_indexes(inspector, name):
+                    if index.get("unique"):
+                        unique.update(index["column_names"])
+                columns = []
+                for column in reflected:
+                    column_type = str(column["type"])
+                    values = []
+                    categorical = column["name"] not in unique and not column["name"].endswith("name")
+                    if categorical and column_type.upper().startswith(("TEXT", "VARCHAR", "CHAR")):
+                        values = self._categories(connection, name, column["name"])
+                    columns.append(Column(column["name"], column_type, values))
+                self.tables[name] = Table(name, columns, primary_key, foreign_keys)
+        for table in self.tables.values():
+            self._index(table)
+
+    @staticmethod
+    def _categories(connection, table: str, column: str) -> List[str]:
+        """
+        Distinct values of a small categorical column, or [] for any other column.
+
+        Postgres answers from the planner statistics when ANALYZE has run. Otherwise
+        the values come from the first CATEGORY_SAMPLE_ROWS rows, so a value that only
+        appears further in is missed, which costs a keyword rather than a scan.
+        """
+        if connection.dialect.name == "postgresql":
+            stats = connection.execute(text(
+                "SELECT n_distinct, array_to_json(most_common_vals::text::text[])::text FROM pg_stats "
+                "WHERE schemaname = current_schema() AND tablename = :table AND attname = :column"
+            ), {"table": table, "column": column}).fetchone()
+            # A negative n_distinct is a fraction of the row count, so only positive counts are trusted
+            if stats is not None and stats[0] > MAX_CATEGORY_VALUES:
+                return []
+            common = json.loads(stats[1]) if stats is not None and stats[1] else []
+            if stats is not None and 0 < stats[0] <= len(common):
+                return sorted(str(value) for value in common)
+        rows = connection.execute(text(
+            f"SELECT DISTINCT {column} FROM (SELECT {column} FROM {table} WHERE {column} IS NOT NULL "
+            f"LIMIT {CATEGORY_SAMPLE_ROWS}) sample LIMIT {MAX_CATEGORY_VALUES + 1}"
+        )).fetchall()
+        return [] if len(rows) > MAX_CATEGORY_VALUES else sorted(str(row[0]) for row in rows)
+
+    def _add_keyword(self, word: str, table: str, column: Optional[str] = None):
+        columns = self._keywords.setdefault(stem(word), {}).setdefault(table, set())
+        if column:
+            columns.add(column)
+
+    def _index(self, table: Table):
+        for part in table.name.lower().split("_"):
+            self._add_keyword(part, table.name)
+        for column in table.columns:
+            if column.name in table.foreign_keys:
+                # A reference names the other table, which the closure adds anyway
+                continue
+            parts = column.name.lower().split("_")
+            for part in parts:
+                if part not in GENERIC_PARTS and part not in STOPWORDS:
+                    self._add_keyword(part, table.name, column.name)
+            for value in column.values:
+                for word in WORD_PATTERN.findall(value.lower()):
+                    if word not in STOPWORDS and len(word) > 2:
+                        self._add_keyword(word, table.name, column.name)
+        for word, target in SYNONYMS.items():
+            if target == table.name:
+                self._add_keyword(word, table.name)
+
+    def matches(self, question: str) -> Dict[str, Set[str]]:
+        """Tables the question mentions, each with the columns it mentions."""
+        found: Dict[str, Set[str]] = {}
+        for word in WORD_PATTERN.findall(question.lower()):
+            if word in STOPWORDS:
+                continue
+            for table, columns in self._keywords.get(stem(word), {}).items():
+                found.setdefault(table, set()).update(columns)
+        return found
+
+    def closure(self, tables: Iterable[str]) -> Set[str]:
+        """The tables plus everything they reference through foreign keys, transitively."""
+        pending, selected = list(tables), set()
+        while pending:
+            name = pending.pop()
+            if name in selected or name not in self.tables:
+                continue
+            selected.add(name)
+            pending.extend(self.tables[name].references)
+        return selected
+
+    def prune(self, question: str, tables: Iterable[str] = ()) -> Optional[str]:
+        """
+        The schema excerpt for question, or None if it names no table.
+
+        tables adds tables known to be involved, e.g. "players" when the question names a player.
+        """
+        found = self.matches(question)
+        for name in tables:
+            found.setdefault(name, set())
+        if not found:
+            return None
+        words = {stem(word) for word in WORD_PATTERN.findall(question.lower())}
+        blocks = []
+        for name in sorted(self.closure(found)):
+            blocks.append(self._render(self.tables[name], full=name in found, mentioned=found.get(name, set()), words=words))
+        return "\n\n".join(blocks)
+
+    @staticmethod
+    def _render(table: Table, full: bool, mentioned: Set[str], words: Set[str]) -> str:
+        keys = set(table.primary_key) | set(table.foreign_keys)
+        lines, notes = [], []
+        for column in table.columns:
+            if not (full or column.name in keys or column.name in mentioned or column.name.endswith("name")):
+                continue
+            lines.append(f"\t{column.name} {column.type}")
+            if column.values and any(stem(word) in words for value in column.values for word in WORD_PATTERN.findall(value.lower())):
+                notes.append(f"{table.name}.{column.name} values: " + ", ".join(f"'{value}'" for value in column.values))
+        if table.primary_key:
+            lines.append(f"\tPRIMARY KEY ({', '.join(table.primary_key)})")
+        for column, target in table.foreign_keys.items():
+            lines.append(f"\tFOREIGN KEY({column}) REFERENCES {target}")
+        block = f"CREATE TABLE {table.name} (\n" + ",\n".join(lines) + "\n)"
+        if notes:
+            block += "\n/*\n" + "\n".join(notes) + "\n*/"
+        return block
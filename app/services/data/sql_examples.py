@@ -0,0 +1,118 @@
+"""
+Validated question-to-SQL examples for few-shot SQL generation.
+
+Instead of a fixed list of schema rules in every prompt, SQL generation is
+shown the few past questions most similar to the current one, with the SQL
+that answered them. Examples are indexed by their question skeleton (names
+and numbers masked, see sql_templates), so "How many legendary items did
+IceWarden buy?" finds the example for any other player.
+
+The store is seeded from a curated JSONL file and from the log of SQL that
+ran successfully in earlier sessions. Logged questions that later received
+negative feedback are left out.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from app.services.retrieval.bm25 import BM25Index
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SqlExample(NamedTuple):
+    question: str
+    sql: str
+    skeleton: str
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?.! ")
+
+
+def read_examples(path: str) -> List[Dict[str, str]]:
+    """{"question", "sql"} records from a JSONL file; a missing file has none."""
+    if not path or not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed SQL example at {path}:{line_number}")
+                continue
+            if record.get("question") and record.get("sql"):
+                records.append(record)
+    return records
+
+
+def rejected_questions(feedback_dir: str) -> set:
+    """Normalised questions whose answers received negative feedback."""
+    rejected = set()
+    for path in glob.glob(os.path.join(feedback_dir, "*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if (record.get("feedback") or {}).get("type") == "negative" and record.get("query"):
+            rejected.add(_normalize_question(record["query"]))
+    return rejected
+
+
+class SqlExampleStore:
+    def __init__(self, log_path: Optional[str] = None):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._examples: Dict[str, SqlExample] = {}  # by skeleton, latest wins
+        self._ordered: List[SqlExample] = []
+        self._index: Optional[BM25Index] = None
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    def add(self, question: str, sql: str, skeleton: Optional[str] = None):
+        skeleton = skeleton or _normalize_question(question)
+        with self._lock:
+            self._examples[skeleton] = SqlExample(question, sql, skeleton)
+            self._index = None
+
+    def load(self, records: Iterable[Dict[str, str]], skeleton_of=None, exclude: Iterable[str] = ()):
+        excluded = {_normalize_question(question) for question in exclude}
+        for record in records:
+            if _normalize_question(record["question"]) in excluded:
+                continue
+            skeleton = skeleton_of(record["question"]) if skeleton_of else None
+            self.add(record["question"], record["sql"], skeleton)
+
+    def learn(self, question: str, sql: str, skeleton: Optional[str] = None):
+        """Add an example whose SQL ran successfully, and log it for later sessions."""
+        skeleton = skeleton or _normalize_question(question)
+        if skeleton in self._examples:
+            return
+        self.add(question, sql, skeleton)
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"question": question, "sql": sql}) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not log SQL example: {e}")
+
+    def search(self, skeleton: str, k: int = 3) -> List[SqlExample]:
+        with self._lock:
+            if self._index is None:
+                self._ordered = list(self._examples.values())
+                self._index = BM25Index(example.skeleton for example in self._ordered)
+            index, ordered = self._index, self._ordered
+        return [ordered[doc_id] for doc_id, _ in index.search(skeleton, k)]
+
+
+def format_examples(examples: Iterable[SqlExample]) -> str:
+    return "\n\n".join(f"Question: {example.question}\nSQL: {example.sql}" for example in examples)
@@ -0,0 +1,317 @@
+"""
+Checks on generated SQL before it reaches the database.
+
+_clean_sql_query only strips semicolons, so a hallucinated cartesian join or
+an unbounded scan of ``matches`` would run as written. SqlGuard tokenises
+the statement (string literals and quoted identifiers kept whole, nesting
+depth tracked) and:
+
+* rejects anything but a single read-only SELECT/WITH statement
+* rejects JOINs without ON/USING, CROSS JOINs, and comma joins without WHERE
+* adds LIMIT max_rows when the statement can return many rows, and lowers
+  larger limits
+* warns about functions applied to indexed columns (``DATE(p.created)``),
+  which keep the index from being used, unless an expression index covers
+  the call (``lower(username)``, see app.models.migrations)
+* optionally estimates the plan cost with EXPLAIN and rejects statements
+  above a threshold
+
+Rejections carry a reason that is fed back into one regeneration attempt.
+"""
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.models.migrations import expression_indexes, reflect_indexes
+
+logger = logging.getLogger("uvicorn.error")
+
+TOKEN_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\d+(?:\.\d+)?|:\w+"
+    r"|[A-Za-z_][\w$]*(?:\.(?:[A-Za-z_][\w$]*|\*))?|<=|>=|<>|!=|\|\||\S"
+)
+WRITE_KEYWORDS = frozenset({
+    "INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE", "REPLACE", "ATTACH", "DETACH",
+    "PRAGMA", "GRANT", "REVOKE", "TRUNCATE", "VACUUM", "REINDEX", "MERGE", "COPY",
+})
+AGGREGATES = frozenset({"COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL", "GROUP_CONCAT", "STRING_AGG"})
+# Keywords that end the table list of a FROM clause or the extent of a JOIN
+CLAUSE_KEYWORDS = frozenset({
+    "WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "UNION", "INTERSECT", "EXCEPT", "WINDOW", "OFFSET",
+})
+JOIN_KEYWORDS = frozenset({"JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "OUTER"})
+NOT_ALIASES = CLAUSE_KEYWORDS | JOIN_KEYWORDS | {"ON", "USING", "AS", "SELECT", "FROM"}
+# Keywords that can precede "(" without being a function call
+NOT_FUNCTIONS = frozenset({"USING", "IN", "EXISTS", "VALUES", "AS", "ON", "AND", "OR", "NOT", "OVER", "FILTER"})
+
+
+class Token(NamedTuple):
+    text: str
+    start: int
+    end: int
+    depth: int
+
+    @property
+    def word(self) -> str:
+        return self.text.upper()
+
+
+class GuardResult(NamedTuple):
+    sql: str  # possibly rewritten
+    errors: List[str]
+    warnings: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def tokenize(sql: str) -> List[Token]:
+    tokens, depth = [], 0
+    for match in TOKEN_PATTERN.finditer(sql):
+        value = match.group(0)
+        if value == ")":
+            depth -= 1
+        tokens.append(Token(value, match.start(), match.end(), depth))
+        if value == "(":
+            depth += 1
+    return tokens
+
+
+def _is_identifier(token: Token) -> bool:
+    return bool(re.match(r"[A-Za-z_]", token.text)) and token.word not in NOT_ALIASES
+
+
+def table_aliases(tokens: List[Token]) -> Dict[str, str]:
+    """alias (or table name) -> table name for every table after FROM, JOIN or a FROM-list comma."""
+    aliases: Dict[str, str] = {}
+    in_from: Dict[int, bool] = {}
+    for i, token in enumerate(tokens):
+        word = token.word
+        if word == "FROM":
+            in_from[token.depth] = True
+        elif word in CLAUSE_KEYWORDS or word == "SELECT":
+            in_from[token.depth] = False
+        opens_table = word in ("FROM", "JOIN") or (token.text == "," and in_from.get(token.depth))
+        if not opens_table or i + 1 >= len(tokens) or not _is_identifier(tokens[i + 1]):
+            continue
+        table = tokens[i + 1].text.split(".")[-1].lower()
+        aliases[table] = table
+        j = i + 2
+        if j < len(tokens) and tokens[j].word == "AS":
+            j += 1
+        if j < len(tokens) and _is_identifier(tokens[j]):
+            aliases[tokens[j].text.lower()] = table
+    return aliases
+
+
+class SqlGuard:
+    def __init__(
+        self,
+        max_rows: int = 100,
+        indexed_columns: Optional[Dict[str, Set[str]]] = None,
+        table_rows: Optional[Dict[str, int]] = None,
+        max_cost: Optional[float] = None,
+        indexed_expressions: Optional[Set[str]] = None,
+        size_refresh_seconds: float = 300
+    ):
+        self.max_rows = max_rows
+        self.indexed_columns = indexed_columns or {}
+        # "table.function(column)" expressions with their own index, e.g. "players.lower(username)"
+        self.indexed_expressions = indexed_expressions or set()
+        self.table_rows = table_rows or {}
+        self.max_cost = max_cost
+        # check_plan re-counts table_rows this often, so SQLite costs follow the tables as they grow
+        self.size_refresh_seconds = size_refresh_seconds
+        self._sized_at = time.monotonic()
+
+    @classmethod
+    def from_engine(cls, engine: Engine, **options) -> "SqlGuard":
+        """A guard that knows the database's indexed columns and, on SQLite, its table sizes."""
+        inspector = inspect(engine)
+        indexed, rows = {}, {}
+        with engine.connect() as connection:
+            for table in inspector.get_table_names():
+                columns = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+                for index in reflect_indexes(inspector, table):
+                    columns.update(column for column in index["column_names"][:1] if column)
+                for constraint in inspector.get_unique_constraints(table):
+                    columns.update(constraint["column_names"][:1])
+                indexed[table] = columns
+                # Postgres plans carry their own cost; SQLite's need table sizes to be weighed
+                if engine.dialect.name == "sqlite":
+                    rows[table] = connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() or 0
+            expressions = expression_indexes(connection, engine.dialect.name)
+        return cls(indexed_columns=indexed, table_rows=rows, indexed_expressions=expressions, **options)
+
+    def check(self, sql: str) -> GuardResult:
+        sql = sql.strip().rstrip(";").strip()
+        tokens = tokenize(sql)
+        errors: List[str] = []
+        warnings: List[str] = []
+        if not tokens:
+            return GuardResult(sql, ["the query is empty"], warnings)
+
+        if any(token.text == ";" for token in tokens):
+            errors.append("only a single statement is allowed")
+        if tokens[0].word not in ("SELECT", "WITH"):
+            errors.append("only SELECT queries are allowed")
+        for i, token in enumerate(tokens):
+            next_text = tokens[i + 1].text if i + 1 < len(tokens) else ""
+            # REPLACE(...) is also a string function
+            if token.word in WRITE_KEYWORDS and not (token.word == "REPLACE" and next_text == "("):
+                errors.append(f"{token.word} statements are not allowed")
+                break
+
+        aliases = table_aliases(tokens)
+        errors.extend(self._join_errors(tokens))
+        warnings.extend(self._index_warnings(tokens, aliases))
+        if not errors:
+            sql = self._bound_rows(sql, tokens)
+        return GuardResult(sql, errors, warnings)
+
+    @staticmethod
+    def _join_errors(tokens: List[Token]) -> List[str]:
+        errors = []
+        for i, token in enumerate(tokens):
+            if token.word == "CROSS":
+                errors.append("CROSS JOIN produces a cartesian product")
+            elif token.word == "JOIN" and (i == 0 or tokens[i - 1].word not in ("NATURAL", "CROSS")):
+                # The join's extent ends at the next join or clause at its own depth
+                has_condition = False
+                for later in tokens[i + 1:]:
+                    if later.depth < token.depth:
+                        break
+                    if later.depth == token.depth:
+                        if later.word in ("ON", "USING"):
+                            has_condition = True
+                            break
+                        if later.word in JOIN_KEYWORDS or later.word in CLAUSE_KEYWORDS:
+                            break
+                if not has_condition:
+                    errors.append("JOIN without an ON or USING condition produces a cartesian product")
+            elif token.word == "FROM":
+                comma, where = False, False
+                for later in tokens[i + 1:]:
+                    if later.depth < token.depth or (later.depth == token.depth and later.word == "SELECT"):
+                        break
+                    if later.depth != token.depth:
+                        continue
+                    if later.text == "," and not where:
+                        comma = True
+                    elif later.word == "WHERE":
+                        where = True
+                        break
+                    elif later.word in CLAUSE_KEYWORDS:
+                        break
+                if comma and not where:
+                    errors.append("tables listed in FROM without a WHERE condition produce a cartesian product")
+        return list(dict.fromkeys(errors))
+
+    def _index_warnings(self, tokens: List[Token], aliases: Dict[str, str]) -> List[str]:
+        warnings = []
+        for i in range(len(tokens) - 3):
+            function, opening, argument, closing = tokens[i:i + 4]
+            if opening.text != "(" or closing.text != ")" or function.word in AGGREGATES | NOT_FUNCTIONS:
+                continue
+            if not re.match(r"[A-Za-z_]", function.text) or not _is_identifier(argument):
+                continue
+            qualifier, _, column = argument.text.lower().rpartition(".")
+            tables = [aliases.get(qualifier)] if qualifier else sorted(set(aliases.values()))
+            for table in tables:
+                if f"{table}.{function.text.lower()}({column})" in self.indexed_expressions:
+                    break
+                if table and column in self.indexed_columns.get(table, ()):
+                    warnings.append(f"{function.text}({argument.text}) keeps the index on {table}.{column} from being used")
+                    break
+        return warnings
+
+    def _bound_rows(self, sql: str, tokens: List[Token]) -> str:
+        """Add or lower the outermost LIMIT, unless the query returns a single aggregate row."""
+        top = [token for token in tokens if token.depth == 0]
+        for i, token in enumerate(top):
+            if token.word == "LIMIT":
+                if i + 1 < len(top) and top[i + 1].text.isdigit() and int(top[i + 1].text) > self.max_rows:
+                    value = top[i + 1]
+                    return sql[:value.start] + str(self.max_rows) + sql[value.end:]
+                return sql
+        words = [token.word for token in top]
+        select_list = words[words.index("SELECT") + 1:words.index("FROM")] if "SELECT" in words and "FROM" in words else []
+        if "GROUP" not in words and select_list and any(word in AGGREGATES for word in select_list):
+            return sql
+        return f"{sql} LIMIT {self.max_rows}"
+
+    def bound_params(self, sql: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """params with every value bound to a LIMIT (":n0" in "LIMIT :n0") lowered to max_rows."""
+        tokens = tokenize(sql)
+        bounded = dict(params)
+        for token, value in zip(tokens, tokens[1:]):
+            name = value.text[1:]
+            if token.word == "LIMIT" and value.text.startswith(":") and isinstance(bounded.get(name), int):
+                bounded[name] = min(bounded[name], self.max_rows)
+        return bounded
+
+    def plan_cost(self, dialect: str, plan_rows: List[Tuple], aliases: Dict[str, str]) -> Optional[float]:
+        """
+        Cost of an EXPLAIN result: the planner's total cost on Postgres, and on SQLite the
+        nested-loop product of the rows of every fully scanned table (index searches count as 1).
+
+        SQLite also lists scans of subqueries, CTEs and constant rows; their own table scans
+        appear as separate plan rows, so only scans of known tables are weighed. A scan
+        whose alias could not be resolved counts as the largest table.
+        """
+        if dialect == "postgresql":
+            plan = plan_rows[0][0] if plan_rows else None
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return float(plan[0]["Plan"]["Total Cost"]) if plan else None
+        if dialect == "sqlite":
+            largest = max(self.table_rows.values(), default=1)
+            cost = 1.0
+            for row in plan_rows:
+                detail = str(row[-1])
+                match = re.match(r"SCAN (?:TABLE )?(\S+)", detail)
+                if not match or match.group(1).startswith("(") or match.group(1) == "CONSTANT":
+                    continue
+                name = match.group(1).lower()
+                table = aliases.get(name, name)
+                if table in self.table_rows:
+                    cost *= max(1, self.table_rows[table])
+                elif name not in aliases:
+                    cost *= max(1, largest)
+            return cost
+
+    async def refresh_sizes(self, db):
+        """Re-count the rows of every table plan_cost weighs."""
+        # Cached counts could be a TTL old, and would crowd the result cache and its hit rates
+        counts = await db.fetch_many([f"SELECT COUNT(*) FROM {table}" for table in self.table_rows], use_cache=False)
+        self.table_rows = {table: (rows[0][0] or 0) for table, rows in zip(self.table_rows, counts)}
+        self._sized_at = time.monotonic()
+        return None
+
+    async def check_plan(self, db, sql: str, params: Optional[Dict] = None) -> Optional[str]:
+        """The reason to reject sql based on its plan, or None."""
+        if self.max_cost is None:
+            return None
+        if self.table_rows and time.monotonic() - self._sized_at >= self.size_refresh_seconds:
+            try:
+                await self.refresh_sizes(db)
+            except Exception as e:
+                # Costs keep using the previous counts until the next interval
+                logger.warning(f"Re-counting table rows failed: {e}")
+                self._sized_at = time.monotonic()
+        try:
+            plan_rows = await db.explain(sql, params)
+        except Exception as e:
+            # The statement itself will fail with a clearer error; the plan check is advisory
+            logger.warning(f"EXPLAIN failed: {e}")
+            return None
+        cost = self.plan_cost(db.dialect, plan_rows, table_aliases(tokenize(sql)))
+        if cost is not None and cost > self.max_cost:
+            return f"the query plan is too expensive (estimated cost {cost:,.0f}, limit {self.max_cost:,.0f}); filter on indexed columns or aggregate less data"
+        return None
+
@@ -0,0 +1,142 @@
+"""
+Reusable SQL templates for question shapes the LLM has already translated.
+
+"What is DragonSlayer99's rank?" and "What is IceWarden's rank?" only differ
+by a name, so both are reduced to the skeleton "what is {player0}'s rank"
+by masking known player and clan names and standalone numbers. When the SQL
+generated for a skeleton turns out to be valid (read-only, every masked
+value appears in it exactly once as a literal, and it returned rows) those
+literals are replaced with bind parameters and the result is stored. The
+next question with the same skeleton runs the stored template as a
+prepared statement with its own values, without calling the LLM.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.services.data.gazetteer import Mention
+from app.services.data.result_cache import LITERAL_PATTERN, WRITE_PATTERN
+
+NUMBER_PATTERN = re.compile(r"(?<![\w.])\d+(?![\w.])")
+STRING_LITERAL_PATTERN = re.compile(r"'((?:[^']|'')*)'")
+
+
+class MaskedQuestion(NamedTuple):
+    skeleton: str
+    values: Dict[str, Any]
+
+
+def mask_question(query: str, entities: Sequence[Tuple[str, Mention]]) -> MaskedQuestion:
+    """
+    Replace entity mentions ("player", "clan") and standalone numbers with numbered slots.
+
+    Overlapping mentions keep the first listed, so callers list players before clans.
+    """
+    spans: List[Tuple[int, int, str, Any]] = []
+    for kind, mention in entities:
+        if all(mention.end <= start or mention.start >= end for start, end, _, _ in spans):
+            spans.append((mention.start, mention.end, kind, mention.name))
+    for match in NUMBER_PATTERN.finditer(query):
+        if all(match.end() <= start or match.start() >= end for start, end, _, _ in spans):
+            spans.append((match.start(), match.end(), "n", int(match.group(0))))
+
+    values: Dict[str, Any] = {}
+    counts: Dict[str, int] = {}
+    pieces, position = [], 0
+    for start, end, kind, value in sorted(spans):
+        slot = f"{kind}{counts.get(kind, 0)}"
+        counts[kind] = counts.get(kind, 0) + 1
+        values[slot] = value
+        pieces.append(query[position:start].lower())
+        pieces.append("{" + slot + "}")
+        position = end
+    pieces.append(query[position:].lower())
+    skeleton = re.sub(r"\s+", " ", "".join(pieces)).strip().rstrip("?.! ")
+    return MaskedQuestion(skeleton, values)
+
+
+def templatize(sql: str, values: Dict[str, Any]) -> Optional[str]:
+    """
+    The SQL with each slot's literal replaced by :slot, or None if that would be ambiguous.
+
+    Every value must appear in the SQL exactly once, and no two slots may share a value:
+    in "level above 1" with ``vip_status = 1 AND level > 1`` only one of the 1s is the
+    question's, and binding both would carry the next question's level into vip_status.
+    """
+    if WRITE_PATTERN.match(sql.lower()):
+        return None
+    keys = [str(value).lower() for value in values.values()]
+    if len(set(keys)) != len(keys):
+        return None
+    slots = {str(value).lower(): slot for slot, value in values.items() if not isinstance(value, int)}
+    numbers = {str(value): slot for slot, value in values.items() if isinstance(value, int)}
+    used: List[str] = []
+
+    def bind_string(match: re.Match) -> str:
+        literal = match.group(1).replace("''", "'")
+        slot = slots.get(literal.lower())
+        if slot is None:
+            return match.group(0)
+        used.append(slot)
+        # A literal lowered for a case-insensitive lookup gets the next value lowered the same way
+        value = str(values[slot])
+        if literal != value and literal == value.lower():
+            return f"LOWER(:{slot})"
+        if literal != value and literal == value.upper():
+            return f"UPPER(:{slot})"
+        return f":{slot}"
+
+    def bind_number(match: re.Match) -> str:
+        slot = numbers.get(match.group(0))
+        if slot is None:
+            return match.group(0)
+        used.append(slot)
+        return f":{slot}"
+
+    parts = LITERAL_PATTERN.split(sql)
+    for i, part in enumerate(parts):
+        if i % 2:
+            parts[i] = STRING_LITERAL_PATTERN.sub(bind_string, part)
+        else:
+            parts[i] = NUMBER_PATTERN.sub(bind_number, part)
+    if sorted(used) != sorted(values):
+        return None
+    return "".join(parts)
+
+
+def render(template: str, values: Dict[str, Any]) -> str:
+    """The template with its values inlined, for logs and prompts (never executed)."""
+    def inline(match: re.Match) -> str:
+        value = values[match.group(1)]
+        return str(value) if isinstance(value, int) else "'" + str(value).replace("'", "''") + "'"
+    return re.sub(r":(\w+)\b", lambda m: inline(m) if m.group(1) in values else m.group(0), template)
+
+
+class SqlTemplateCache:
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._templates: "OrderedDict[str, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def lookup(self, skeleton: str) -> Optional[str]:
+        with self._lock:
+            template = self._templates.get(skeleton)
+            if template is not None:
+                self._templates.move_to_end(skeleton)
+            return template
+
+    def learn(self, question: MaskedQuestion, sql: str) -> bool:
+        """Store the SQL generated for question as its skeleton's template, if it can be parameterised."""
+        template = templatize(sql, question.values)
+        if template is None:
+            return False
+        with self._lock:
+            self._templates[question.skeleton] = template
+            self._templates.move_to_end(question.skeleton)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return True
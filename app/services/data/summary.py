@@ -0,0 +1,433 @@
+"""
+Per-player rollup of the activity tables, maintained incrementally.
+
+Most dynamic questions reduce to one player's totals (legendary purchases,
+gold achievements, matches won, current rank, XP, VIP status), each of which
+used to be a join and an aggregate at query time. ``player_summary`` (created
+by migration 0003) holds one row per player with those totals, so answering
+is a primary-key lookup: names map to ids in memory, loaded from the rollup
+with a high-water mark on player_id as the entity directory does.
+
+Each source table is folded in once. A refresh reads the rows whose primary
+key is above that table's mark in ``player_summary_watermarks``, upserts
+their per-player deltas, and advances the mark in the same transaction. The
+mark is claimed with a compare-and-set before any delta is written, so when
+several workers refresh at once only one of them applies a batch.
+
+Player attributes (username, level, XP, VIP status) are copied for new
+players and re-copied for players with new activity. Changes that add no
+rows (an attribute edited on its own, a leaderboard row updated in place, a
+refund or deletion) show up after rebuild(), which recomputes the rollup in
+one transaction. maybe_refresh() starts the refresh, or every rebuild_seconds
+the rebuild, in a background thread, so a request only ever reads the
+rollup as last committed. The rebuild can also be run by hand, or once per
+deploy:
+
+    python -m app.services.data.summary --rebuild
+"""
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Engine
+
+from app.models.migrations import SUMMARY_TABLE, SUMMARY_WATERMARKS_TABLE
+from app.services.data.directory import PLAYER_ID_COLUMNS, PLAYER_NAME_COLUMNS, _first_column
+from app.services.data.gazetteer import Mention
+from app.services.data.intents import WHAT_IS, normalise_question
+from app.services.data.leaderboard import season_key
+
+logger = logging.getLogger("uvicorn.error")
+
+SUMMARY_COLUMNS = (
+    "player_id", "username", "level", "xp", "vip_status", "purchases", "legendary_purchases", "total_spent",
+    "achievements", "gold_achievements", "matches_played", "matches_won", "xp_gained", "current_season", "current_rank",
+)
+LOOKUP_SQL = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM {SUMMARY_TABLE} WHERE player_id = :player_id"
+
+# Source table -> (primary key candidates, {role: column candidates}); roles missing from a deployment count as empty
+SOURCES = {
+    "purchases": (("purchase_id", "id"), {"rarity": ("rarity",), "price": ("price",)}),
+    "achievements": (("achievement_id", "id"), {"tier": ("tier",)}),
+    "matches": (("match_id", "id"), {"result": ("result",), "xp": ("xp_gained",)}),
+    "leaderboards": (("leaderboard_id", "id"), {"season": ("season",), "rank": ("rank",)}),
+}
+PLAYER_ATTRIBUTES = {"level": ("level",), "xp": ("xp",), "vip_status": ("vip_status",)}
+WIN_RESULTS = frozenset({"win", "won", "victory"})
+BATCH_SIZE = 10000
+
+# Totals the rollup answers directly: (pattern matching the whole normalised question, columns needed, answer).
+# Anything left over ("epic purchases", "ranked matches", "in 2023", "why did @ drop in rank") is a
+# filter or a different question that the unfiltered total would answer wrongly, so it goes to SQL.
+HAS = r"(?:has|have|did|does)"
+SO_FAR = r"(?: in total| so far| overall| altogether)?"
+SUMMARY_ANSWERS = (
+    (rf"how many legendary (?:items|purchases) {HAS} @ (?:purchased?|bought|buy|made|make|have|own(?:ed)?)",
+     ("legendary_purchases",), "{username} has purchased {legendary_purchases} legendary items."),
+    (rf"how many gold achievements {HAS} @ (?:have|earned?|unlocked?|got|get)",
+     ("gold_achievements",), "{username} has earned {gold_achievements} gold achievements."),
+    (rf"how many achievements {HAS} @ (?:have|earned?|unlocked?|got|get)",
+     ("achievements",), "{username} has earned {achievements} achievements."),
+    (rf"how many (?:matches|games) {HAS} @ (?:won|win)|how many wins {HAS} @ (?:have|got|get)",
+     ("matches_won",), "{username} has won {matches_won} matches."),
+    (rf"how many (?:matches|games) {HAS} @ (?:played|play)",
+     ("matches_played",), "{username} has played {matches_played} matches."),
+    (rf"how many purchases {HAS} @ (?:made|make|have)|how many (?:items|things) {HAS} @ (?:bought|buy|purchased?)",
+     ("purchases",), "{username} has made {purchases} purchases."),
+    (rf"{WHAT_IS} @'s (?:current )?rank(?:ing)?|what rank is @|(?:what|where) is @ (?:currently )?ranked",
+     ("current_rank", "current_season"), "{username} is ranked {current_rank} in season {current_season}."),
+    (rf"{WHAT_IS} @'s vip status|is @ (?:a )?vip(?: player| member)?|does @ have vip(?: status)?",
+     ("vip_status",), "{username}'s VIP status is {vip_status}."),
+    (rf"how much (?:xp|experience) (?:does|has) @ (?:have|got|earned)|{WHAT_IS} @'s (?:xp|experience)",
+     ("xp",), "{username} has {xp} XP."),
+    (rf"{WHAT_IS} @'s level|what level is @(?: at| on)?",
+     ("level",), "{username} is level {level}."),
+)
+SUMMARY_PATTERNS = [(re.compile(f"(?:{pattern}){SO_FAR}"), columns, answer) for pattern, columns, answer in SUMMARY_ANSWERS]
+
+
+def summary_question(question: str, mentions: Sequence[Mention]) -> Optional[Tuple[Tuple[str, ...], str]]:
+    """(columns needed, answer template) if the question asks for one total the rollup holds, and nothing more."""
+    rest = normalise_question(question, mentions)
+    return next(((columns, answer) for pattern, columns, answer in SUMMARY_PATTERNS if pattern.fullmatch(rest)), None)
+
+
+def summary_answer(question: str, mentions: Sequence[Mention], row: Dict[str, Any]) -> Optional[str]:
+    """The answer to a single-total question about the row's player, or None if the rollup cannot say."""
+    found = summary_question(question, mentions)
+    if found is None or any(row.get(column) is None for column in found[0]):
+        return None
+    return found[1].format(**row)
+
+
+class _Source:
+    """One activity table's resolved columns."""
+
+    def __init__(self, table: str, id_column: str, player_column: str, roles: Dict[str, Optional[str]]):
+        self.table = table
+        self.id_column = id_column
+        self.player_column = player_column
+        self.roles = roles
+
+    def select(self, through: bool = False) -> str:
+        """Rows above :last_id one batch at a time, or with through the next batch above :after up to :last_id."""
+        columns = [self.id_column, self.player_column] + [column or "NULL" for column in self.roles.values()]
+        if through:
+            return (f"SELECT {', '.join(columns)} FROM {self.table} WHERE {self.id_column} > :after "
+                    f"AND {self.id_column} <= :last_id ORDER BY {self.id_column} LIMIT {BATCH_SIZE}")
+        return (f"SELECT {', '.join(columns)} FROM {self.table} WHERE {self.id_column} > :last_id "
+                f"ORDER BY {self.id_column} LIMIT {BATCH_SIZE}")
+
+
+class PlayerSummary:
+    def __init__(
+        self,
+        engine: Engine,
+        refresh_seconds: float = 60,
+        on_change: Optional[Callable[[str], None]] = None,
+        rebuild_seconds: Optional[float] = 900
+    ):
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._refreshed_at = 0.0
+        self._ids: Dict[str, int] = {}  # lowercased username -> player_id
+        self._last_loaded_id = None
+        self._applied: Dict[str, int] = {}
+        self._players, self._attributes, self._sources = self._resolve()
+        self._ensure_watermarks()
+        self.refresh()
+        self._rebuilt_at = time.monotonic()
+
+    def _resolve(self) -> Tuple[Optional[Tuple[str, str]], Dict[str, str], List[_Source]]:
+        inspector = inspect(self.engine)
+        tables = set(inspector.get_table_names())
+        if "players" not in tables or SUMMARY_TABLE not in tables:
+            logger.warning(f"Player summary: '{SUMMARY_TABLE}' or 'players' not found, the rollup is disabled")
+            return None, {}, []
+        columns = [column["name"] for column in inspector.get_columns("players")]
+        players = (_first_column(columns, PLAYER_ID_COLUMNS), _first_column(columns, PLAYER_NAME_COLUMNS))
+        if not all(players):
+            logger.warning(f"Player summary: no id/name columns found in 'players' ({columns})")
+            return None, {}, []
+        attributes = {role: _first_column(columns, candidates) for role, candidates in PLAYER_ATTRIBUTES.items()}
+        sources = []
+        for table, (ids, roles) in SOURCES.items():
+            if table not in tables:
+                continue
+            columns = [column["name"] for column in inspector.get_columns(table)]
+            id_column = _first_column(columns, ids)
+            if id_column and "player_id" in columns:
+                sources.append(_Source(table, id_column, "player_id", {
+                    role: _first_column(columns, candidates) for role, candidates in roles.items()
+                }))
+        return players, {role: column for role, column in attributes.items() if column}, sources
+
+    def _ensure_watermarks(self):
+        if self._players is None:
+            return
+        with self.engine.begin() as connection:
+            known = {row[0] for row in connection.execute(text(f"SELECT source FROM {SUMMARY_WATERMARKS_TABLE}"))}
+            for source in ["players"] + [source.table for source in self._sources]:
+                if source not in known:
+                    connection.execute(
+                        text(f"INSERT INTO {SUMMARY_WATERMARKS_TABLE} (source, last_id) VALUES (:source, 0)"),
+                        {"source": source}
+                    )
+
+    def refresh(self):
+        """Fold rows added to the source tables since their high-water marks into the rollup."""
+        if self._players is None:
+            return
+        started = time.perf_counter()
+        with self._lock:
+            applied = self._refresh_players()
+            for source in self._sources:
+                applied += self._refresh_source(source)
+            with self.engine.connect() as connection:
+                self._load_ids(connection)
+            self._refreshed_at = time.monotonic()
+        if applied and self.on_change:
+            self.on_change(SUMMARY_TABLE)
+        if applied:
+            logger.info(f"Player summary: folded in {applied} rows in {time.perf_counter() - started:.2f}s")
+
+    def maybe_refresh(self) -> Optional[threading.Thread]:
+        """Start a due refresh or rebuild in a background thread and return it; the caller keeps reading."""
+        now = time.monotonic()
+        rebuild_due = self.rebuild_seconds is not None and now - self._rebuilt_at >= self.rebuild_seconds
+        if not (rebuild_due or now - self._refreshed_at >= self.refresh_seconds):
+            return None
+        if self._worker is not None and self._worker.is_alive():
+            return None
+        self._worker = threading.Thread(target=self._run, args=(rebuild_due,), name="player-summary", daemon=True)
+        self._worker.start()
+        return self._worker
+
+    def _run(self, rebuild: bool):
+        try:
+            self.rebuild() if rebuild else self.refresh()
+        except Exception as e:
+            # A stale rollup only costs answers that lag by one more refresh interval
+            logger.warning(f"Player summary {'rebuild' if rebuild else 'refresh'} failed: {e}")
+            self._refreshed_at = time.monotonic()
+            if rebuild:
+                self._rebuilt_at = self._refreshed_at
+
+    def rebuild(self):
+        """
+        Recompute the rollup from the source tables, picking up changes that add no rows.
+
+        Everything happens in one transaction, so readers keep the previous rollup until
+        the new one commits.
+        """
+        if self._players is None:
+            return
+        started = time.perf_counter()
+        id_column = self._players[0]
+        with self._lock:
+            with self.engine.begin() as connection:
+                # Writing the marks first makes concurrent refreshes wait for this transaction, then lose their claim
+                connection.execute(text(f"UPDATE {SUMMARY_WATERMARKS_TABLE} SET last_id = last_id"))
+                connection.execute(text(f"DELETE FROM {SUMMARY_TABLE}"))
+                ids = [row[0] for row in connection.execute(text(f"SELECT {id_column} FROM players ORDER BY {id_column}"))]
+                self._sync_players(connection, ids)
+                marks = {"players": ids[-1] if ids else 0}
+                for source in self._sources:
+                    last_id = connection.execute(text(f"SELECT MAX({source.id_column}) FROM {source.table}")).scalar() or 0
+                    query, after = text(source.select(through=True)), 0
+                    while after < last_id:
+                        # Batches keep memory flat; the rows of a player spread over batches add up in the upsert
+                        rows = connection.execute(query, {"after": after, "last_id": last_id}).fetchall()
+                        if not rows:
+                            break
+                        self._upsert(connection, source.table, self._fold(source.table, [row[1:] for row in rows if row[1] is not None]))
+                        after = rows[-1][0]
+                    marks[source.table] = last_id
+                for source, last_id in marks.items():
+                    connection.execute(
+                        text(f"UPDATE {SUMMARY_WATERMARKS_TABLE} SET last_id = :last_id WHERE source = :source"),
+                        {"last_id": last_id, "source": source}
+                    )
+            self._last_loaded_id = ids[-1] if ids else None
+            self._refreshed_at = self._rebuilt_at = time.monotonic()
+        if self.on_change:
+            self.on_change(SUMMARY_TABLE)
+        logger.info(f"Player summary: rebuilt {len(ids)} players in {time.perf_counter() - started:.2f}s")
+
+    def _claim(self, connection, source: str, last_id: int, new_last_id: int) -> bool:
+        # Compare-and-set: a worker that lost the race leaves the batch to the one that won it
+        result = connection.execute(
+            text(f"UPDATE {SUMMARY_WATERMARKS_TABLE} SET last_id = :new WHERE source = :source AND last_id = :old"),
+            {"new": new_last_id, "source": source, "old": last_id}
+        )
+        return result.rowcount == 1
+
+    def _watermark(self, connection, source: str) -> int:
+        return connection.execute(
+            text(f"SELECT last_id FROM {SUMMARY_WATERMARKS_TABLE} WHERE source = :source"), {"source": source}
+        ).scalar() or 0
+
+    def _refresh_players(self) -> int:
+        id_column, name_column = self._players
+        query = text(f"SELECT {id_column} FROM players WHERE {id_column} > :last_id ORDER BY {id_column} LIMIT {BATCH_SIZE}")
+        applied = 0
+        while True:
+            with self.engine.begin() as connection:
+                last_id = self._watermark(connection, "players")
+                ids = [row[0] for row in connection.execute(query, {"last_id": last_id})]
+                if not ids or not self._claim(connection, "players", last_id, ids[-1]):
+                    return applied
+                self._sync_players(connection, ids)
+            applied += len(ids)
+            self._applied["players"] = self._applied.get("players", 0) + len(ids)
+            if len(ids) < BATCH_SIZE:
+                return applied
+
+    def _refresh_source(self, source: _Source) -> int:
+        query = text(source.select())
+        applied = 0
+        while True:
+            with self.engine.begin() as connection:
+                last_id = self._watermark(connection, source.table)
+                rows = connection.execute(query, {"last_id": last_id}).fetchall()
+                if not rows or not self._claim(connection, source.table, last_id, rows[-1][0]):
+                    return applied
+                deltas = self._fold(source.table, [row[1:] for row in rows if row[1] is not None])
+                self._upsert(connection, source.table, deltas)
+                self._sync_players(connection, list(deltas))
+            applied += len(rows)
+            self._applied[source.table] = self._applied.get(source.table, 0) + len(rows)
+            if len(rows) < BATCH_SIZE:
+                return applied
+
+    @staticmethod
+    def _fold(table: str, rows: Iterable[Sequence]) -> Dict[int, Dict[str, Any]]:
+        """Per-player deltas of a batch of (player_id, *role values) rows."""
+        deltas: Dict[int, Dict[str, Any]] = {}
+        for player_id, *values in rows:
+            delta = deltas.setdefault(player_id, {})
+            if table == "purchases":
+                rarity, price = values
+                delta["purchases"] = delta.get("purchases", 0) + 1
+                delta["legendary_purchases"] = delta.get("legendary_purchases", 0) + (str(rarity).lower() == "legendary")
+                delta["total_spent"] = delta.get("total_spent", 0.0) + float(price or 0)
+            elif table == "achievements":
+                (tier,) = values
+                delta["achievements"] = delta.get("achievements", 0) + 1
+                delta["gold_achievements"] = delta.get("gold_achievements", 0) + (str(tier).lower() == "gold")
+            elif table == "matches":
+                result, xp = values
+                delta["matches_played"] = delta.get("matches_played", 0) + 1
+                delta["matches_won"] = delta.get("matches_won", 0) + (str(result).lower() in WIN_RESULTS)
+                delta["xp_gained"] = delta.get("xp_gained", 0) + int(xp or 0)
+            elif table == "leaderboards":
+                season, rank = values
+                # Rows arrive in id order, so a later row for the same season is the newer standing
+                if season is not None and (delta.get("current_season") is None
+                                           or season_key(season) >= season_key(delta["current_season"])):
+                    delta["current_season"], delta["current_rank"] = str(season), rank
+        return deltas
+
+    def _upsert(self, connection, table: str, deltas: Dict[int, Dict[str, Any]]):
+        if not deltas:
+            return
+        if table == "leaderboards":
+            # Seasons compare naturally ("2026-S10" after "2026-S9"), which SQL string comparison cannot do
+            columns = ["current_season", "current_rank"]
+            current = self._current_seasons(connection, list(deltas))
+            updates = [f"{column} = excluded.{column}" for column in columns]
+            rows = [
+                {"player_id": player_id, **delta} for player_id, delta in deltas.items()
+                if delta and (current.get(player_id) is None
+                              or season_key(delta["current_season"]) >= season_key(current[player_id]))
+            ]
+        else:
+            columns = list(next(iter(deltas.values())))
+            updates = [f"{column} = {SUMMARY_TABLE}.{column} + excluded.{column}" for column in columns]
+            rows = [{"player_id": player_id, **delta} for player_id, delta in deltas.items()]
+        if not rows:
+            return
+        now = datetime.utcnow().isoformat()
+        connection.execute(text(
+            f"INSERT INTO {SUMMARY_TABLE} (player_id, {', '.join(columns)}, updated_at) "
+            f"VALUES (:player_id, {', '.join(':' + column for column in columns)}, :updated_at) "
+            f"ON CONFLICT (player_id) DO UPDATE SET {', '.join(updates)}, updated_at = excluded.updated_at"
+        ), [{**row, "updated_at": now} for row in rows])
+
+    @staticmethod
+    def _current_seasons(connection, ids: List[int]) -> Dict[int, Optional[str]]:
+        query = text(f"SELECT player_id, current_season FROM {SUMMARY_TABLE} WHERE player_id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+        current = {}
+        for start in range(0, len(ids), 500):
+            current.update(connection.execute(query, {"ids": ids[start:start + 500]}).fetchall())
+        return current
+
+    def _sync_players(self, connection, ids: List[int]):
+        """Copy the current attributes of these players into their summary rows."""
+        id_column, name_column = self._players
+        selected = [id_column, name_column] + list(self._attributes.values())
+        columns = ["player_id", "username"] + list(self._attributes)
+        query = text(f"SELECT {', '.join(selected)} FROM players WHERE {id_column} IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+        upsert = text(
+            f"INSERT INTO {SUMMARY_TABLE} ({', '.join(columns)}, updated_at) "
+            f"VALUES ({', '.join(':' + column for column in columns)}, :updated_at) "
+            f"ON CONFLICT (player_id) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in columns[1:] + ["updated_at"])
+        )
+        now = datetime.utcnow().isoformat()
+        for start in range(0, len(ids), 500):
+            rows = connection.execute(query, {"ids": ids[start:start + 500]}).fetchall()
+            if rows:
+                connection.execute(upsert, [{**dict(zip(columns, row)), "updated_at": now} for row in rows])
+            for row in rows:
+                if row[1]:
+                    self._ids[str(row[1]).lower()] = row[0]
+
+    def _load_ids(self, connection):
+        # Rows another worker added since the last load; this worker's own are indexed as they are written
+        query = f"SELECT player_id, username FROM {SUMMARY_TABLE}"
+        params = {}
+        if self._last_loaded_id is not None:
+            query += " WHERE player_id > :last_id"
+            params["last_id"] = self._last_loaded_id
+        rows = connection.execute(text(query + " ORDER BY player_id"), params).fetchall()
+        for player_id, username in rows:
+            if username:
+                self._ids[username.lower()] = player_id
+        if rows:
+            self._last_loaded_id = rows[-1][0]
+
+    def player_id(self, username: str) -> Optional[int]:
+        return self._ids.get(username.lower())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"players": len(self._ids), "rows_applied": dict(self._applied)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import create_engine
+
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Refresh the player_summary rollup")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every row instead of folding in new ones")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    summary = PlayerSummary(create_engine(settings.active_db_url))
+    if args.rebuild:
+        summary.rebuild()
+    print(f"player_summary covers {summary.stats()['players']} players")
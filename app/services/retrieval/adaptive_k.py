@@ -0,0 +1,60 @@
+"""
+Adaptive number of context chunks for the QA prompt.
+
+Instead of always stuffing a fixed k chunks into the prompt, retrieval returns
+a candidate window and the context is cut where relevance falls away:
+
+    - below an absolute score floor,
+    - at a drop of more than max_gap from the previous chunk,
+    - or when the next chunk would overflow the prompt token budget.
+
+The first min_k chunks are always kept (budget permitting), so the LLM is
+never left without context when retrieval found something.
+"""
+import functools
+import logging
+from typing import List, Tuple
+
+from langchain.docstore.document import Document
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its tables on first use; without them fall back to an estimate
+        logger.warning(f"tiktoken unavailable ({e}), estimating prompt tokens from length")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def select_context(
+    scored_docs: List[Tuple[Document, float]],
+    min_k: int = 1,
+    max_k: int = 4,
+    min_score: float = 0.0,
+    max_gap: float = 0.1,
+    token_budget: int = 1500
+) -> Tuple[List[Tuple[Document, float]], int]:
+    """Return the chunks to send to the LLM and their token count."""
+    chosen, tokens = [], 0
+    for doc, score in scored_docs[:max_k]:
+        if len(chosen) >= min_k:
+            if score < min_score or chosen[-1][1] - score > max_gap:
+                break
+        doc_tokens = count_tokens(doc.page_content)
+        if chosen and tokens + doc_tokens > token_budget:
+            break
+        chosen.append((doc, score))
+        tokens += doc_tokens
+    return chosen, tokens
@@ -0,0 +1,125 @@
+"""
+Semantic cache of static answers, keyed by query embedding.
+
+Static answers depend only on the knowledge base, so a new query whose
+embedding is within a cosine-similarity threshold of a cached query can reuse
+that query's answer without an LLM call. Exact repeats (after normalising case
+and whitespace) are matched without needing an embedding at all.
+
+Every entry belongs to one knowledge base index version; when the version
+changes the whole cache is dropped.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app.core.metrics import Histogram
+
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0)
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?!. ")
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, version: str = ""):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.version = version
+        self._lock = threading.Lock()
+        self._reset()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.invalidations = 0
+        self.similarity = Histogram(SIMILARITY_BUCKETS)
+
+    def _reset(self):
+        # Exact-text entries in LRU order, plus a ring buffer of query vectors for the semantic lookup
+        self._by_text: "OrderedDict[str, str]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._answers: list = []
+        self._next_slot = 0
+
+    def __len__(self) -> int:
+        return len(self._by_text)
+
+    def set_version(self, version: str):
+        """Drop every entry if the knowledge base index version changed."""
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._reset()
+                self.invalidations += 1
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Return the cached answer for an exact (normalised) repeat of the query, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            self.lookups += 1
+            answer = self._by_text.get(key)
+            if answer is not None:
+                self._by_text.move_to_end(key)
+                self.exact_hits += 1
+            return answer
+
+    def lookup_similar(self, vector: Sequence[float]) -> Optional[str]:
+        """
+        Return the answer of the most similar cached query if it clears the threshold, or None.
+
+        Meant as the second step after a lookup() miss, so it does not count as another lookup.
+        """
+        with self._lock:
+            if self._vectors is None or not self._answers:
+                return None
+            scores = self._vectors[:len(self._answers)] @ _unit(vector)
+            best = int(np.argmax(scores))
+            self.similarity.observe(float(scores[best]))
+            if scores[best] >= self.threshold:
+                self.semantic_hits += 1
+                return self._answers[best]
+        return None
+
+    def store(self, query: str, answer: str, vector: Optional[Sequence[float]] = None):
+        key = normalize_query(query)
+        with self._lock:
+            self._by_text[key] = answer
+            self._by_text.move_to_end(key)
+            while len(self._by_text) > self.max_entries:
+                self._by_text.popitem(last=False)
+
+            if vector is None:
+                return
+            query_vector = _unit(vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(query_vector)), dtype=np.float32)
+            slot = self._next_slot
+            self._vectors[slot] = query_vector
+            if slot < len(self._answers):
+                self._answers[slot] = answer
+            else:
+                self._answers.append(answer)
+            self._next_slot = (slot + 1) % self.max_entries
+
+    def stats(self) -> Dict:
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "version": self.version,
+            "entries": len(self._by_text),
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": round(hits / self.lookups, 4) if self.lookups else None,
+            "invalidations": self.invalidations,
+            "best_similarity": self.similarity.snapshot(),
+        }
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
@@ -0,0 +1,129 @@
+"""
+Compact in-memory inverted index with BM25 scoring for the knowledge base.
+
+Lexical lookup needs no embedding call, so exact-term questions such as
+"XP boosters" or "teleport scrolls" can be answered from this index alone
+when its top hit is decisive. Results can also be fused with vector search
+via reciprocal-rank fusion.
+"""
+import math
+import re
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset({
+    "a", "about", "an", "and", "are", "as", "at", "be", "but", "by", "can", "could",
+    "do", "does", "explain", "for", "from", "get", "give", "has", "have", "how", "i",
+    "if", "in", "is", "it", "its", "me", "my", "of", "on", "or", "please", "show", "so",
+    "tell", "that", "the", "their", "there", "these", "they", "this", "those", "to",
+    "was", "what", "when", "where", "which", "who", "why", "will", "with", "would",
+    "you", "your",
+})
+
+
+def _stem(token: str) -> str:
+    """Very light plural stemming so 'boosters' matches 'booster'."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem."""
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts, addressed by their position."""
+
+    def __init__(self, texts: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = array("I")
+        # term -> parallel arrays of document ids and term frequencies
+        self.postings: Dict[str, Tuple[array, array]] = {}
+
+        for doc_id, text in enumerate(texts):
+            counts: Dict[str, int] = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                doc_ids, tfs = self.postings.setdefault(term, (array("I"), array("I")))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        self.doc_count = len(self.doc_lengths)
+        self.avg_doc_length = (sum(self.doc_lengths) / self.doc_count) if self.doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (self.doc_count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for term, (doc_ids, _) in self.postings.items()
+        }
+        self.max_idf = max(self.idf.values(), default=0.0)
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Return up to k (doc_id, score) pairs, best first.
+
+        Scores are normalised to [0, 1] by the sum of the query terms' IDFs, so
+        they measure how much of the query's information a document covers.
+        Query terms missing from the vocabulary count at the maximum IDF,
+        which keeps the score low when the query uses words the index has
+        never seen.
+        """
+        terms = tokenize(query)
+        if not terms or not self.doc_count:
+            return []
+
+        scores: Dict[int, float] = {}
+        bound = 0.0
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                bound += self.max_idf
+                continue
+            bound += idf
+            doc_ids, tfs = self.postings[term]
+            for doc_id, tf in zip(doc_ids, tfs):
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+        if not scores or bound <= 0:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(doc_id, min(1.0, score / bound)) for doc_id, score in ranked]
+
+
+def is_decisive(hits: Sequence[Tuple[object, float]], min_score: float, min_margin: float) -> bool:
+    """True when the top lexical hit is strong and clearly ahead of the runner-up."""
+    if not hits or hits[0][1] < min_score:
+        return False
+    if len(hits) == 1:
+        return True
+    runner_up = hits[1][1]
+    return runner_up <= 0 or hits[0][1] / runner_up >= min_margin
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = 60, normalize: bool = False
+) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked lists of keys; each list contributes 1 / (k + rank).
+
+    With normalize, scores are divided by the best possible one (first in
+    every list), so they fall in [0, 1]: a key first in both of two lists
+    scores 1, a key found by only one of them at most 0.5.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    best = len(rankings) / (k + 1) if normalize and rankings else 1.0
+    return sorted(((key, score / best) for key, score in fused.items()), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,262 @@
+"""
+Streaming ingestion of knowledge documents into the mmap vector store.
+
+Files (a single file or a directory tree of Markdown, text, JSON and JSON
+Lines documents) are read line by line and passed through a pluggable
+chunker:
+
+    bullet    one chunk per "- " / "* " bullet line (the original knowledge base format)
+    heading   one chunk per Markdown section, split at paragraphs when too long
+    window    fixed-size character windows with overlap, broken at whitespace
+    auto      heading for Markdown, bullet for text, window for JSON articles
+
+Chunks carry their source, section and character offsets as metadata. They
+are embedded in parallel batches and streamed straight into an
+MmapStoreWriter, so neither the corpus nor its vectors are ever held in
+memory at once.
+"""
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.retrieval.mmap_store import MmapStoreWriter
+
+logger = logging.getLogger("uvicorn.error")
+
+SUPPORTED_SUFFIXES = (".md", ".markdown", ".txt", ".json", ".jsonl")
+AUTO_CHUNKERS = {".md": "heading", ".markdown": "heading", ".txt": "bullet", ".json": "window", ".jsonl": "window"}
+JSON_TEXT_FIELDS = ("body", "content", "text", "answer")
+
+# A stream of (line, character offset of the line within its source)
+Lines = Iterable[Tuple[str, int]]
+
+
+@dataclass
+class Chunk:
+    text: str
+    metadata: Dict = field(default_factory=dict)
+
+
+def _chunk(text: str, source: str, section: Optional[str], start: int, end: int, chunker: str) -> Chunk:
+    return Chunk(text=text, metadata={
+        "source": source,
+        "section": section,
+        "start": start,
+        "end": end,
+        "chunker": chunker,
+    })
+
+
+def _heading(line: str) -> Optional[str]:
+    stripped = line.strip()
+    if stripped.startswith("#"):
+        return stripped.lstrip("#").strip() or None
+    return None
+
+
+def bullet_chunks(lines: Lines, source: str, **_) -> Iterator[Chunk]:
+    section = None
+    for line, offset in lines:
+        stripped = line.strip()
+        heading = _heading(line)
+        if heading:
+            section = heading
+        elif stripped.startswith("- ") or stripped.startswith("* "):
+            start = offset + line.index(stripped[0])
+            yield _chunk(stripped, source, section, start, start + len(stripped), "bullet")
+
+
+def heading_chunks(lines: Lines, source: str, chunk_size: int = 800, **_) -> Iterator[Chunk]:
+    section, parts, start, end = None, [], None, 0
+
+    def flush():
+        text = "\n".join(parts).strip()
+        if text:
+            body = f"{section}: {text}" if section else text
+            return _chunk(body, source, section, start, end, "heading")
+        return None
+
+    for line, offset in lines:
+        heading = _heading(line)
+        # A new section, or a paragraph break once the current chunk is full, closes the chunk
+        if heading or (not line.strip() and sum(len(p) for p in parts) >= chunk_size):
+            chunk = flush()
+            if chunk:
+                yield chunk
+            parts, start = [], None
+            if heading:
+                section = heading
+            continue
+        if line.strip():
+            if start is None:
+                start = offset
+            parts.append(line.rstrip("\n"))
+            end = offset + len(line.rstrip("\n"))
+    chunk = flush()
+    if chunk:
+        yield chunk
+
+
+def window_chunks(lines: Lines, source: str, chunk_size: int = 800, chunk_overlap: int = 120, **_) -> Iterator[Chunk]:
+    section = None
+    buffer, buffer_start = "", 0
+    step = max(1, chunk_size - chunk_overlap)
+
+    def tail():
+        text = " ".join(buffer.split())
+        return _chunk(text, source, section, buffer_start, buffer_start + len(buffer), "window") if text else None
+
+    for line, offset in lines:
+        heading = _heading(line)
+        if heading:
+            # Windows never cross a section boundary
+            chunk = tail()
+            if chunk:
+                yield chunk
+            section, buffer = heading, ""
+            continue
+        if not buffer:
+            buffer_start = offset
+        buffer += line
+        while len(buffer) >= chunk_size:
+            # Break the window at the last whitespace so words stay whole
+            cut = buffer.rfind(" ", step, chunk_size)
+            cut = cut if cut > 0 else chunk_size
+            text = " ".join(buffer[:cut].split())
+            if text:
+                yield _chunk(text, source, section, buffer_start, buffer_start + cut, "window")
+            advance = max(1, cut - chunk_overlap)
+            buffer, buffer_start = buffer[advance:], buffer_start + advance
+    chunk = tail()
+    if chunk:
+        yield chunk
+
+
+CHUNKERS: Dict[str, Callable[..., Iterator[Chunk]]] = {
+    "bullet": bullet_chunks,
+    "heading": heading_chunks,
+    "window": window_chunks,
+}
+
+
+def iter_source_files(path: str) -> Iterator[Path]:
+    root = Path(path)
+    if root.is_file():
+        yield root
+        return
+    for file in sorted(root.rglob("*")):
+        if file.is_file() and file.suffix.lower() in SUPPORTED_SUFFIXES:
+            yield file
+
+
+def _file_lines(file: Path) -> Iterator[Tuple[str, int]]:
+    offset = 0
+    with open(file, encoding="utf-8") as f:
+        for line in f:
+            yield line, offset
+            offset += len(line)
+
+
+def _article_lines(article: Dict) -> Iterator[Tuple[str, int]]:
+    title = article.get("title")
+    if title:
+        yield f"# {title}\n", 0
+    body = next((article[name] for name in JSON_TEXT_FIELDS if isinstance(article.get(name), str)), "")
+    offset = 0
+    for line in body.splitlines(keepends=True):
+        yield line, offset
+        offset += len(line)
+
+
+def _iter_articles(file: Path) -> Iterator[Tuple[str, Dict]]:
+    """Yield (source, article) pairs; JSON Lines are streamed, a .json file holds one article or a list."""
+    if file.suffix.lower() == ".jsonl":
+        with open(file, encoding="utf-8") as f:
+            for number, line in enumerate(f):
+                if line.strip():
+                    article = json.loads(line)
+                    yield f"{file}#{article.get('id', number)}", article
+        return
+    with open(file, encoding="utf-8") as f:
+        data = json.load(f)
+    for number, article in enumerate(data if isinstance(data, list) else [data]):
+        yield f"{file}#{article.get('id', number)}", article
+
+
+def iter_chunks(path: str, chunker: str = "bullet", chunk_size: int = 800, chunk_overlap: int = 120) -> Iterator[Chunk]:
+    """Stream chunks from every supported file under path, one file at a time."""
+    if chunker != "auto" and chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{chunker}', expected auto or one of {sorted(CHUNKERS)}")
+    for file in iter_source_files(path):
+        suffix = file.suffix.lower()
+        chunk_fn = CHUNKERS[AUTO_CHUNKERS.get(suffix, "window") if chunker == "auto" else chunker]
+        options = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+        if suffix in (".json", ".jsonl"):
+            for source, article in _iter_articles(file):
+                yield from chunk_fn(_article_lines(article), source, **options)
+        else:
+            yield from chunk_fn(_file_lines(file), str(file), **options)
+
+
+def _batches(chunks: Iterable[Chunk], size: int) -> Iterator[List[Chunk]]:
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_in_batches(
+    chunks: Iterable[Chunk],
+    embeddings: Embeddings,
+    batch_size: int = 64,
+    workers: int = 4
+) -> Iterator[Tuple[List[Chunk], List[List[float]]]]:
+    """
+    Embed chunks in parallel batches, yielding (batch, vectors) in input order.
+
+    At most 2 x workers batches are in flight, so memory stays bounded however
+    long the chunk stream is.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        for batch in _batches(chunks, batch_size):
+            pending.append((batch, pool.submit(embeddings.embed_documents, [chunk.text for chunk in batch])))
+            if len(pending) >= 2 * max(1, workers):
+                done, future = pending.popleft()
+                yield done, future.result()
+        while pending:
+            done, future = pending.popleft()
+            yield done, future.result()
+
+
+def ingest(
+    path: str,
+    store_path: str,
+    embeddings: Embeddings,
+    chunker: str = "bullet",
+    chunk_size: int = 800,
+    chunk_overlap: int = 120,
+    batch_size: int = 64,
+    workers: int = 4
+) -> dict:
+    """Chunk, embed and write every document under path into a new mmap store; returns its manifest."""
+    writer = MmapStoreWriter(store_path)
+    chunks = iter_chunks(path, chunker, chunk_size, chunk_overlap)
+    try:
+        for batch, vectors in embed_in_batches(chunks, embeddings, batch_size, workers):
+            writer.add([chunk.text for chunk in batch], vectors, [chunk.metadata for chunk in batch])
+            logger.info(f"Indexed {writer.count} chunks from {path}")
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
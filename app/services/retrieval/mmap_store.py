@@ -0,0 +1,308 @@
+"""
+Pickle-free, memory-mapped vector store for the knowledge base.
+
+On-disk layout (one directory):
+
+    manifest.json  format version, vector dimension, chunk count and content hash
+    vectors.f32    raw little-endian float32 matrix (count x dim), L2-normalised
+    quantized/     compressed indexes derived from vectors.f32 (see quantization.py)
+    shards.json    optional topic shard layout: contiguous row ranges (see sharding.py)
+    docs.bin       UTF-8 JSON records {"page_content": ..., "metadata": ...} back to back
+    docs.idx       little-endian uint64 offsets (count + 1) into docs.bin
+
+Every file is opened read-only with mmap, so several uvicorn workers share one
+copy through the page cache and loading is a manifest read rather than a
+deserialisation pass.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from app.services.retrieval.quantization import QUANTIZED_DIR, IndexParams, build_searcher
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+DOCS_FILE = "docs.bin"
+OFFSETS_FILE = "docs.idx"
+SHARDS_FILE = "shards.json"
+SHARD_CENTROIDS_FILE = "shard_centroids.f32"
+
+
+class DocumentTable:
+    """Read-only, offset-indexed table of documents backed by mmap."""
+
+    def __init__(self, docs_path: Path, offsets_path: Path, count: int):
+        self.count = count
+        self.offsets = np.memmap(offsets_path, dtype="<u8", mode="r", shape=(count + 1,))
+        self._file = open(docs_path, "rb")
+        # mmap refuses empty files; an empty table never needs the buffer
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if count else b""
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Document:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        record = json.loads(self._buffer[start:end].decode("utf-8"))
+        return Document(page_content=record["page_content"], metadata=record.get("metadata") or {})
+
+    def __iter__(self) -> Iterator[Document]:
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        """Release the file handle and mappings; the table is unusable afterwards."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+        # numpy unmaps a memmap once the last reference to it goes
+        self.offsets = None
+
+
+class MmapStoreWriter:
+    """
+    Streams chunks and their vectors into a new store directory.
+
+    Files are written to a sibling temporary directory and moved into place
+    on close(), manifest last, so a store is only visible once complete.
+    Each writer gets its own temporary directory, and moving files into place
+    holds an exclusive lock on <path>.lock, so workers rebuilding the same
+    store at once never interleave their files.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = Path(tempfile.mkdtemp(prefix=f"{self.path.name}.", suffix=".tmp", dir=self.path.parent))
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.offset = 0
+        self.digest = hashlib.sha256()
+        self._vectors = open(self.tmp_path / VECTORS_FILE, "wb")
+        self._docs = open(self.tmp_path / DOCS_FILE, "wb")
+        self._offsets = open(self.tmp_path / OFFSETS_FILE, "wb")
+        self._offsets.write(np.array([0], dtype="<u8").tobytes())
+
+    def add(self, texts: Sequence[str], vectors: Sequence[Sequence[float]], metadatas: Optional[Sequence[dict]] = None):
+        matrix = np.asarray(vectors, dtype="<f4")
+        if matrix.ndim != 2 or len(matrix) != len(texts):
+            raise ValueError(f"Expected {len(texts)} vectors, got array of shape {matrix.shape}")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension changed from {self.dim} to {matrix.shape[1]}")
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        self._vectors.write(matrix.astype("<f4").tobytes())
+
+        offsets = []
+        for i, text in enumerate(texts):
+            metadata = metadatas[i] if metadatas else {}
+            record = json.dumps({"page_content": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8")
+            self._docs.write(record)
+            self.offset += len(record)
+            offsets.append(self.offset)
+            self.digest.update(record)
+        self._offsets.write(np.array(offsets, dtype="<u8").tobytes())
+        self.count += len(texts)
+
+    def close(self) -> dict:
+        for handle in (self._vectors, self._docs, self._offsets):
+            handle.close()
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "dim": self.dim or 0,
+            "count": self.count,
+            "version": self.digest.hexdigest()[:16],
+        }
+        with open(self.tmp_path / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Keep unrelated files (e.g. a legacy FAISS index) that live in the target directory;
+        # the manifest goes last so a reader never pairs it with stale data files
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Anything derived from the previous rows is stale now
+            shutil.rmtree(self.path / QUANTIZED_DIR, ignore_errors=True)
+            for derived in (SHARDS_FILE, SHARD_CENTROIDS_FILE):
+                (self.path / derived).unlink(missing_ok=True)
+            for name in sorted(os.listdir(self.tmp_path), key=lambda name: name == MANIFEST_FILE):
+                os.replace(self.tmp_path / name, self.path / name)
+        self.tmp_path.rmdir()
+        return manifest
+
+    def abort(self):
+        """Discard everything written so far, leaving the target directory untouched."""
+        for handle in (self._vectors, self._docs, self._offsets):
+            handle.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class MmapVectorStore(VectorStore):
+    """Cosine-similarity search over a memory-mapped vector matrix or a compressed index built from it."""
+
+    def __init__(
+        self,
+        path: str,
+        embedding: Embeddings,
+        index_type: str = "flat",
+        index_params: Optional[IndexParams] = None,
+        sharded: bool = False
+    ):
+        self.path = Path(path)
+        self.embedding = embedding
+        with open(self.path / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format: {self.manifest.get('format_version')}")
+
+        count, dim = self.manifest["count"], self.manifest["dim"]
+        self.vectors = (
+            np.memmap(self.path / VECTORS_FILE, dtype="<f4", mode="r", shape=(count, dim))
+            if count else np.zeros((0, dim), dtype="<f4")
+        )
+        self.documents = DocumentTable(self.path / DOCS_FILE, self.path / OFFSETS_FILE, count)
+        self.index_type = index_type
+        params = index_params or IndexParams()
+
+        # A sharded store searches per-shard structures over contiguous row ranges instead of one global one
+        self.shards: Dict[str, Tuple[int, int]] = {}
+        self.shard_searchers = {}
+        self.shard_centroids: Optional[np.ndarray] = None
+        if sharded and (self.path / SHARDS_FILE).exists():
+            with open(self.path / SHARDS_FILE) as f:
+                layout = json.load(f)
+            self.shards = {name: tuple(bounds) for name, bounds in layout["shards"].items()}
+            self.shard_searchers = {
+                name: build_searcher(self.path, self.vectors[start:end], index_type, params, prefix=f"shard-{name}-")
+                for name, (start, end) in self.shards.items()
+            }
+            self.shard_centroids = np.fromfile(self.path / SHARD_CENTROIDS_FILE, dtype="<f4").reshape(len(self.shards), dim)
+            self.searcher = None
+        else:
+            self.searcher = build_searcher(self.path, self.vectors, index_type, params)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return (Path(path) / MANIFEST_FILE).exists()
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding: Embeddings,
+        index_type: str = "flat",
+        index_params: Optional[IndexParams] = None,
+        sharded: bool = False
+    ) -> "MmapVectorStore":
+        return cls(path, embedding, index_type, index_params, sharded)
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[dict]] = None
+    ) -> dict:
+        writer = MmapStoreWriter(path)
+        try:
+            if texts:
+                writer.add(texts, vectors, metadatas)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any
+    ) -> "MmapVectorStore":
+        if path is None:
+            raise ValueError("MmapVectorStore.from_texts requires a target path")
+        cls.write(path, texts, embedding.embed_documents(list(texts)), metadatas)
+        return cls.load(path, embedding)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def version(self) -> str:
+        """Content hash of the indexed chunks; changes whenever the knowledge base does."""
+        return self.manifest["version"]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def close(self):
+        """Release the store's files, e.g. once a rebuilt store has replaced it."""
+        self.documents.close()
+        self.vectors = self.searcher = self.shard_centroids = None
+        self.shard_searchers = {}
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only; rebuild it with MmapStoreWriter")
+
+    def _select_relevance_score_fn(self):
+        # Vectors are normalised, so the raw score is already a cosine similarity
+        return lambda score: score
+
+    def search_vectors(self, vector: Sequence[float], k: int, shards: Optional[Sequence[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Return up to k (row, cosine) pairs for a query vector, best first.
+
+        On a sharded store only the named shards are searched; None searches all of them.
+        """
+        if not len(self) or k <= 0:
+            return []
+        query = np.asarray(vector, dtype="<f4")
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        if not self.shards:
+            return self.searcher.search(query, k)
+
+        hits = []
+        for name in (shards if shards is not None else self.shards):
+            start, _ = self.shards[name]
+            hits.extend((start + row, score) for row, score in self.shard_searchers[name].search(query, k))
+        return sorted(hits, key=lambda hit: hit[1], reverse=True)[:k]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        hits = self.search_vectors(embedding, k, shards=kwargs.get("shards"))
+        return [(self.documents[i], score) for i, score in hits]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score(query, k, **kwargs)
@@ -0,0 +1,219 @@
+"""
+Compressed search structures derived from the float32 vectors of an mmap store.
+
+The float32 matrix stays on disk as the source of truth; the selected index
+type is built from it once and cached under ``quantized/`` in the store
+directory, so switching VECTOR_INDEX_TYPE never needs a re-embedding pass.
+
+    flat      exact float32 (4 bytes per dimension)
+    float16   exact-ish half precision (2 bytes per dimension)
+    int8      per-dimension symmetric scalar quantisation (1 byte per dimension)
+    pq        FAISS product quantisation (pq_m bytes per vector at 8 bits)
+    ivf_pq    PQ codes in an inverted file, searching ivf_nprobe of ivf_nlist lists
+    hnsw_pq   PQ codes navigated through an HNSW graph
+"""
+import logging
+import math
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn.error")
+
+INDEX_TYPES = ("flat", "float16", "int8", "pq", "ivf_pq", "hnsw_pq")
+QUANTIZED_DIR = "quantized"
+# Rows per block when decoding compressed vectors, bounding temporary memory
+BLOCK_ROWS = 65536
+
+
+@dataclass
+class IndexParams:
+    pq_m: int = 64
+    pq_nbits: int = 8
+    ivf_nlist: int = 256
+    ivf_nprobe: int = 16
+    hnsw_m: int = 32
+    hnsw_ef_search: int = 64
+
+
+def _top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(i), float(scores[i])) for i in top]
+
+
+class FlatSearcher:
+    """Exact inner product over normalised float32 vectors."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        return _top_k(self.vectors @ query, k)
+
+
+class Float16Searcher(FlatSearcher):
+    """Half-precision vectors, widened block by block at search time."""
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return _top_k(scores, k)
+
+
+class Int8Searcher:
+    """Int8 codes with one scale per dimension; the scales are folded into the query."""
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        scaled_query = (query * self.scales).astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ scaled_query
+        return _top_k(scores, k)
+
+
+class FaissSearcher:
+    """A FAISS L2 index over normalised vectors, reporting cosine similarity."""
+
+    def __init__(self, index):
+        self.index = index
+
+    @property
+    def nbytes(self) -> int:
+        import faiss
+        return int(faiss.serialize_index(self.index).nbytes)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        distances, rows = self.index.search(query.reshape(1, -1).astype(np.float32), k)
+        # For unit vectors ||a - b||^2 = 2 - 2cos(a, b)
+        return [(int(row), float(1 - dist / 2)) for row, dist in zip(rows[0], distances[0]) if row != -1]
+
+
+def _signature(index_type: str, params: IndexParams, count: int, dim: int) -> str:
+    if index_type == "pq":
+        m, nbits = _pq_shape(params, count, dim)
+        return f"pq-m{m}-b{nbits}"
+    if index_type == "ivf_pq":
+        m, nbits = _pq_shape(params, count, dim)
+        return f"ivf_pq-m{m}-b{nbits}-n{_nlist(params, count)}"
+    if index_type == "hnsw_pq":
+        m, nbits = _pq_shape(params, count, dim)
+        return f"hnsw_pq-m{m}-b{nbits}-h{params.hnsw_m}"
+    return index_type
+
+
+def _pq_shape(params: IndexParams, count: int, dim: int) -> Tuple[int, int]:
+    """Largest sub-quantiser count dividing dim, and a code size the corpus can train."""
+    m = max(divisor for divisor in range(1, min(params.pq_m, dim) + 1) if dim % divisor == 0)
+    # k-means wants about 39 training points per centroid, and there are 2^nbits centroids
+    nbits = max(1, min(params.pq_nbits, int(math.log2(max(count // 39, 2)))))
+    return m, nbits
+
+
+def _nlist(params: IndexParams, count: int) -> int:
+    # FAISS wants roughly 39 training points per inverted list
+    return max(1, min(params.ivf_nlist, count // 39))
+
+
+def _build_faiss(index_type: str, vectors: np.ndarray, params: IndexParams):
+    import faiss
+
+    count, dim = vectors.shape
+    m, nbits = _pq_shape(params, count, dim)
+    if index_type == "pq":
+        index = faiss.IndexPQ(dim, m, nbits)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, _nlist(params, count), m, nbits)
+    else:
+        index = faiss.IndexHNSWPQ(dim, m, params.hnsw_m, nbits)
+    training = np.ascontiguousarray(vectors, dtype=np.float32)
+    index.train(training)
+    index.add(training)
+    return index
+
+
+def build_searcher(store_path: Path, vectors: np.ndarray, index_type: str, params: IndexParams, prefix: str = ""):
+    """
+    Return a searcher for index_type, building and caching its artifact on first use.
+
+    prefix keeps the artifacts of several row ranges (e.g. topic shards) apart.
+
+    Numpy-backed artifacts are memory-mapped like the float32 matrix. FAISS
+    indexes are mapped too when the installed FAISS supports it for that type.
+    """
+    index_type = index_type.lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{index_type}', expected one of {INDEX_TYPES}")
+    if index_type == "flat" or not len(vectors):
+        return FlatSearcher(vectors)
+
+    count, dim = vectors.shape
+    artifact_dir = store_path / QUANTIZED_DIR
+    artifact_dir.mkdir(exist_ok=True)
+    artifact = artifact_dir / (prefix + _signature(index_type, params, count, dim))
+
+    if index_type == "float16":
+        path = artifact.with_suffix(".f16")
+        if not path.exists():
+            _write_blocks(path, vectors, lambda block: block.astype("<f2"))
+        return Float16Searcher(np.memmap(path, dtype="<f2", mode="r", shape=(count, dim)))
+
+    if index_type == "int8":
+        path, scales_path = artifact.with_suffix(".i8"), artifact.with_suffix(".scales")
+        if not path.exists():
+            peak = np.zeros(dim, dtype=np.float32)
+            for start in range(0, count, BLOCK_ROWS):
+                peak = np.maximum(peak, np.abs(vectors[start:start + BLOCK_ROWS]).max(axis=0))
+            scales = np.where(peak == 0, 1, peak / 127).astype("<f4")
+            # Written before the codes, so whoever sees the codes also finds complete scales
+            _write_blocks(scales_path, scales.reshape(1, -1), lambda block: block)
+            _write_blocks(path, vectors, lambda block: np.clip(np.rint(block / scales), -127, 127).astype("i1"))
+        scales = np.fromfile(scales_path, dtype="<f4")
+        return Int8Searcher(np.memmap(path, dtype="i1", mode="r", shape=(count, dim)), scales)
+
+    import faiss
+    path = artifact.with_suffix(".faiss")
+    if not path.exists():
+        logger.info(f"Training {index_type} index over {count} vectors")
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        faiss.write_index(_build_faiss(index_type, vectors, params), str(tmp_path))
+        tmp_path.replace(path)
+    try:
+        index = faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        index = faiss.read_index(str(path))
+    if index_type == "ivf_pq":
+        index.nprobe = params.ivf_nprobe
+    elif index_type == "hnsw_pq":
+        index.hnsw.efSearch = params.hnsw_ef_search
+    return FaissSearcher(index)
+
+
+def _write_blocks(path: Path, vectors: np.ndarray, encode) -> None:
+    # Workers may build the same artifact concurrently; each writes its own temp file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            f.write(encode(np.asarray(vectors[start:start + BLOCK_ROWS])).tobytes())
+    tmp_path.replace(path)
@@ -0,0 +1,140 @@
+"""
+Local, LLM-free rewriting of follow-up questions using recent conversation turns.
+
+A follow-up such as "Are they difficult to obtain?" retrieves nothing useful
+on its own. Instead of a condense-question LLM call, the rewriter carries the
+most recent entity forward from the conversation history:
+
+    - knowledge base phrases: adjacent word pairs that also occur in the
+      corpus, such as "legendary items" or "XP boosters",
+    - names: player or clan identifiers such as DragonSlayer99 or FireMages.
+
+Pronouns are replaced with the entity ("they" -> "legendary items", "his" ->
+"DragonSlayer99's"), except for an expletive "it" that refers to nothing
+("Is it possible to...", "it's worth...") and a pronoun whose number does
+not match the phrase ("Is it rare?" after "legendary items"). A very short question that uses no corpus term at all
+("How rare?") gets the entity appended. Questions that already name an
+entity are left alone.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.services.retrieval.bm25 import tokenize
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9']+")
+# CamelCase or letters-then-digits identifiers: DragonSlayer99, IceWarden, FireMages
+NAME_PATTERN = re.compile(r"\b(?:[A-Z][a-z]+(?:[A-Z][a-z0-9]*)+|[A-Za-z]+\d+)\b")
+
+THING_PRONOUNS = {"they", "them", "it", "those", "these"}
+THING_POSSESSIVES = {"their", "its"}
+PERSON_PRONOUNS = {"he", "she", "him"}
+PERSON_POSSESSIVES = {"his", "her"}
+PRONOUNS = THING_PRONOUNS | THING_POSSESSIVES | PERSON_PRONOUNS | PERSON_POSSESSIVES
+SINGULAR_PRONOUNS = {"it", "its"}
+# "it" followed by these (possibly after is/'s/was/be) is a dummy subject, as in "Is it possible to trade them?"
+EXPLETIVE_CONTINUATION = (
+    r"(?:'s|\s+(?:is|was|be|ever|really|still))*\s+(?:possible|impossible|ok|okay|true|false|worth|necessary"
+    r"|allowed|safe|better|best|hard|harder|easy|easier|likely|normal|fine|required|free|seems?|looks?|appears?"
+    r"|matters?|takes?)\b"
+)
+PRONOUN_PATTERN = re.compile(
+    r"\b(?:(?:" + "|".join(sorted(PRONOUNS - {"it"})) + r")\b|it\b(?!" + EXPLETIVE_CONTINUATION + "))",
+    re.IGNORECASE,
+)
+
+# Questions this short that name nothing are assumed to continue the previous topic
+MAX_ELLIPTICAL_TERMS = 2
+HISTORY_TURNS = 6
+
+
+def _stems(words: Sequence[str]) -> List[Optional[str]]:
+    """One stem per word, None for stopwords, keeping positions aligned with words."""
+    stems = []
+    for word in words:
+        tokens = tokenize(word)
+        stems.append(tokens[0] if tokens else None)
+    return stems
+
+
+def _plural(phrase: str) -> bool:
+    last = phrase.split()[-1].lower()
+    return last.endswith("s") and not last.endswith("ss")
+
+
+class QueryRewriter:
+    def __init__(self, texts: Iterable[str]):
+        # Adjacent content-word pairs of the corpus; a pair seen in a question marks a topic phrase
+        self.phrases: Set[Tuple[str, str]] = set()
+        self.vocabulary: Set[str] = set()
+        for text in texts:
+            stems = _stems(WORD_PATTERN.findall(text))
+            self.vocabulary.update(stem for stem in stems if stem)
+            self.phrases.update(
+                (left, right) for left, right in zip(stems, stems[1:]) if left and right
+            )
+
+    def phrases_in(self, text: str) -> List[str]:
+        """Corpus phrases in text, in their original spelling, in order of appearance."""
+        words = WORD_PATTERN.findall(text)
+        stems = _stems(words)
+        return [
+            f"{words[i]} {words[i + 1]}"
+            for i in range(len(words) - 1)
+            if stems[i] and stems[i + 1] and (stems[i], stems[i + 1]) in self.phrases
+        ]
+
+    @staticmethod
+    def names_in(text: str) -> List[str]:
+        return NAME_PATTERN.findall(text)
+
+    def _recent_entities(self, history: Sequence[Dict]) -> Tuple[Optional[str], Optional[str]]:
+        """The newest (phrase, name) mentioned in the last few turns."""
+        phrase, name = None, None
+        for message in reversed(list(history)[-HISTORY_TURNS:]):
+            content = message.get("content") or ""
+            if name is None:
+                names = self.names_in(content)
+                name = names[-1] if names else None
+            # Assistant answers mention many topics, so phrases are only taken from the user's turns
+            if phrase is None and message.get("type") == "user":
+                phrases = self.phrases_in(content)
+                phrase = phrases[-1] if phrases else None
+            if phrase and name:
+                break
+        return phrase, name
+
+    def rewrite(self, query: str, history: Optional[Sequence[Dict]]) -> str:
+        """Return query with references to earlier turns resolved, or query itself."""
+        if not history:
+            return query
+        pronouns = {match.group(0).lower() for match in PRONOUN_PATTERN.finditer(query)}
+        has_entity = bool(self.phrases_in(query) or self.names_in(query))
+        terms = tokenize(query)
+        elliptical = not has_entity and len(terms) <= MAX_ELLIPTICAL_TERMS and not self.vocabulary.intersection(terms)
+        if not pronouns and not elliptical:
+            return query
+        if has_entity and not pronouns & (PERSON_PRONOUNS | PERSON_POSSESSIVES):
+            return query
+
+        phrase, name = self._recent_entities(history)
+        if not phrase and not name:
+            return query
+
+        if not pronouns:
+            return f"{query.rstrip()} ({phrase or name})"
+
+        def replace(match: re.Match) -> str:
+            word = match.group(0)
+            lower = word.lower()
+            entity = name if lower in PERSON_PRONOUNS | PERSON_POSSESSIVES else (phrase or name)
+            if entity is None:
+                return word
+            # "Is legendary items rare?" breaks the verb; names are exempt, as a clan is "it" or "they"
+            thing = lower in THING_PRONOUNS | THING_POSSESSIVES
+            if thing and entity == phrase and (lower in SINGULAR_PRONOUNS) == _plural(phrase):
+                return word
+            if lower in PERSON_POSSESSIVES | THING_POSSESSIVES:
+                entity += "'" if entity.endswith("s") else "'s"
+            return entity[:1].upper() + entity[1:] if word[:1].isupper() else entity
+
+        return PRONOUN_PATTERN.sub(replace, query)
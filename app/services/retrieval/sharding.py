@@ -0,0 +1,175 @@
+"""
+Topic shards for the mmap vector store and a cheap router over them.
+
+build_shards() rewrites a store so that the chunks of each topic occupy one
+contiguous row range, records the ranges in shards.json and stores one mean
+vector (centroid) per shard. A sharded MmapVectorStore then keeps one search
+structure per shard, so a query routed to one topic only scores that topic's
+rows. A chunk with keywords of more than one topic goes to the general
+shard, which is searched alongside every routed topic, so a query routed to
+any of its topics still reaches it.
+
+ShardRouter picks shards from the query alone: topic keywords first, then
+the query embedding against the shard centroids. When neither is clearly
+pointing at a topic it returns None and every shard is searched, which is
+exactly the unsharded result.
+"""
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.retrieval.bm25 import tokenize
+from app.services.retrieval.mmap_store import (
+    SHARD_CENTROIDS_FILE,
+    SHARDS_FILE,
+    MmapStoreWriter,
+    MmapVectorStore,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+GENERAL_SHARD = "general"
+
+DEFAULT_SHARD_TOPICS: Dict[str, List[str]] = {
+    "clans": ["clan", "guild", "member", "leader", "magic", "pvp", "physical", "balanced"],
+    "items": ["item", "legendary", "epic", "rare", "common", "booster", "scroll", "consumable", "inventory", "stat"],
+    "achievements": ["achievement", "bronze", "silver", "gold", "platinum", "badge", "trophy", "unlock"],
+    "matchmaking": ["match", "matchmaking", "ranked", "casual", "queue", "season", "leaderboard", "rank", "experience", "level"],
+    "refunds": ["refund", "purchase", "payment", "charge", "billing", "chargeback", "money"],
+    "policies": ["policy", "support", "ticket", "vip", "ban", "suspension", "priority", "account", "reward"],
+}
+
+ROW_BATCH = 1024
+# Part of the layout hash, so stores sharded under an older assignment rule are rebuilt
+LAYOUT_VERSION = 2
+
+
+def topic_terms(topics: Dict[str, Iterable[str]]) -> Dict[str, set]:
+    """Keyword lists tokenised the same way as queries, so plurals and case match."""
+    return {name: set(tokenize(" ".join(words))) for name, words in topics.items()}
+
+
+def topics_hash(topics: Dict[str, Iterable[str]]) -> str:
+    canonical = json.dumps({name: sorted(words) for name, words in topics.items()}, sort_keys=True) + f"/v{LAYOUT_VERSION}"
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def assign_shard(text: str, terms: Dict[str, set]) -> str:
+    """The one topic whose keywords text contains; general when it contains none, or those of several topics."""
+    tokens = set(tokenize(text))
+    matched = [name for name, words in terms.items() if tokens & words]
+    # "Refunds for legendary items" in the items shard would be out of reach of a query routed to refunds
+    return matched[0] if len(matched) == 1 else GENERAL_SHARD
+
+
+def shards_current(store_path: str, topics: Dict[str, Iterable[str]]) -> bool:
+    """True when the store has a shard layout built from these topics."""
+    try:
+        with open(f"{store_path}/{SHARDS_FILE}") as f:
+            return json.load(f).get("topics_hash") == topics_hash(topics)
+    except (OSError, ValueError):
+        return False
+
+
+def build_shards(store_path: str, topics: Dict[str, Iterable[str]]) -> Dict[str, Tuple[int, int]]:
+    """
+    Regroup the store's rows by topic and write the shard layout and centroids.
+
+    Vectors are copied from the existing store, so nothing is re-embedded.
+    Returns {shard: (start, end)}.
+    """
+    store = MmapVectorStore.load(store_path, None)
+    terms = topic_terms(topics)
+    order = list(terms) + [GENERAL_SHARD]
+    assignments = [assign_shard(doc.page_content, terms) for doc in store.documents]
+    rows = sorted(range(len(store)), key=lambda row: (order.index(assignments[row]), row))
+
+    writer = MmapStoreWriter(store_path)
+    for start in range(0, len(rows), ROW_BATCH):
+        batch = rows[start:start + ROW_BATCH]
+        docs = [store.documents[row] for row in batch]
+        writer.add(
+            [doc.page_content for doc in docs],
+            np.asarray(store.vectors[batch]),
+            [dict(doc.metadata, shard=assignments[row]) for doc, row in zip(docs, batch)],
+        )
+    store.close()
+    writer.close()
+
+    shards, centroids, start = {}, [], 0
+    sizes = Counter(assignments)
+    vectors = MmapVectorStore.load(store_path, None).vectors
+    for name in order:
+        size = sizes[name]
+        if size:
+            shards[name] = (start, start + size)
+            centroid = vectors[start:start + size].mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            centroids.append(centroid / norm if norm else centroid)
+            start += size
+
+    np.asarray(centroids, dtype="<f4").reshape(-1, vectors.shape[1]).tofile(f"{store_path}/{SHARD_CENTROIDS_FILE}")
+    with open(f"{store_path}/{SHARDS_FILE}", "w") as f:
+        json.dump({"topics_hash": topics_hash(topics), "shards": shards}, f)
+    logger.info(f"Built {len(shards)} shards over {len(rows)} chunks: { {name: end - s for name, (s, end) in shards.items()} }")
+    return shards
+
+
+class ShardRouter:
+    """Choose the shards worth searching for a query, or None for all of them."""
+
+    def __init__(
+        self,
+        shards: Dict[str, Tuple[int, int]],
+        centroids: Optional[np.ndarray],
+        topics: Dict[str, Iterable[str]],
+        min_centroid_margin: float = 0.05
+    ):
+        self.shards = shards
+        self.names = list(shards)
+        self.centroids = centroids
+        self.terms = {name: words for name, words in topic_terms(topics).items() if name in shards}
+        self.min_centroid_margin = min_centroid_margin
+
+    def _with_general(self, names: List[str]) -> List[str]:
+        # Chunks without a topic keyword may still answer a topical question
+        if GENERAL_SHARD in self.shards and GENERAL_SHARD not in names:
+            names.append(GENERAL_SHARD)
+        return names
+
+    def by_keywords(self, query: str) -> Optional[List[str]]:
+        tokens = set(tokenize(query))
+        names = [name for name, words in self.terms.items() if tokens & words]
+        return self._with_general(names) if names else None
+
+    def by_centroid(self, query_vector: Sequence[float]) -> Optional[List[str]]:
+        if self.centroids is None or len(self.names) < 2:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.centroids @ (query / norm if norm else query)
+        ranked = np.argsort(-scores)
+        # Only trust the nearest centroid when it is clearly nearer than the next one
+        if scores[ranked[0]] - scores[ranked[1]] < self.min_centroid_margin:
+            return None
+        return self._with_general([self.names[ranked[0]]])
+
+    def select(self, query: str, query_vector: Optional[Sequence[float]] = None) -> Tuple[Optional[List[str]], str]:
+        """Return (shards, how they were chosen); shards is None when all of them should be searched."""
+        names = self.by_keywords(query)
+        if names:
+            return names, "keyword"
+        if query_vector is not None:
+            names = self.by_centroid(query_vector)
+            if names:
+                return names, "centroid"
+        return None, "fallback"
+
+    def rows(self, names: Optional[Sequence[str]]) -> int:
+        """How many rows a search over names touches."""
+        selected = self.names if names is None else names
+        return sum(self.shards[name][1] - self.shards[name][0] for name in selected)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare the compressed vector index types against the exact flat index.
+
+Builds a synthetic, clustered corpus of unit vectors in an mmap store, then
+loads it once per VECTOR_INDEX_TYPE and reports index memory, build time,
+recall@k against the flat results, and per-query search latency.
+
+Usage (from the repository root):
+    python -m benchmarks.quantization_benchmark --count 20000 --dim 1536
+    python -m benchmarks.quantization_benchmark --output results.json
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.retrieval.mmap_store import MmapStoreWriter, MmapVectorStore
+from app.services.retrieval.quantization import INDEX_TYPES, IndexParams
+
+
+def synthetic_corpus(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit vectors scattered around random topic centroids, like embedded help articles."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, count)
+    vectors = centroids[assignments] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run(count: int, dim: int, queries: int, k: int, params: IndexParams, seed: int = 7) -> dict:
+    vectors = synthetic_corpus(count, dim, clusters=max(1, count // 200), seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, count, queries)
+    query_vectors = vectors[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+
+    results = {"count": count, "dim": dim, "queries": queries, "k": k, "index_types": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = MmapStoreWriter(tmp)
+        for start in range(0, count, 10000):
+            batch = vectors[start:start + 10000]
+            writer.add([f"chunk {start + i}" for i in range(len(batch))], batch)
+        writer.close()
+
+        exact = None
+        for index_type in INDEX_TYPES:
+            started = time.perf_counter()
+            store = MmapVectorStore.load(tmp, embedding=None, index_type=index_type, index_params=params)
+            build_seconds = time.perf_counter() - started
+
+            latencies, hits = [], []
+            for query in query_vectors:
+                started = time.perf_counter()
+                hits.append([row for row, _ in store.search_vectors(query, k)])
+                latencies.append((time.perf_counter() - started) * 1000)
+            if exact is None:
+                exact = hits
+            recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(hits, exact)])
+
+            results["index_types"][index_type] = {
+                "memory_bytes": store.searcher.nbytes,
+                "bytes_per_vector": round(store.searcher.nbytes / count, 1),
+                "build_seconds": round(build_seconds, 3),
+                f"recall@{k}": round(float(recall), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--ivf-nlist", type=int, default=256)
+    parser.add_argument("--ivf-nprobe", type=int, default=16)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    params = IndexParams(pq_m=args.pq_m, ivf_nlist=args.ivf_nlist, ivf_nprobe=args.ivf_nprobe)
+    results = run(args.count, args.dim, args.queries, args.k, params)
+
+    print(f"{args.count} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'index':<10}{'memory MB':>12}{'B/vector':>10}{'build s':>10}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for index_type, row in results["index_types"].items():
+        print(
+            f"{index_type:<10}{row['memory_bytes'] / 1e6:>12.2f}{row['bytes_per_vector']:>10}"
+            f"{row['build_seconds']:>10}{row[f'recall@{args.k}']:>9}{row['p50_ms']:>9}{row['p99_ms']:>9}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
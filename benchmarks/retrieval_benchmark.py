@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Reproducible retrieval quality and latency benchmark for the static knowledge agent.
+
+Evaluates labelled questions against a corpus and reports, per retrieval
+method (BM25, vector search per index type, and their reciprocal-rank
+fusion): recall@k, MRR, p50/p99 search latency, index build time and index
+memory. Everything runs locally; no OpenAI call is made unless
+--embeddings openai is requested.
+
+Corpora:
+    kb          the knowledge base (KNOWLEDGE_BASE_PATH or --knowledge-base), labelled by
+                benchmarks/data/knowledge_base_questions.jsonl
+    synthetic   generated topic bullets with one question per sampled chunk (--count)
+
+Embeddings:
+    hashing     signed feature hashing of stemmed terms and bigrams (default, deterministic)
+    fake        random vectors per text, a no-signal baseline
+    openai      OpenAIEmbeddings, needs OPENAI_API_KEY
+
+Usage (from the repository root):
+    python -m benchmarks.retrieval_benchmark
+    python -m benchmarks.retrieval_benchmark --corpus synthetic --count 50000 --index-types flat,int8,ivf_pq
+    python -m benchmarks.retrieval_benchmark --output after.json --baseline before.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.retrieval.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+from app.services.retrieval.ingestion import Chunk, embed_in_batches, iter_chunks
+from app.services.retrieval.mmap_store import MmapStoreWriter, MmapVectorStore
+
+DATASET = Path(__file__).parent / "data" / "knowledge_base_questions.jsonl"
+SYLLABLES = ("ka", "lo", "mi", "ru", "te", "va", "zo", "ne", "shi", "dra", "gor", "pel", "qui", "ban", "tor")
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag of stemmed terms and bigrams hashed into a fixed-size signed vector."""
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        terms = tokenize(text)
+        for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+            digest = int(hashlib.md5(feature.encode("utf-8")).hexdigest()[:8], 16)
+            vector[digest % self.size] += 1 if digest & 0x80000000 else -1
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def make_embeddings(name: str) -> Embeddings:
+    if name == "hashing":
+        return HashingEmbeddings()
+    if name == "fake":
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=512)
+    if name == "openai":
+        from langchain_community.embeddings import OpenAIEmbeddings
+        from app.core.config import settings
+        return OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
+    raise ValueError(f"Unknown embeddings '{name}', expected hashing, fake or openai")
+
+
+def knowledge_base_corpus(path: str, chunker: str) -> Tuple[List[str], List[Dict]]:
+    """Chunks of the knowledge base and the labelled questions, with relevance as row numbers."""
+    texts = [chunk.text for chunk in iter_chunks(path, chunker)]
+    questions = []
+    with open(DATASET) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            markers = [marker.lower() for marker in item["relevant"]]
+            rows = [row for row, text in enumerate(texts) if any(marker in text.lower() for marker in markers)]
+            questions.append({"question": item["question"], "relevant": rows})
+    return texts, questions
+
+
+def synthetic_corpus(count: int, queries: int, seed: int, topics: int = 50) -> Tuple[List[str], List[Dict]]:
+    """Topic bullets of shared topic words plus three chunk-specific words; questions use two of those and one topic word."""
+    rng = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    topic_words = [[word() for _ in range(40)] for _ in range(topics)]
+    texts, keys = [], []
+    for _ in range(count):
+        topic = rng.randrange(topics)
+        own = [word() for _ in range(3)]
+        body = rng.sample(topic_words[topic], 8) + own
+        rng.shuffle(body)
+        texts.append("- " + " ".join(body) + ".")
+        keys.append((topic, own))
+
+    questions = []
+    for row in rng.sample(range(count), min(queries, count)):
+        topic, own = keys[row]
+        question = f"what about {' '.join(own[:2] + rng.sample(topic_words[topic], 1))}?"
+        questions.append({"question": question, "relevant": [row]})
+    return texts, questions
+
+
+def build_store(path: str, texts: Sequence[str], embeddings: Embeddings, batch_size: int, workers: int) -> float:
+    started = time.perf_counter()
+    writer = MmapStoreWriter(path)
+    chunks = (Chunk(text=text, metadata={"row": row}) for row, text in enumerate(texts))
+    for batch, vectors in embed_in_batches(chunks, embeddings, batch_size, workers):
+        writer.add([chunk.text for chunk in batch], vectors, [chunk.metadata for chunk in batch])
+    writer.close()
+    return time.perf_counter() - started
+
+
+def _bm25_nbytes(index: BM25Index) -> int:
+    arrays = [index.doc_lengths] + [array for pair in index.postings.values() for array in pair]
+    return sum(array.itemsize * len(array) for array in arrays)
+
+
+def score(rankings: List[List[int]], questions: List[Dict], latencies: List[float], k: int) -> Dict:
+    recalls, reciprocal_ranks = [], []
+    for ranking, question in zip(rankings, questions):
+        relevant = set(question["relevant"])
+        if not relevant:
+            continue
+        recalls.append(len(relevant & set(ranking[:k])) / len(relevant))
+        rank = next((position for position, row in enumerate(ranking, 1) if row in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def _timed(search, items) -> Tuple[List[List[int]], List[float]]:
+    rankings, latencies = [], []
+    for item in items:
+        started = time.perf_counter()
+        rankings.append(search(item))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return rankings, latencies
+
+
+def run(
+    texts: List[str],
+    questions: List[Dict],
+    embeddings: Embeddings,
+    index_types: Sequence[str],
+    k: int,
+    candidates: int = 8,
+    rrf_k: int = 60,
+    batch_size: int = 64,
+    workers: int = 4
+) -> Dict:
+    results = {"chunks": len(texts), "questions": len(questions), "k": k, "methods": {}}
+    depth = max(k, candidates)
+    query_texts = [question["question"] for question in questions]
+
+    started = time.perf_counter()
+    lexical = BM25Index(texts)
+    lexical_build = time.perf_counter() - started
+    lexical_rankings, latencies = _timed(lambda q: [row for row, _ in lexical.search(q, depth)], query_texts)
+    results["methods"]["lexical"] = dict(
+        score(lexical_rankings, questions, latencies, k),
+        build_seconds=round(lexical_build, 3),
+        memory_bytes=_bm25_nbytes(lexical),
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results["embed_seconds"] = round(build_store(tmp, texts, embeddings, batch_size, workers), 3)
+        query_vectors = embeddings.embed_documents(query_texts)
+        for index_type in index_types:
+            started = time.perf_counter()
+            store = MmapVectorStore.load(tmp, embeddings, index_type=index_type)
+            build_seconds = time.perf_counter() - started
+
+            vector_rankings, latencies = _timed(
+                lambda vector: [row for row, _ in store.search_vectors(vector, depth)], query_vectors
+            )
+            results["methods"][f"vector/{index_type}"] = dict(
+                score(vector_rankings, questions, latencies, k),
+                build_seconds=round(build_seconds, 3),
+                memory_bytes=store.searcher.nbytes,
+            )
+
+            # Fusion latency covers both searches, as in the agent's hybrid mode
+            def hybrid(position: int) -> List[int]:
+                lexical_rows = [row for row, _ in lexical.search(query_texts[position], depth)]
+                vector_rows = [row for row, _ in store.search_vectors(query_vectors[position], depth)]
+                return [row for row, _ in reciprocal_rank_fusion([lexical_rows, vector_rows], k=rrf_k)]
+
+            hybrid_rankings, latencies = _timed(hybrid, range(len(questions)))
+            results["methods"][f"hybrid/{index_type}"] = dict(
+                score(hybrid_rankings, questions, latencies, k),
+                build_seconds=round(build_seconds + lexical_build, 3),
+                memory_bytes=store.searcher.nbytes + _bm25_nbytes(lexical),
+            )
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: Dict, baseline: Dict = None):
+    k = results["k"]
+    print(
+        f"{results['corpus']} corpus: {results['chunks']} chunks, {results['questions']} questions, "
+        f"{results['embeddings']} embeddings ({results['embed_seconds']}s), commit {results['commit']}"
+    )
+    print(f"{'method':<18}{f'recall@{k}':>10}{'mrr':>8}{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}{'memory MB':>11}")
+    for method, row in results["methods"].items():
+        line = (
+            f"{method:<18}{row[f'recall@{k}']:>10}{row['mrr']:>8}{row['p50_ms']:>9}{row['p99_ms']:>9}"
+            f"{row['build_seconds']:>9}{row['memory_bytes'] / 1e6:>11.3f}"
+        )
+        before = (baseline or {}).get("methods", {}).get(method)
+        if before and before.get(f"recall@{k}") is not None:
+            line += (
+                f"   recall {row[f'recall@{k}'] - before[f'recall@{k}']:+.4f}"
+                f" mrr {row['mrr'] - before['mrr']:+.4f} p50 {row['p50_ms'] - before['p50_ms']:+.3f}ms"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=("kb", "synthetic"), default="kb")
+    parser.add_argument("--knowledge-base", help="Knowledge base path (default: KNOWLEDGE_BASE_PATH)")
+    parser.add_argument("--chunker", default="bullet")
+    parser.add_argument("--count", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=500, help="Synthetic question count")
+    parser.add_argument("--embeddings", choices=("hashing", "fake", "openai"), default="hashing")
+    parser.add_argument("--index-types", default="flat,float16,int8")
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier --output file to print deltas against")
+    args = parser.parse_args()
+
+    if args.corpus == "kb":
+        path = args.knowledge_base
+        if path is None:
+            from app.core.config import settings
+            path = settings.KNOWLEDGE_BASE_PATH
+        texts, questions = knowledge_base_corpus(path, args.chunker)
+    else:
+        texts, questions = synthetic_corpus(args.count, args.queries, args.seed)
+
+    results = run(texts, questions, make_embeddings(args.embeddings), args.index_types.split(","), args.k)
+    results.update(corpus=args.corpus, embeddings=args.embeddings, commit=_git_commit())
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
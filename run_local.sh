@@ -5,6 +5,9 @@ export ENVIRONMENT=development
 export USE_SQLITE=true
 export DEBUG=true
 
+# Apply pending schema migrations (indexes, player_summary) once, before any worker starts
+python -m app.models.migrations
+
 # Start the backend server
 echo "Starting backend server..."
 uvicorn app.main:app --reload --port 8000 &
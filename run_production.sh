@@ -5,6 +5,9 @@ export ENVIRONMENT=production
 export USE_SQLITE=false
 export DEBUG=false
 
+# Apply pending schema migrations (indexes, player_summary) once, before any worker starts
+python -m app.models.migrations
+
 # Start the backend server in production mode
 echo "Starting backend server in production mode..."
 uvicorn app.main:app --host 0.0.0.0 --port 8000 &
@@ -0,0 +1,17 @@
+from langchain.docstore.document import Document
+from app.services.retrieval.adaptive_k import select_context
+
+def _docs(*scores, text="- short chunk"):
+    return [(Document(page_content=f"{text} {i}"), score) for i, score in enumerate(scores)]
+
+def test_cuts_at_score_gap_and_floor():
+    chosen, _ = select_context(_docs(0.9, 0.88, 0.6, 0.58), max_gap=0.1)
+    assert [score for _, score in chosen] == [0.9, 0.88]
+    chosen, _ = select_context(_docs(0.9, 0.85, 0.8), min_score=0.82, max_gap=0.1)
+    assert len(chosen) == 2
+
+def test_min_k_is_kept_and_budget_caps_the_rest():
+    chosen, _ = select_context(_docs(0.2, 0.1), min_k=1, min_score=0.5)
+    assert len(chosen) == 1
+    chosen, tokens = select_context(_docs(0.9, 0.9, 0.9, text="word " * 40), token_budget=100)
+    assert len(chosen) < 3 and tokens <= 100
@@ -0,0 +1,33 @@
+from app.services.retrieval.answer_cache import SemanticAnswerCache
+
+def test_exact_repeat_ignores_case_and_punctuation():
+    cache = SemanticAnswerCache(version="v1")
+    cache.store("Can XP boosters be stacked?", "No, they cannot be stacked.")
+    assert cache.lookup("can xp boosters be stacked") == "No, they cannot be stacked."
+
+def test_semantic_hit_respects_threshold():
+    cache = SemanticAnswerCache(threshold=0.9, version="v1")
+    cache.store("Are legendary items rare?", "Yes.", vector=[1.0, 0.0, 0.0])
+    assert cache.lookup("Is a legendary item rare?") is None
+    assert cache.lookup_similar([0.99, 0.1, 0.0]) == "Yes."
+    assert cache.lookup_similar([0.5, 0.8, 0.0]) is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["best_similarity"]["count"] == 2
+
+def test_version_change_invalidates_entries():
+    cache = SemanticAnswerCache(version="v1")
+    cache.store("What are gold achievements?", "Rare awards.", vector=[0.0, 1.0])
+    cache.set_version("v2")
+    assert cache.lookup("What are gold achievements?") is None
+    assert cache.lookup_similar([0.0, 1.0]) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_ring_buffer_evicts_oldest_vectors():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+    cache.store("a", "A", vector=[1.0, 0.0])
+    cache.store("b", "B", vector=[0.0, 1.0])
+    cache.store("c", "C", vector=[-1.0, 0.0])
+    assert cache.lookup_similar([1.0, 0.0]) is None
+    assert cache.lookup_similar([-1.0, 0.0]) == "C"
+    assert len(cache) == 2
@@ -0,0 +1,27 @@
+import asyncio
+import sqlite3
+from app.services.data.async_db import AsyncDatabase, async_url, format_rows
+
+def test_async_urls_and_row_format():
+    assert async_url("sqlite:///game.db") == "sqlite+aiosqlite:///game.db"
+    assert async_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert async_url("postgres://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert format_rows([]) == ""
+    assert format_rows([("IceWarden", 42)]) == "[('IceWarden', 42)]"
+
+def test_fetch_many_runs_statements_and_keeps_order(tmp_path):
+    path = tmp_path / "game.db"
+    connection = sqlite3.connect(path)
+    connection.executescript("CREATE TABLE players (id INTEGER, username TEXT); INSERT INTO players VALUES (1, 'A'), (2, 'B');")
+    connection.commit()
+
+    async def scenario():
+        db = AsyncDatabase(f"sqlite:///{path}")
+        counts = await db.fetch_many(["SELECT COUNT(*) FROM players", "SELECT MAX(id) FROM players"])
+        named = await db.run("SELECT username FROM players WHERE id = :id", {"id": 2})
+        await db.dispose()
+        return counts, named
+
+    counts, named = asyncio.run(scenario())
+    assert counts == [[(2,)], [(2,)]]
+    assert named == "[('B',)]"
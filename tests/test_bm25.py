@@ -0,0 +1,39 @@
+from app.services.retrieval.bm25 import BM25Index, is_decisive, reciprocal_rank_fusion, tokenize
+
+KNOWLEDGE = [
+    "- XP boosters provide 2x experience gain for 24 hours and cannot be stacked.",
+    "- Refunds are not issued for consumables or one-time use items like XP boosters or scrolls.",
+    "- Gold achievements are awarded for exceptional accomplishments.",
+    "- Consumables like XP boosters and teleport scrolls are single-use items that enhance performance temporarily.",
+]
+
+def test_tokenize_stems_plurals_and_drops_stopwords():
+    assert tokenize("What are the XP Boosters?") == ["xp", "booster"]
+
+def test_exact_term_ranks_first():
+    index = BM25Index(KNOWLEDGE)
+    hits = index.search("teleport scrolls", k=2)
+    assert hits[0][0] == 3
+    assert 0 < hits[0][1] <= 1
+
+def test_unknown_terms_lower_the_score():
+    index = BM25Index(KNOWLEDGE)
+    known = index.search("gold achievements")[0][1]
+    diluted = index.search("gold achievements dragons")[0][1]
+    assert diluted < known
+
+def test_no_match_returns_empty():
+    assert BM25Index(KNOWLEDGE).search("matchmaking queue") == []
+
+def test_is_decisive():
+    assert is_decisive([(0, 0.9), (1, 0.3)], min_score=0.6, min_margin=1.5)
+    assert not is_decisive([(0, 0.9), (1, 0.8)], min_score=0.6, min_margin=1.5)
+    assert not is_decisive([(0, 0.4)], min_score=0.6, min_margin=1.5)
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    assert fused[0][0] == "b"
+    normalized = reciprocal_rank_fusion([["a", "b", "c"], ["a", "c"]], k=60, normalize=True)
+    assert [key for key, _ in normalized] == ["a", "c", "b"] and normalized[0][1] == 1.0
+    # Scores fall with the fused rank, and a key only one list found is at most half the best
+    assert normalized[1][1] > 0.9 and normalized[2][1] < 0.5
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from app.services.data.columnar import AnalyticsMirror, ColumnarTable, Filter
+from benchmarks.sql_index_benchmark import build_database
+
+def test_aggregates_match_sql(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    build_database(engine, players=150, seed=2)
+    mirror = AnalyticsMirror(engine)
+    since = datetime.utcnow() - timedelta(days=7)
+    query = mirror.parse_question("How many legendary items were bought last week?", now=since + timedelta(days=7))
+    assert (query.table, query.function, query.group_by) == ("purchases", "count", None)
+    with engine.connect() as connection:
+        expected = connection.execute(text(
+            "SELECT COUNT(*) FROM purchases WHERE LOWER(rarity) = 'legendary' AND purchase_date >= :since"
+        ), {"since": query.filters[-1].value.strftime("%Y-%m-%d %H:%M:%S")}).scalar()
+        by_region = connection.execute(text(
+            "SELECT p.region, ROUND(AVG(m.xp_gained), 2) FROM matches m JOIN players p ON p.player_id = m.player_id "
+            "WHERE m.result = 'Win' GROUP BY p.region ORDER BY p.region"
+        )).fetchall()
+    assert mirror.run(query) == [(expected,)]
+
+    query = mirror.parse_question("Average XP gained in matches won, by region")
+    assert (query.function, query.measure, query.group_by) == ("avg", "xp_gained", "region")
+    assert sorted(mirror.run(query)) == [tuple(row) for row in by_region]
+    assert "GROUP BY p.region" in mirror.sql_for(query) and "t.result" in mirror.sql_for(query)
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO purchases (player_id, item_name, item_type, rarity, price, purchase_date) "
+            "VALUES (1, 'Crown', 'Cosmetic', 'Legendary', 99.5, :now)"
+        ), {"now": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")})
+    mirror.refresh()
+    assert mirror.run(mirror.parse_question("How many legendary items were bought last week?")) == [(expected + 1,)]
+    assert mirror.run(mirror.parse_question("What is the highest price paid for a purchase?")) == [(99.5,)]
+    assert mirror.stats()["memory_bytes"] > 0
+
+def test_questions_outside_the_mirror_are_declined(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    build_database(engine, players=10, seed=2)
+    mirror = AnalyticsMirror(engine)
+    assert mirror.parse_question("How many legendary items were bought since March?") is None
+    assert mirror.parse_question("Average XP by clan") is None
+    assert mirror.parse_question("Which items were bought last week?") is None
+    assert mirror.parse_question("How many matches and purchases are there?") is None
+    # Parts the mirror cannot express decline the question instead of being dropped
+    assert mirror.parse_question("How many players bought legendary items last week?") is None
+    assert mirror.parse_question("How many items cost more than 5?") is None
+    assert mirror.parse_question("How many legendary items were not bought this week?") is None
+    assert mirror.parse_question("What is the most expensive item?") is None
+    assert mirror.parse_question("How many legendary items were bought in the last 7 days?") is not None
+
+def test_group_kernels():
+    table = ColumnarTable("matches", {"result": "category", "xp_gained": "float"})
+    table.append({"result": ["Win", "Loss", "win", None], "xp_gained": [10, 4, 30, 7]})
+    assert table.aggregate("max", "xp_gained", group_by="result") == [("Win", 10.0), ("Loss", 4.0), ("win", 30.0)]
+    assert table.aggregate("count", filters=[Filter("result", "=", "WIN")]) == [(2,)]
+    assert table.aggregate("sum", "xp_gained") == [(51.0,)]
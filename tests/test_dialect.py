@@ -0,0 +1,75 @@
+import sqlite3
+from sqlalchemy import create_engine
+from app.models.migrations import apply_migrations, bookkeeping_tables, expression_indexes, split_concurrent
+from app.services.data.dialect import prompt_fragments, rewrite_for_dialect
+
+def test_sqlite_functions_are_translated_for_postgres():
+    sql = ("SELECT pur.item_name FROM purchases pur JOIN players p ON p.player_id = pur.player_id "
+           "WHERE LOWER(p.username) = LOWER('IceWarden') AND datetime(pur.purchase_date) > datetime('now', '-7 days')")
+    assert rewrite_for_dialect(sql, "postgresql") == (
+        "SELECT pur.item_name FROM purchases pur JOIN players p ON p.player_id = pur.player_id "
+        "WHERE LOWER(p.username) = 'icewarden' AND pur.purchase_date > (NOW() - INTERVAL '7 days')"
+    )
+    assert rewrite_for_dialect("SELECT 1 FROM clans c WHERE c.clan_name ILIKE 'DarkWolves'", "postgresql") == \
+        "SELECT 1 FROM clans c WHERE LOWER(c.clan_name) = 'darkwolves'"
+    assert "PostgreSQL" in prompt_fragments("postgresql")["dialect_name"]
+
+def test_postgres_syntax_is_translated_for_sqlite():
+    sql = "SELECT * FROM matches m WHERE m.match_date > NOW() - INTERVAL '3 days' AND m.result ILIKE 'w%'"
+    assert rewrite_for_dialect(sql, "sqlite") == \
+        "SELECT * FROM matches m WHERE m.match_date > datetime('now', '-3 days') AND m.result LIKE 'w%'"
+
+def test_migrations_make_name_lookups_index_searches(tmp_path):
+    path = tmp_path / "game.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT UNIQUE, level INTEGER);"
+        "CREATE TABLE clans (clan_id INTEGER PRIMARY KEY, clan_name TEXT UNIQUE);"
+        "INSERT INTO players VALUES (1, 'IceWarden', 10), (2, 'PixelMage', 20);"
+    )
+    engine = create_engine(f"sqlite:///{path}")
+    assert apply_migrations(engine) == ["0001_lower_name_indexes", "0002_access_path_indexes", "0003_player_summary"]
+    assert apply_migrations(engine) == []
+    assert bookkeeping_tables(engine) == ["schema_migrations", "player_summary_watermarks"]
+    with engine.connect() as db:
+        assert {"players.lower(username)", "clans.lower(clan_name)"} <= expression_indexes(db, "sqlite")
+
+    lookup = rewrite_for_dialect("SELECT p.level FROM players p WHERE LOWER(p.username) = LOWER('IceWarden')", "sqlite")
+    plan = sqlite3.connect(path).execute("EXPLAIN QUERY PLAN " + lookup).fetchall()
+    assert "USING INDEX ix_players_username_lower" in plan[0][-1]
+
+def test_wrapped_date_columns_become_ranges_on_the_column(tmp_path):
+    assert rewrite_for_dialect("SELECT 1 FROM matches m WHERE CAST(m.match_date AS TIMESTAMP) > NOW() - INTERVAL '3 days'",
+                               "postgresql") == "SELECT 1 FROM matches m WHERE m.match_date > NOW() - INTERVAL '3 days'"
+    assert rewrite_for_dialect("SELECT 1 FROM matches m WHERE m.match_date::date <= '2026-01-31'", "postgresql") == \
+        "SELECT 1 FROM matches m WHERE m.match_date < CAST('2026-01-31' AS DATE) + 1"
+    # Wrapping the column outside a comparison is left alone
+    assert rewrite_for_dialect("SELECT date(purchase_date), COUNT(*) FROM purchases GROUP BY date(purchase_date)", "sqlite") == \
+        "SELECT date(purchase_date), COUNT(*) FROM purchases GROUP BY date(purchase_date)"
+
+    path = tmp_path / "game.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE purchases (purchase_id INTEGER PRIMARY KEY, player_id INTEGER, item_name TEXT, purchase_date TEXT);"
+        "CREATE INDEX ix_purchases_player_id_purchase_date ON purchases (player_id, purchase_date);"
+        "INSERT INTO purchases (player_id, item_name, purchase_date) VALUES "
+        "(1, 'Sword', datetime('now')), (1, 'Bow', datetime('now', '-1 day')), (2, 'Cape', datetime('now'));"
+    )
+    today = "SELECT item_name FROM purchases WHERE player_id = 1 AND date(purchase_date) = date('now')"
+    rewritten = rewrite_for_dialect(today, "sqlite")
+    assert rewritten == ("SELECT item_name FROM purchases WHERE player_id = 1 "
+                         "AND (purchase_date >= date('now') AND purchase_date < date(date('now'), '+1 day'))")
+    assert connection.execute(rewritten).fetchall() == connection.execute(today).fetchall() == [("Sword",)]
+    plan = connection.execute("EXPLAIN QUERY PLAN " + rewritten).fetchall()
+    assert "(player_id=? AND purchase_date>? AND purchase_date<?)" in plan[0][-1]
+
+def test_postgres_indexes_are_built_concurrently_outside_the_transaction():
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_players_username_lower ON players (lower(username))",
+        "ANALYZE players",
+    ]
+    assert split_concurrent(statements, "postgresql") == (
+        ["CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_players_username_lower ON players (lower(username))"],
+        ["ANALYZE players"],
+    )
+    assert split_concurrent(statements, "sqlite") == ([], statements)
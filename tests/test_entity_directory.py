@@ -0,0 +1,58 @@
+from sqlalchemy import create_engine, text
+from app.services.data.directory import EntityDirectory
+from app.services.data.gazetteer import NameGazetteer
+
+def test_gazetteer_matches_case_insensitively_on_token_boundaries():
+    gazetteer = NameGazetteer(["DragonSlayer99", "IceWarden", "Ice"])
+    mentions = gazetteer.find("Is icewarden's rank above DRAGONSLAYER99 or IceWarden2?")
+    assert [m.name for m in mentions] == ["IceWarden", "DragonSlayer99"]
+    assert gazetteer.find("Slice of ice")[0].name == "Ice"
+
+    gazetteer.add("IceWarden2")
+    assert [m.name for m in gazetteer.find("IceWarden2")] == ["IceWarden2"]
+
+def test_directory_resolves_columns_and_refreshes_incrementally(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE players (id INTEGER PRIMARY KEY, username TEXT)"))
+        connection.execute(text("CREATE TABLE clans (clan_id INTEGER PRIMARY KEY, clan_name TEXT)"))
+        connection.execute(text("INSERT INTO players VALUES (1, 'ShadowNinja'), (2, 'PixelMage')"))
+        connection.execute(text("INSERT INTO clans VALUES (1, 'FireMages')"))
+
+    directory = EntityDirectory(engine)
+    assert [m.name for m in directory.find_players("what level is pixelmage?")] == ["PixelMage"]
+    assert [m.name for m in directory.find_clans("Is FireMages a magic clan?")] == ["FireMages"]
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO players VALUES (3, 'StormBringer')"))
+    directory.refresh()
+    assert "StormBringer" in directory.players and len(directory.players) == 3
+
+def test_unknown_names_are_reported_but_typos_are_not(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT)"))
+        connection.execute(text("INSERT INTO players VALUES (1, 'ShadowNinja')"))
+
+    directory = EntityDirectory(engine)
+    assert directory.unknown_entity("What is GhostRider77's rank?") == "GhostRider77"
+    assert directory.unknown_entity("What level is ShadwNinja?") is None
+    assert directory.unknown_entity("What level is ShadowNinja?") is None
+
+def test_unknown_names_before_classification_need_a_player_or_clan_position(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT)"))
+        connection.execute(text("INSERT INTO players VALUES (1, 'ShadowNinja')"))
+
+    directory = EntityDirectory(engine)
+    for question in (
+        "My PayPal purchase never arrived, what is the status?",
+        "What legendary items come with Season2?",
+        "Can I buy gold with my PlayStation wallet?",
+        "How do I reach level 50 on my iPhone13?",
+    ):
+        assert directory.unknown_entity(question, require_slot=True) is None, question
+    assert directory.unknown_entity("What is GhostRider77's rank?", require_slot=True) == "GhostRider77"
+    assert directory.unknown_entity("How many purchases has player GhostRider77 made?", require_slot=True) == "GhostRider77"
+    assert directory.unknown_entity("Is the clan IronWolves recruiting?", require_slot=True) == "IronWolves"
@@ -0,0 +1,17 @@
+from app.services.data.bloom import BloomFilter, ExistenceFilter
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"player{i}")
+    assert all(f"player{i}" in bloom for i in range(1000))
+    false_positives = sum(f"ghost{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_existence_filter_is_exact_and_grows():
+    known = ExistenceFilter(["DragonSlayer99", "FireMages"], capacity=2)
+    assert "dragonslayer 99" in known and "Fire Mages" in known
+    assert "GhostRider77" not in known
+    for i in range(50):
+        known.add(f"Player{i}")
+    assert len(known) == 52 and all(f"player{i}" in known for i in range(50))
@@ -0,0 +1,43 @@
+from langchain.docstore.document import Document
+from app.services.retrieval.bm25 import BM25Index
+from app.services.retrieval.extractive import MULTI_PART, extractive_answer, in_traffic_share
+from benchmarks.retrieval_benchmark import knowledge_base_corpus
+
+def hits(*scored):
+    return [(Document(page_content=text), score) for text, score in scored]
+
+def test_only_a_strong_clear_bm25_winner_is_served():
+    lexical = hits(("- Teleport scrolls move you to any unlocked town", 0.9), ("Scrolls are consumables", 0.4))
+    assert extractive_answer("What are teleport scrolls?", lexical, lexical, 0.6, 0.3) == (
+        "According to our game documentation: Teleport scrolls move you to any unlocked town."
+    )
+    assert extractive_answer("What are teleport scrolls?", lexical, hits(("a", 0.5)), 0.6, 0.3) is None  # weak
+    close = hits(("a", 0.9), ("b", 0.7))
+    assert extractive_answer("What are teleport scrolls?", close, close, 0.6, 0.3) is None  # no margin
+    # The fused ranking put a vector hit first: the BM25 winner is not what retrieval chose
+    assert extractive_answer("What are teleport scrolls?", hits(("other", 0.8)) + lexical, lexical, 0.6, 0.3) is None
+    assert extractive_answer("What are teleport scrolls?", lexical, [], 0.6, 0.3) is None  # vector mode
+
+def test_multi_part_questions_go_to_the_llm():
+    assert MULTI_PART.search("What are teleport scrolls and how do I get one?")
+    assert MULTI_PART.search("What are scrolls? Are they refundable?")
+    assert not MULTI_PART.search("What do ranked and casual matches reward?")
+
+def test_default_gate_only_serves_correct_top_chunks():
+    texts, questions = knowledge_base_corpus("advanced_knowledge_base.txt", "bullet")
+    index, documents = BM25Index(texts), [Document(page_content=text) for text in texts]
+    served = 0
+    for question in questions:
+        lexical = [(documents[row], score) for row, score in index.search(question["question"], k=8)]
+        if extractive_answer(question["question"], lexical, lexical, 0.6, 0.3) is not None:
+            served += 1
+            assert texts.index(lexical[0][0].page_content) in question["relevant"], question["question"]
+    assert served >= len(questions) // 2
+
+def test_traffic_share_is_deterministic_and_proportional():
+    queries = [f"question number {n}" for n in range(2000)]
+    chosen = [query for query in queries if in_traffic_share(query, 0.25)]
+    assert 400 < len(chosen) < 600
+    assert all(in_traffic_share(query.upper() + "  ", 0.25) for query in chosen[:50])  # same bucket after normalising
+    assert all(in_traffic_share(query, 1.0) for query in queries[:10])
+    assert not any(in_traffic_share(query, 0.0) for query in queries[:10])
@@ -0,0 +1,15 @@
+from app.services.data.fuzzy import FuzzyNameIndex
+
+def test_spacing_and_case_resolve_exactly():
+    index = FuzzyNameIndex(["DragonSlayer99", "FireMages", "ShadowNinja"])
+    resolution = index.resolve("What is Dragonslayer 99 rank?")
+    assert resolution.text == "Dragonslayer 99"
+    assert resolution.matches[0] == ("DragonSlayer99", 1.0)
+    assert index.resolve("How many members does Fire Mages have?").matches[0].name == "FireMages"
+
+def test_typos_score_by_trigram_similarity():
+    index = FuzzyNameIndex(["ShadowNinja", "StormBringer", "BlazeRider"])
+    best = index.resolve("What level is ShadwNinja?").matches[0]
+    assert best.name == "ShadowNinja" and 0.7 < best.score < 1
+    assert index.resolve("How many players and clans are there?") is None
+    assert index.similar("completely different", min_score=0.5) == []
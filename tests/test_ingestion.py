@@ -0,0 +1,38 @@
+import json
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from app.services.retrieval.ingestion import ingest, iter_chunks
+from app.services.retrieval.mmap_store import MmapVectorStore
+
+def test_bullet_chunker_matches_knowledge_base_format(tmp_path):
+    kb = tmp_path / "kb.txt"
+    kb.write_text("# Items\n- Legendary items are rare.\nnot a bullet\n  - XP boosters stack? No.\n")
+    chunks = list(iter_chunks(str(kb), chunker="bullet"))
+    assert [c.text for c in chunks] == ["- Legendary items are rare.", "- XP boosters stack? No."]
+    assert chunks[0].metadata["section"] == "Items"
+    start, end = chunks[1].metadata["start"], chunks[1].metadata["end"]
+    assert kb.read_text()[start:end] == "- XP boosters stack? No."
+
+def test_heading_chunker_keeps_sections_apart(tmp_path):
+    (tmp_path / "clans.md").write_text("# Clans\nMagic clans cast spells.\n\n## Ranking\nClans are ranked weekly.\n")
+    chunks = list(iter_chunks(str(tmp_path), chunker="heading"))
+    assert [c.metadata["section"] for c in chunks] == ["Clans", "Ranking"]
+    assert chunks[1].text == "Ranking: Clans are ranked weekly."
+
+def test_window_chunker_overlaps_and_covers_text(tmp_path):
+    words = " ".join(f"word{i}" for i in range(200))
+    (tmp_path / "articles.jsonl").write_text(json.dumps({"id": "a1", "title": "Refunds", "body": words}) + "\n")
+    chunks = list(iter_chunks(str(tmp_path), chunker="window", chunk_size=200, chunk_overlap=50))
+    assert len(chunks) > 1
+    assert all(len(c.text) <= 200 for c in chunks)
+    assert chunks[0].metadata["source"].endswith("articles.jsonl#a1")
+    assert chunks[0].metadata["section"] == "Refunds"
+    assert chunks[0].text.split()[-1] in chunks[1].text
+    assert "word199" in chunks[-1].text
+
+def test_ingest_streams_batches_into_store(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "kb.txt").write_text("".join(f"- Fact number {i}.\n" for i in range(25)))
+    manifest = ingest(str(tmp_path / "docs"), str(tmp_path / "store"), DeterministicFakeEmbedding(size=8), batch_size=4, workers=3)
+    assert manifest["count"] == 25
+    store = MmapVectorStore.load(str(tmp_path / "store"), None)
+    assert [doc.page_content for doc in store.documents][:2] == ["- Fact number 0.", "- Fact number 1."]
@@ -0,0 +1,73 @@
+import sqlite3
+from sqlalchemy import create_engine, text
+from app.models.migrations import apply_migrations
+from app.services.data.directory import EntityDirectory
+from app.services.data.intents import IntentRegistry, build_handlers, ordinal
+
+def make_db(tmp_path):
+    path = tmp_path / "game.db"
+    sqlite3.connect(path).executescript(
+        "CREATE TABLE clans (clan_id INTEGER PRIMARY KEY, clan_name TEXT, clan_type TEXT, member_count INTEGER);"
+        "CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT, level INTEGER, xp INTEGER, vip_status TEXT, clan_id INTEGER);"
+        "CREATE TABLE purchases (purchase_id INTEGER PRIMARY KEY, player_id INTEGER, rarity TEXT);"
+        "CREATE TABLE achievements (achievement_id INTEGER PRIMARY KEY, player_id INTEGER, tier TEXT);"
+        "CREATE TABLE leaderboards (leaderboard_id INTEGER PRIMARY KEY, player_id INTEGER, season TEXT, rank INTEGER);"
+        "INSERT INTO clans VALUES (1, 'FireMages', 'Magic', 1), (2, 'GoldDiggers', 'PvP', 42);"
+        "INSERT INTO players VALUES (1, 'ShadowNinja', 30, 9000, 'Gold', 1), (2, 'LevelUp', 5, 100, 'None', 2);"
+        "INSERT INTO purchases (player_id, rarity) VALUES (1, 'Legendary'), (1, 'legendary'), (1, 'Common');"
+        "INSERT INTO achievements (player_id, tier) VALUES (1, 'Gold'), (2, 'Silver');"
+        "INSERT INTO leaderboards (player_id, season, rank) VALUES (1, '2026-S10', 8), (1, '2026-S9', 40), (1, '2026-S2', 3);"
+    )
+    engine = create_engine(f"sqlite:///{path}")
+    apply_migrations(engine)
+    return engine
+
+def ask(engine, registry, directory, question):
+    match = registry.match(question, directory.find_players(question), directory.find_clans(question))
+    if match is None:
+        return None
+    with engine.connect() as connection:
+        rows = [tuple(row) for row in connection.execute(text(match.handler.sql), match.params)]
+    return registry.answer(match, rows)
+
+def test_common_questions_are_answered_from_templates(tmp_path):
+    engine = make_db(tmp_path)
+    registry, directory = IntentRegistry(build_handlers(engine)), EntityDirectory(engine)
+    assert ask(engine, registry, directory, "What is ShadowNinja's rank?") == "ShadowNinja is ranked 8th."
+    assert ask(engine, registry, directory, "what is shadowninja's vip status?") == "ShadowNinja's VIP status is Gold."
+    assert ask(engine, registry, directory, "What level is ShadowNinja?") == "ShadowNinja is level 30."
+    assert ask(engine, registry, directory, "How much XP does LevelUp have?") == "LevelUp has 100 XP."
+    assert ask(engine, registry, directory, "How many legendary items has ShadowNinja purchased?") == "ShadowNinja has purchased 2 legendary items."
+    assert ask(engine, registry, directory, "How many gold achievements does LevelUp have?") == "LevelUp has earned 0 gold achievements."
+    assert ask(engine, registry, directory, "Is FireMages a PvP clan?") == "FireMages is a Magic clan."
+    # Names are cut out before matching, so neither clan name reads as a gold question
+    assert ask(engine, registry, directory, "How many members does GoldDiggers have?") == "GoldDiggers has 42 members."
+    assert ask(engine, registry, directory, "How many members does FireMages have?") == "FireMages has 1 member."
+    assert ask(engine, registry, directory, "Can you tell me ShadowNinja's rank?") == "ShadowNinja is ranked 8th."
+    assert ask(engine, registry, directory, "How many players are in the clan GoldDiggers?") == "GoldDiggers has 42 members."
+
+def test_other_questions_are_declined_and_counted(tmp_path):
+    engine = make_db(tmp_path)
+    registry, directory = IntentRegistry(build_handlers(engine)), EntityDirectory(engine)
+    for question in (
+        "What is my rank?",                                # no known name
+        "Is ShadowNinja ranked above LevelUp?",            # two players
+        "What is ShadowNinja's level and XP?",             # two facts
+        "What did ShadowNinja buy last week?",             # time window
+        "How do I check ShadowNinja's rank?",              # how-to
+        "What items has ShadowNinja purchased?",           # no intent
+        "Can ShadowNinja trade legendary items?",          # modal, not a count
+        "What does VIP give ShadowNinja?",                 # policy, not the status
+        "Why did ShadowNinja drop in rank?",               # explanation, not the rank
+    ):
+        assert ask(engine, registry, directory, question) is None, question
+    assert ask(engine, registry, directory, "What is LevelUp's rank?") is None  # no leaderboard row
+    assert ask(engine, registry, directory, "What is ShadowNinja's rank?") == "ShadowNinja is ranked 8th."
+    stats = registry.stats()
+    assert (stats["questions"], stats["answered"], stats["coverage"]) == (11, 1, 0.0909)
+    assert stats["declined"] == {"no_entity": 1, "several_entities": 1, "not_a_lookup": 6, "no_intent": 1, "no_data": 1}
+
+def test_ordinals():
+    assert [ordinal(n) for n in (1, 2, 3, 4, 11, 12, 13, 21, 22, 101, 111)] == [
+        "1st", "2nd", "3rd", "4th", "11th", "12th", "13th", "21st", "22nd", "101st", "111th"
+    ]
@@ -0,0 +1,94 @@
+import random
+import sqlite3
+from sqlalchemy import create_engine, text
+from app.services.data.leaderboard import IndexableSkipList, LeaderboardIndex, leaderboard_question
+
+def test_skip_list_matches_a_sorted_list():
+    rng = random.Random(3)
+    skip, expected = IndexableSkipList(seed=1), []
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if key in expected and rng.random() < 0.5:
+            skip.remove(key)
+            expected.remove(key)
+        elif key not in expected:
+            skip.insert(key, str(key))
+            expected.append(key)
+            expected.sort()
+    assert len(skip) == len(expected)
+    assert [key for key, _ in skip.items()] == expected
+    for position in (0, len(expected) // 2, len(expected) - 1):
+        assert skip[position] == str(expected[position])
+        assert skip.index(expected[position]) == position
+    assert [key for key, _ in skip.items(10, 5)] == expected[10:15]
+    assert skip.memory_bytes() > 0
+
+def make_index(tmp_path):
+    path = tmp_path / "game.db"
+    sqlite3.connect(path).executescript(
+        "CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT UNIQUE);"
+        "CREATE TABLE leaderboards (leaderboard_id INTEGER PRIMARY KEY, player_id INTEGER, season TEXT, region TEXT, rank INTEGER, score INTEGER);"
+        "INSERT INTO players VALUES (1, 'IceWarden'), (2, 'PixelMage'), (3, 'ShadowNinja'), (4, 'BlazeRider');"
+        "INSERT INTO leaderboards (player_id, season, region, rank, score) VALUES"
+        " (1, '2026-S1', 'EU', 1, 900), (2, '2026-S1', 'EU', 2, 800),"
+        " (1, '2026-S2', 'EU', 2, 700), (2, '2026-S2', 'EU', 1, 950), (3, '2026-S2', 'EU', 3, 500), (4, '2026-S2', 'NA', 1, 990);"
+    )
+    engine = create_engine(f"sqlite:///{path}")
+    return engine, LeaderboardIndex(engine, seed=1)
+
+def test_rank_top_and_neighbourhood_answers(tmp_path):
+    engine, index = make_index(tmp_path)
+    assert index.answer("What is IceWarden's rank?", ["IceWarden"]) == "IceWarden is ranked 2 in EU for season 2026-S2."
+    assert index.answer("What was IceWarden's rank last season?", ["IceWarden"]) == "IceWarden is ranked 1 in EU for season 2026-S1."
+    assert index.answer("Top 2 in EU this season", []) == \
+        "Top 2 in EU for season 2026-S2: PixelMage (rank 1, 950 points); IceWarden (rank 2, 700 points)."
+    assert [entry.player_id for entry in index.top(3)] == [4, 2, 1]
+    assert index.answer("Who is ranked around ShadowNinja?", ["ShadowNinja"]) == \
+        "Around ShadowNinja in EU for season 2026-S2: PixelMage (rank 1), IceWarden (rank 2), ShadowNinja (rank 3)."
+    assert index.answer("What is IceWarden's rank this week?", ["IceWarden"]) is None
+    assert index.answer("Is IceWarden in the top 10?", ["IceWarden"]) is None
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO players VALUES (5, 'StormBringer')"))
+        connection.execute(text("INSERT INTO leaderboards (player_id, season, region, rank, score) VALUES (5, '2026-S2', 'EU', 4, 100), (1, '2026-S2', 'EU', 5, 50)"))
+    index.refresh()
+    standing = index.standings("IceWarden")[0]
+    # The newer row replaces IceWarden's earlier 2026-S2 standing
+    assert (standing.entry.rank, standing.position, standing.size) == (5, 4, 4)
+    assert index.stats()["entries"] == 7 and index.stats()["memory_bytes"] > 0
+
+def test_updates_in_place_are_reloaded_and_seasons_sort_naturally(tmp_path):
+    engine, index = make_index(tmp_path)
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE leaderboards SET rank = 9 WHERE player_id = 1 AND season = '2026-S2'"))
+        connection.execute(text("INSERT INTO leaderboards (player_id, season, region, rank, score) VALUES "
+                                "(1, '2026-S10', 'EU', 4, 10), (1, '2026-S9', 'EU', 6, 10)"))
+    index.refresh()
+    assert index.standings("IceWarden", season="2026-S2")[0].entry.rank == 2  # not seen without a reload
+    index.reload_seconds = 0
+    index.maybe_refresh().join()  # the reload is built off the request path
+    assert index.standings("IceWarden", season="2026-S2")[0].entry.rank == 2
+    index.reload_seconds = None
+    index.maybe_refresh()  # and swapped in by the next caller
+    assert index.standings("IceWarden", season="2026-S2")[0].entry.rank == 9
+    assert index.seasons() == ["2026-S1", "2026-S2", "2026-S9", "2026-S10"]
+    assert index.answer("What is IceWarden's rank?", ["IceWarden"]) == "IceWarden is ranked 4 in EU for season 2026-S10."
+    assert index.answer("What was IceWarden's rank last season?", ["IceWarden"]) == "IceWarden is ranked 6 in EU for season 2026-S9."
+
+def test_a_player_who_moves_region_leaves_the_old_board(tmp_path):
+    engine, index = make_index(tmp_path)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO leaderboards (player_id, season, region, rank, score) VALUES (3, '2026-S2', 'NA', 2, 600)"))
+    index.refresh()
+    assert [standing.entry.region for standing in index.standings("ShadowNinja")] == ["NA"]
+    assert [entry.player_id for entry in index.top(10, region="EU")] == [2, 1]
+    assert index.answer("What is ShadowNinja's rank?", ["ShadowNinja"]) == "ShadowNinja is ranked 2 in NA for season 2026-S2."
+
+def test_question_parsing():
+    seasons, regions = ["2026-S1", "2026-S2"], {"EU", "NA"}
+    assert leaderboard_question("Who are the top 5 players on the leaderboard?", seasons, regions).n == 5
+    assert leaderboard_question("Top 10 in NA for 2026-S1", seasons, regions)[1:3] == ("2026-S1", "NA")
+    assert leaderboard_question("What is X's rank in season 7?", seasons, regions) is None
+    assert leaderboard_question("How many legendary items does X have?", seasons, regions) is None
+    assert leaderboard_question("Did X's rank drop?", seasons, regions) is None
+    assert leaderboard_question("Why did X's ranking change this season?", seasons, regions) is None
@@ -0,0 +1,46 @@
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from app.services.retrieval.mmap_store import MmapStoreWriter, MmapVectorStore
+
+def test_round_trip_and_search(tmp_path):
+    vectors = np.eye(3, dtype=np.float32) * 2
+    texts = ["- Legendary items are rare.", "- VIP players get rewards.", "- Clans are ranked."]
+    manifest = MmapVectorStore.write(str(tmp_path), texts, vectors, [{"line": i} for i in range(3)])
+    assert manifest["count"] == 3 and manifest["dim"] == 3
+
+    store = MmapVectorStore.load(str(tmp_path), DeterministicFakeEmbedding(size=3))
+    assert len(store) == 3
+    assert store.documents[1].page_content == texts[1]
+    assert store.documents[2].metadata == {"line": 2}
+
+    hits = store.similarity_search_with_score_by_vector([0.0, 1.0, 0.1], k=2)
+    assert hits[0][0].page_content == texts[1]
+    assert abs(hits[0][1] - 1 / np.sqrt(1.01)) < 1e-5
+
+def test_streamed_writes_match_single_write(tmp_path):
+    writer = MmapStoreWriter(str(tmp_path / "streamed"))
+    writer.add(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+    writer.add(["c"], [[1.0, 1.0]])
+    streamed = writer.close()
+    single = MmapVectorStore.write(str(tmp_path / "single"), ["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    assert streamed["version"] == single["version"]
+    assert [doc.page_content for doc in MmapVectorStore.load(str(tmp_path / "streamed"), None).documents] == ["a", "b", "c"]
+
+def test_overlapping_writers_use_their_own_temp_dirs(tmp_path):
+    first, second = MmapStoreWriter(str(tmp_path / "store")), MmapStoreWriter(str(tmp_path / "store"))
+    assert first.tmp_path != second.tmp_path
+    first.add(["a"], [[1.0, 0.0]])
+    second.add(["b"], [[0.0, 1.0]])
+    second.close()
+    first.close()
+    assert [doc.page_content for doc in MmapVectorStore.load(str(tmp_path / "store"), None).documents] == ["a"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["store", "store.lock"]
+
+    aborted = MmapStoreWriter(str(tmp_path / "store"))
+    aborted.add(["c"], [[1.0, 1.0]])
+    aborted.abort()
+    store = MmapVectorStore.load(str(tmp_path / "store"), None)
+    assert [doc.page_content for doc in store.documents] == ["a"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["store", "store.lock"]
+    store.close()
+    assert store.documents._file.closed and store.vectors is None
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from app.services.retrieval.quantization import INDEX_TYPES, QUANTIZED_DIR, IndexParams, build_searcher
+
+def unit_vectors(count=600, dim=16, seed=3):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_each_index_finds_stored_vectors(tmp_path, index_type):
+    vectors = unit_vectors()
+    params = IndexParams(pq_m=8, pq_nbits=8, ivf_nlist=8, ivf_nprobe=8, hnsw_m=16, hnsw_ef_search=64)
+    searcher = build_searcher(tmp_path, vectors, index_type, params)
+    found = sum(searcher.search(vectors[row], 5)[0][0] == row for row in range(0, 600, 20))
+    # Exact and scalar-quantised indexes always rank a stored vector first; PQ codes nearly always do
+    assert found >= (30 if index_type in ("flat", "float16", "int8") else 27)
+    top = searcher.search(vectors[0], 1)[0]
+    assert top[1] == pytest.approx(1.0, abs=0.02 if index_type in ("flat", "float16", "int8") else 0.3)
+
+    # A second build reuses the cached artifact, and no temp files are left behind
+    artifacts = sorted(path.name for path in (tmp_path / QUANTIZED_DIR).glob("*")) if index_type != "flat" else []
+    assert not any(name.endswith(".tmp") for name in artifacts)
+    again = build_searcher(tmp_path, vectors, index_type, params)
+    assert again.search(vectors[40], 1)[0][0] == searcher.search(vectors[40], 1)[0][0]
+    if index_type != "flat":
+        assert sorted(path.name for path in (tmp_path / QUANTIZED_DIR).glob("*")) == artifacts
+
+def test_int8_scales_and_codes_round_trip(tmp_path):
+    vectors = unit_vectors(count=50, dim=8)
+    searcher = build_searcher(tmp_path, vectors, "int8", IndexParams())
+    assert searcher.scales.dtype == np.dtype("<f4") and searcher.scales.shape == (8,)
+    decoded = searcher.codes.astype(np.float32) * searcher.scales
+    assert np.abs(decoded - vectors).max() <= searcher.scales.max() / 2 + 1e-6
@@ -0,0 +1,35 @@
+from app.services.retrieval.query_rewrite import QueryRewriter
+
+CORPUS = [
+    "- Legendary items are the rarest and provide the highest stat bonuses.",
+    "- Refunds are not issued for consumables like XP boosters.",
+]
+
+def test_pronouns_take_the_latest_topic_and_name():
+    rewriter = QueryRewriter(CORPUS)
+    history = [
+        {"type": "user", "content": "Why are legendary items rare?"},
+        {"type": "assistant", "content": "Legendary items are the rarest items in the game."},
+    ]
+    assert rewriter.rewrite("Are they difficult to obtain?", history) == "Are legendary items difficult to obtain?"
+    assert rewriter.rewrite("How rare?", history) == "How rare? (legendary items)"
+
+    history.append({"type": "assistant", "content": "DragonSlayer99 owns three of them."})
+    assert rewriter.rewrite("What is his rank?", history) == "What is DragonSlayer99's rank?"
+
+def test_self_contained_queries_are_unchanged():
+    rewriter = QueryRewriter(CORPUS)
+    history = [{"type": "user", "content": "Why are legendary items rare?"}]
+    for query in ["Are XP boosters refundable?", "And refunds?", "Are legendary items tradeable and are they rare?"]:
+        assert rewriter.rewrite(query, history) == query
+    assert rewriter.rewrite("Are they difficult to obtain?", None) == "Are they difficult to obtain?"
+
+def test_expletive_it_is_not_replaced():
+    rewriter = QueryRewriter(CORPUS)
+    history = [{"type": "user", "content": "Why are legendary items rare?"}]
+    assert rewriter.rewrite("Is it possible to trade them?", history) == "Is it possible to trade legendary items?"
+    for query in ["Is it possible to get a refund?", "Is it worth buying XP boosters?", "It's ok to sell duplicates?"]:
+        assert rewriter.rewrite(query, history) == query
+    # "it" cannot stand for a plural phrase, so it is left for the retriever rather than made ungrammatical
+    assert rewriter.rewrite("Is it rare?", history) == "Is it rare?"
+    assert rewriter.rewrite("Are they rare?", history) == "Are legendary items rare?"
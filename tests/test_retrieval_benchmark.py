@@ -0,0 +1,14 @@
+from benchmarks.retrieval_benchmark import HashingEmbeddings, knowledge_base_corpus, run, synthetic_corpus
+
+def test_every_labelled_question_matches_a_chunk():
+    texts, questions = knowledge_base_corpus("advanced_knowledge_base.txt", "bullet")
+    assert len(texts) == 13
+    assert all(question["relevant"] for question in questions)
+
+def test_run_reports_each_method():
+    texts, questions = synthetic_corpus(count=200, queries=20, seed=1)
+    results = run(texts, questions, HashingEmbeddings(size=256), ["flat", "int8"], k=2)
+    assert set(results["methods"]) == {"lexical", "vector/flat", "hybrid/flat", "vector/int8", "hybrid/int8"}
+    lexical = results["methods"]["lexical"]
+    assert 0 < lexical["recall@2"] <= 1 and 0 < lexical["mrr"] <= 1
+    assert lexical["p99_ms"] >= lexical["p50_ms"]
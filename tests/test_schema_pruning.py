@@ -0,0 +1,45 @@
+import sqlite3
+from sqlalchemy import create_engine
+from app.services.data.schema import SchemaIndex
+
+SCHEMA = """
+CREATE TABLE clans (clan_id INTEGER PRIMARY KEY, clan_name TEXT UNIQUE, clan_type TEXT, member_count INTEGER);
+CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT UNIQUE, vip_status TEXT, clan_id INTEGER REFERENCES clans(clan_id));
+CREATE TABLE purchases (purchase_id INTEGER PRIMARY KEY, player_id INTEGER REFERENCES players(player_id), item_name TEXT, rarity TEXT, price REAL);
+CREATE TABLE matches (match_id INTEGER PRIMARY KEY, player_id INTEGER REFERENCES players(player_id), result TEXT);
+INSERT INTO clans VALUES (1, 'DarkWolves', 'PvP', 2);
+INSERT INTO players VALUES (1, 'IceWarden', 'Gold', 1), (2, 'PixelMage', 'None', 1);
+INSERT INTO purchases VALUES (1, 1, 'Frost Blade', 'Legendary', 9.99), (2, 2, 'Cape', 'Rare', 1.99);
+"""
+
+def make_index(tmp_path):
+    path = tmp_path / "game.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.commit()
+    return SchemaIndex(create_engine(f"sqlite:///{path}"))
+
+def test_prunes_to_mentioned_tables_and_their_references(tmp_path):
+    index = make_index(tmp_path)
+    schema = index.prune("How many legendary items did IceWarden buy?", ["players"])
+    assert "CREATE TABLE purchases" in schema and "CREATE TABLE players" in schema
+    assert "CREATE TABLE matches" not in schema
+    # clans is only referenced, so it keeps just its key and name
+    assert "clan_name TEXT" in schema and "member_count" not in schema
+    # Sample values appear only for the column the question filters on
+    assert "purchases.rarity values: 'Legendary', 'Rare'" in schema
+    assert "vip_status values" not in schema
+
+def test_columns_keep_schema_order_and_unmatched_questions_fall_back(tmp_path):
+    index = make_index(tmp_path)
+    assert [column.name for column in index.tables["players"].columns] == ["player_id", "username", "vip_status", "clan_id"]
+    # Identifying columns are not treated as categories, however few rows there are
+    assert index.tables["players"].columns[1].values == []
+    assert index.prune("What is the weather like?") is None
+    assert set(index.matches("Which clans have the most members?")) == {"clans"}
+
+def test_category_values_come_from_a_bounded_sample(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.data.schema.CATEGORY_SAMPLE_ROWS", 1)
+    index = make_index(tmp_path)
+    # Only the first purchase is read, so a value that appears later is not a keyword
+    assert [column.values for column in index.tables["purchases"].columns if column.name == "rarity"] == [["Legendary"]]
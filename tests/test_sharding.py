@@ -0,0 +1,47 @@
+import numpy as np
+from app.services.retrieval.mmap_store import MmapVectorStore
+from app.services.retrieval.sharding import ShardRouter, build_shards, shards_current
+
+TOPICS = {"clans": ["clan"], "refunds": ["refund"]}
+
+def _sharded_store(tmp_path):
+    texts = ["- Refunds take 5 days.", "- Clans have 50 members.", "- Servers restart daily.", "- Clan wars run weekly."]
+    vectors = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0], [0.0, 0.9, 0.1]]
+    MmapVectorStore.write(str(tmp_path), texts, vectors)
+    build_shards(str(tmp_path), TOPICS)
+    return MmapVectorStore.load(str(tmp_path), None, sharded=True)
+
+def test_shards_are_contiguous_row_ranges(tmp_path):
+    store = _sharded_store(tmp_path)
+    assert store.shards == {"clans": (0, 2), "refunds": (2, 3), "general": (3, 4)}
+    assert [doc.metadata["shard"] for doc in store.documents] == ["clans", "clans", "refunds", "general"]
+    assert shards_current(str(tmp_path), TOPICS)
+    assert not shards_current(str(tmp_path), {"clans": ["guild"]})
+
+def test_routed_search_only_scores_selected_shards(tmp_path):
+    store = _sharded_store(tmp_path)
+    hits = store.search_vectors([1.0, 0.0, 0.0], k=2, shards=["clans"])
+    assert {row for row, _ in hits} <= {0, 1}
+    # Searching every shard matches the unsharded store
+    unsharded = MmapVectorStore.load(str(tmp_path), None)
+    assert store.search_vectors([0.2, 0.5, 0.3], k=3) == unsharded.search_vectors([0.2, 0.5, 0.3], k=3)
+
+def test_router_prefers_keywords_then_centroids_then_all(tmp_path):
+    store = _sharded_store(tmp_path)
+    router = ShardRouter(store.shards, store.shard_centroids, TOPICS, min_centroid_margin=0.1)
+    assert router.select("How big can my clan get?") == (["clans", "general"], "keyword")
+    assert router.select("How long until I get my money back?", [1.0, 0.0, 0.0]) == (["refunds", "general"], "centroid")
+    assert router.select("Hello there", [1.0, 1.0, 1.0]) == (None, "fallback")
+    assert router.rows(["refunds"]) == 1 and router.rows(None) == 4
+
+def test_cross_topic_chunks_are_reachable_from_each_topic(tmp_path):
+    texts = ["- Refunds take 5 days.", "- Clans have 50 members.", "- Clans can refund a war chest once."]
+    MmapVectorStore.write(str(tmp_path), texts, [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]])
+    build_shards(str(tmp_path), TOPICS)
+    store = MmapVectorStore.load(str(tmp_path), None, sharded=True)
+    assert store.shards == {"clans": (0, 1), "refunds": (1, 2), "general": (2, 3)}
+    router = ShardRouter(store.shards, store.shard_centroids, TOPICS)
+    for query in ("Can a clan get a refund?", "How do refunds work?", "How big can my clan get?"):
+        names, _ = router.select(query)
+        rows = {row for row, _ in store.search_vectors([0.7, 0.7], k=3, shards=names)}
+        assert 2 in rows, query
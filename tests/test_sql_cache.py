@@ -0,0 +1,67 @@
+import asyncio
+import sqlite3
+from app.services.data.async_db import AsyncDatabase
+from app.services.data.result_cache import ResultCache, canonicalize_sql, tables_in
+
+def test_canonical_sql_ignores_layout_but_not_literals():
+    a = canonicalize_sql("SELECT vip_status\n  FROM players WHERE username = 'IceWarden';")
+    b = canonicalize_sql("select VIP_STATUS from PLAYERS where username='IceWarden'")
+    assert a == b
+    assert canonicalize_sql("SELECT 1 FROM players WHERE username = 'icewarden'") != a
+    assert tables_in(canonicalize_sql("SELECT c.name FROM clans c JOIN players p ON p.clan_id = c.id WHERE p.note = 'from x'")) == {"clans", "players"}
+    comma_join = canonicalize_sql("SELECT COUNT(*) FROM purchases pur, players p WHERE pur.player_id = p.player_id")
+    assert tables_in(comma_join) == {"purchases", "players"}
+    assert tables_in(canonicalize_sql("UPDATE clans SET name = 'X'")) == {"clans"}
+
+def test_spacing_inside_literals_is_kept():
+    spaced = canonicalize_sql("SELECT * FROM items WHERE description = 'a = b'")
+    assert spaced == "select * from items where description='a = b'"
+    assert spaced != canonicalize_sql("SELECT * FROM items WHERE description = 'a=b'")
+    assert canonicalize_sql("SELECT * FROM items WHERE name IN ( 'x , y' )") == "select * from items where name in('x , y')"
+
+def test_table_versions_invalidate_dependent_entries():
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("SELECT COUNT(*) FROM players", [(2,)])
+    cache.put("SELECT COUNT(*) FROM clans", [(1,)])
+    assert cache.get("select count(*)  from players") == [(2,)]
+    cache.invalidate("players")
+    assert cache.get("SELECT COUNT(*) FROM players") is None
+    assert cache.get("SELECT COUNT(*) FROM clans") == [(1,)]
+    cache.put("UPDATE clans SET name = 'X'", [])
+    assert cache.get("SELECT COUNT(*) FROM clans") is None
+    stats = cache.stats()
+    assert stats["tables"]["players"] == {"lookups": 2, "hits": 1, "hit_rate": 0.5, "version": 1}
+
+def test_ttl_and_volatile_queries():
+    cache = ResultCache(ttl_seconds=0)
+    cache.put("SELECT username FROM players", [("A",)])
+    assert cache.get("SELECT username FROM players") is None
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("SELECT username FROM players ORDER BY RANDOM() LIMIT 1", [("A",)])
+    assert cache.get("SELECT username FROM players ORDER BY RANDOM() LIMIT 1") is None
+    for sql in (
+        "SELECT COUNT(*) FROM purchases WHERE purchase_date > datetime('now', '-7 days')",
+        "SELECT COUNT(*) FROM purchases WHERE purchase_date > NOW() - INTERVAL '7 days'",
+        "SELECT COUNT(*) FROM matches WHERE match_date >= CURRENT_DATE",
+    ):
+        cache.put(sql, [(1,)])
+        assert cache.get(sql) is None, sql
+
+def test_cache_hits_skip_the_database(tmp_path):
+    path = tmp_path / "game.db"
+    connection = sqlite3.connect(path)
+    connection.executescript("CREATE TABLE players (id INTEGER, username TEXT); INSERT INTO players VALUES (1, 'A');")
+    connection.commit()
+
+    async def scenario():
+        db = AsyncDatabase(f"sqlite:///{path}", cache=ResultCache())
+        first = await db.run("SELECT COUNT(*) FROM players")
+        connection.execute("INSERT INTO players VALUES (2, 'B')")
+        connection.commit()
+        cached = await db.run("select count(*) from players;")
+        db.cache.invalidate("players")
+        fresh = await db.run("SELECT COUNT(*) FROM players")
+        await db.dispose()
+        return first, cached, fresh
+
+    assert asyncio.run(scenario()) == ("[(1,)]", "[(1,)]", "[(2,)]")
@@ -0,0 +1,28 @@
+import json
+from app.services.data.sql_examples import SqlExampleStore, format_examples, read_examples, rejected_questions
+
+def test_seed_examples_find_the_same_question_shape():
+    store = SqlExampleStore()
+    store.load(read_examples("sql_examples.jsonl"))
+    assert len(store) >= 10
+    top = store.search("how many legendary items has {player0} bought", k=2)
+    assert "rarity = 'Legendary'" in top[0].sql
+    clan = store.search("how many members are in {clan0}", k=1)
+    assert "member_count" in clan[0].sql
+    assert format_examples(top[:1]).startswith("Question: How many legendary items")
+
+def test_learned_examples_are_logged_and_negative_feedback_excluded(tmp_path):
+    log = tmp_path / "examples.jsonl"
+    store = SqlExampleStore(log_path=str(log))
+    store.learn("Which clan is IceWarden in?", "SELECT 1 FROM clans", "which clan is {player0} in")
+    store.learn("Which clan is PixelMage in?", "SELECT 2 FROM clans", "which clan is {player0} in")
+    store.learn("How many matches did IceWarden win?", "SELECT 3 FROM matches")
+    assert len(read_examples(str(log))) == 2
+
+    feedback = tmp_path / "feedback"
+    feedback.mkdir()
+    (feedback / "q1.json").write_text(json.dumps({"query": "how many matches did IceWarden win", "feedback": {"type": "negative"}}))
+    (feedback / "q2.json").write_text(json.dumps({"query": "Which clan is IceWarden in?", "feedback": {"type": "positive"}}))
+    reloaded = SqlExampleStore()
+    reloaded.load(read_examples(str(log)), exclude=rejected_questions(str(feedback)))
+    assert [example.sql for example in reloaded.search("which clan is icewarden in matches", k=5)] == ["SELECT 1 FROM clans"]
@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+from sqlalchemy import create_engine
+from app.services.data.async_db import AsyncDatabase
+from app.services.data.result_cache import ResultCache
+from app.services.data.sql_guard import SqlGuard
+
+def test_rejects_writes_and_cartesian_joins():
+    guard = SqlGuard()
+    assert not guard.check("DELETE FROM players").ok
+    assert not guard.check("SELECT 1 FROM players; DROP TABLE players").ok
+    assert not guard.check("SELECT * FROM players p JOIN purchases pur").ok
+    assert not guard.check("SELECT * FROM matches m, purchases pur").ok
+    assert guard.check("SELECT * FROM matches m, players p WHERE m.player_id = p.player_id").ok
+    assert guard.check("SELECT REPLACE(username, '_', ' ') FROM players WHERE note = 'delete me'").ok
+
+def test_limits_rows_unless_a_single_aggregate_row():
+    guard = SqlGuard(max_rows=50)
+    assert guard.check("SELECT username FROM players;").sql == "SELECT username FROM players LIMIT 50"
+    assert guard.check("SELECT username FROM players LIMIT 5000").sql == "SELECT username FROM players LIMIT 50"
+    assert guard.check("SELECT username FROM players LIMIT 5").sql.endswith("LIMIT 5")
+    assert guard.check("SELECT COUNT(*) FROM purchases").sql == "SELECT COUNT(*) FROM purchases"
+    grouped = "SELECT region, COUNT(*) FROM players GROUP BY region"
+    assert guard.check(grouped).sql == grouped + " LIMIT 50"
+    nested = "SELECT username FROM players WHERE player_id IN (SELECT player_id FROM matches LIMIT 3)"
+    assert guard.check(nested).sql == nested + " LIMIT 50"
+    # Templates bind the limit from the question ("top 100000 players")
+    template = "SELECT username FROM players ORDER BY xp DESC LIMIT :n0"
+    assert guard.check(template).sql == template
+    assert guard.bound_params(template, {"n0": 100000, "s0": "EU"}) == {"n0": 50, "s0": "EU"}
+    assert guard.bound_params(template, {"n0": 10}) == {"n0": 10}
+
+def test_warns_about_functions_on_indexed_columns():
+    guard = SqlGuard(indexed_columns={"players": {"player_id", "username"}})
+    result = guard.check("SELECT p.level FROM players p WHERE LOWER(p.username) = LOWER('IceWarden')")
+    assert result.ok and result.warnings == ["LOWER(p.username) keeps the index on players.username from being used"]
+    assert guard.check("SELECT * FROM matches JOIN players USING (player_id)").warnings == []
+
+def test_plan_cost_rejects_nested_full_scans(tmp_path):
+    path = tmp_path / "game.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE players (player_id INTEGER PRIMARY KEY, username TEXT UNIQUE);"
+        "CREATE TABLE matches (match_id INTEGER PRIMARY KEY, player_id INTEGER, result TEXT);"
+        "INSERT INTO players VALUES (1, 'A'), (2, 'B');"
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) "
+        "INSERT INTO matches SELECT i, i % 2 + 1, 'Win' FROM n;"
+    )
+    connection.commit()
+    guard = SqlGuard.from_engine(create_engine(f"sqlite:///{path}"), max_cost=1000)
+    assert guard.table_rows == {"players": 2, "matches": 200}
+
+    async def scenario():
+        db = AsyncDatabase(f"sqlite:///{path}")
+        by_key = await guard.check_plan(db, "SELECT m.result FROM matches m JOIN players p ON p.player_id = m.player_id")
+        cross = await guard.check_plan(db, "SELECT * FROM matches a, matches b WHERE a.player_id < b.player_id")
+        await db.dispose()
+        return by_key, cross
+
+    by_key, cross = asyncio.run(scenario())
+    assert by_key is None
+    assert "too expensive" in cross
+
+    # Scans of subqueries, CTEs and constant rows are not tables; their inner scans are listed on their own
+    plan = [(2, 0, 0, "CO-ROUTINE recent"), (5, 2, 0, "SCAN matches"), (12, 0, 0, "SCAN recent"),
+            (20, 0, 0, "SCAN (subquery-1)"), (30, 0, 0, "SCAN CONSTANT ROW")]
+    assert guard.plan_cost("sqlite", plan, {"matches": "matches", "recent": "recent"}) == 200
+    assert guard.plan_cost("sqlite", [(2, 0, 0, "SCAN x")], {}) == 200  # unresolved alias
+
+def test_table_sizes_are_recounted(tmp_path):
+    path = tmp_path / "game.db"
+    sqlite3.connect(path).executescript("CREATE TABLE matches (match_id INTEGER PRIMARY KEY, result TEXT);")
+    guard = SqlGuard.from_engine(create_engine(f"sqlite:///{path}"), max_cost=10, size_refresh_seconds=0)
+    assert guard.table_rows == {"matches": 0}
+    connection = sqlite3.connect(path)
+    connection.executescript("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 50) "
+                             "INSERT INTO matches SELECT i, 'Win' FROM n;")
+    connection.commit()
+
+    async def scenario():
+        db = AsyncDatabase(f"sqlite:///{path}", cache=ResultCache())
+        # A stale cached count must neither be read nor replaced by the re-count
+        db.cache.put("SELECT COUNT(*) FROM matches", [(0,)])
+        rejection = await guard.check_plan(db, "SELECT * FROM matches a, matches b WHERE a.result < b.result")
+        await db.dispose()
+        return rejection, db.cache.get("SELECT COUNT(*) FROM matches")
+
+    rejection, cached = asyncio.run(scenario())
+    assert "too expensive" in rejection
+    assert guard.table_rows == {"matches": 50} and cached == [(0,)]
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, inspect
+from app.models.migrations import apply_migrations
+from benchmarks.sql_index_benchmark import QUERIES, build_database, run
+
+def test_migrations_turn_player_scans_into_index_searches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    build_database(engine, players=200, seed=1)
+    results = run(engine, repeat=5, seed=1)
+    assert results["migrations"] == ["0001_lower_name_indexes", "0002_access_path_indexes", "0003_player_summary"]
+    assert set(results["queries"]) == set(QUERIES)
+    for name in ("legendary_count", "matches_won", "season_top"):
+        query = results["queries"][name]
+        assert any(step.startswith("SCAN") for step in query["before"]["plan"])
+        assert not any(step.startswith("SCAN") for step in query["after"]["plan"])
+    assert query["after"]["p99_ms"] >= query["after"]["p50_ms"]
+
+def test_access_path_indexes_are_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    build_database(engine, players=20, seed=1)
+    apply_migrations(engine)
+    assert apply_migrations(engine) == []
+    names = {index["name"] for index in inspect(engine).get_indexes("purchases")}
+    assert {"ix_purchases_player_id_purchase_date", "ix_purchases_player_id_rarity"} <= names
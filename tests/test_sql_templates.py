@@ -0,0 +1,37 @@
+from app.services.data.gazetteer import Mention
+from app.services.data.sql_templates import SqlTemplateCache, mask_question, render, templatize
+
+RANK_SQL = "SELECT l.rank FROM leaderboards l JOIN players p ON p.player_id = l.player_id WHERE LOWER(p.username) = LOWER('DragonSlayer99') LIMIT 5"
+
+def test_questions_differing_by_name_share_a_skeleton():
+    first = mask_question("What is DragonSlayer99's rank?", [("player", Mention("DragonSlayer99", 8, 22))])
+    second = mask_question("what is IceWarden's  rank", [("player", Mention("IceWarden", 8, 17))])
+    assert first.skeleton == second.skeleton == "what is {player0}'s rank"
+    assert second.values == {"player0": "IceWarden"}
+    top = mask_question("Top 5 players in DarkWolves", [("clan", Mention("DarkWolves", 17, 27))])
+    assert top == ("top {n0} players in {clan0}", {"n0": 5, "clan0": "DarkWolves"})
+
+def test_templates_bind_every_slot_or_are_rejected():
+    values = {"player0": "DragonSlayer99", "n0": 5}
+    template = templatize(RANK_SQL, values)
+    assert template.endswith("LOWER(:player0) LIMIT :n0")
+    assert render(template, {"player0": "O'Brien", "n0": 3}).endswith("LOWER('O''Brien') LIMIT 3")
+    # A value the SQL never mentions, two slots with one value, or a write cannot become a template
+    assert templatize(RANK_SQL, {"player0": "IceWarden"}) is None
+    assert templatize("SELECT 1 FROM leaderboards WHERE season = 3 LIMIT 3", {"n0": 3, "n1": 3}) is None
+    assert templatize("DELETE FROM players WHERE username = 'A'", {"player0": "A"}) is None
+    # A value the SQL uses twice may be a constant that only looks like the question's number
+    levels = mask_question("Which VIP players are above level 1?", [])
+    assert templatize("SELECT username FROM players WHERE vip_status = 1 AND level > 1", levels.values) is None
+    assert templatize("SELECT username FROM players WHERE vip_status = 'Gold' AND level > 1", levels.values) is not None
+    # Literals lowered for an index-friendly lookup are lowered again when the template is reused
+    lowered = templatize("SELECT level FROM players p WHERE LOWER(p.username) = 'icewarden'", {"player0": "IceWarden"})
+    assert lowered == "SELECT level FROM players p WHERE LOWER(p.username) = LOWER(:player0)"
+
+def test_cache_learns_and_returns_templates():
+    cache = SqlTemplateCache(max_entries=1)
+    question = mask_question("What is DragonSlayer99's rank?", [("player", Mention("DragonSlayer99", 8, 22))])
+    assert cache.learn(question, RANK_SQL.replace(" LIMIT 5", ""))
+    assert cache.lookup("what is {player0}'s rank").endswith("LOWER(:player0)")
+    assert cache.learn(mask_question("How many clans are there?", []), "SELECT COUNT(*) FROM clans")
+    assert len(cache) == 1 and cache.lookup("what is {player0}'s rank") is None